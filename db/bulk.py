@@ -0,0 +1,27 @@
+"""
+Bulk write helpers for high-volume tables
+"""
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .models import MailDecisionLog
+from .stats_rollup import record_decisions
+
+# Rows per executemany call. psycopg2 under SQLAlchemy 2.0 turns each call into
+# multi-row INSERT ... VALUES statements (insertmanyvalues), so this only bounds
+# the size of the parameter list held in memory.
+DECISION_LOG_CHUNK_SIZE = 1000
+
+def insert_decision_logs(db: Session, rows: list[dict], chunk_size: int = DECISION_LOG_CHUNK_SIZE) -> int:
+    """
+    Insert MailDecisionLog rows without building ORM objects.
+    
+    Each row is a dict of MailDecisionLog column values. Does not commit -
+    the caller owns the transaction, so a streamed scan can write batch by
+    batch and commit when it chooses. The per-day stats rollup is updated in
+    the same transaction. Returns the number of rows written.
+    """
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(MailDecisionLog), rows[start:start + chunk_size])
+    record_decisions(db, rows)
+    return len(rows)
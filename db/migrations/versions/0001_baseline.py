@@ -0,0 +1,127 @@
+"""Baseline: schema as created by Base.metadata.create_all before migrations
+
+Databases created by the app's create_all already have these tables, so
+existing tables are skipped - upgrading such a database needs no stamp.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create(name, *columns, indexes=(), unique=()):
+    """Create a table with single-column indexes named like create_all names them"""
+    if not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+    for column in indexes:
+        op.create_index(f"ix_{name}_{column}", name, [column])
+    for column in unique:
+        op.create_index(f"ix_{name}_{column}", name, [column], unique=True)
+
+
+def upgrade():
+    _create(
+        "users",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("email", sa.String),
+        sa.Column("hashed_password", sa.String, nullable=True),
+        sa.Column("is_active", sa.Boolean),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        unique=["email"],
+    )
+    _create(
+        "oauth_tokens",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("provider", sa.String),
+        sa.Column("scope", sa.Text),
+        sa.Column("access_token", sa.LargeBinary),
+        sa.Column("refresh_token", sa.LargeBinary),
+        sa.Column("expiry", sa.DateTime),
+        indexes=["user_id"],
+    )
+    _create(
+        "mail_decision_logs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("message_id", sa.String),
+        sa.Column("sender_hash", sa.String),
+        sa.Column("sender_domain", sa.String),
+        sa.Column("gmail_category", sa.String),
+        sa.Column("has_unsubscribe", sa.Boolean),
+        sa.Column("size_bytes", sa.Integer),
+        sa.Column("internal_date", sa.DateTime),
+        sa.Column("proposed", sa.String),
+        sa.Column("confidence", sa.Integer),
+        sa.Column("applied", sa.Boolean),
+        sa.Column("user_feedback", sa.String, nullable=True),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        indexes=["user_id", "message_id", "sender_hash", "sender_domain", "gmail_category"],
+    )
+    _create(
+        "activity_logs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("action", sa.String),
+        sa.Column("provider", sa.String),
+        sa.Column("details", sa.Text),
+        sa.Column("items_count", sa.Integer),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        indexes=["user_id", "created_at"],
+    )
+    _create(
+        "oauth_states",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("state", sa.String),
+        sa.Column("provider", sa.String),
+        sa.Column("source", sa.String),
+        sa.Column("user_id", sa.Integer, nullable=True),
+        sa.Column("redirect_uri", sa.String, nullable=True),
+        sa.Column("expires_at", sa.DateTime),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        indexes=["expires_at"], unique=["state"],
+    )
+    _create(
+        "gmail_sync_states",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("oauth_token_id", sa.Integer),
+        sa.Column("history_id", sa.String),
+        sa.Column("full_scan_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime, server_default=sa.func.now()),
+        indexes=["user_id"], unique=["oauth_token_id"],
+    )
+    _create(
+        "user_daily_stats",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer),
+        sa.Column("day", sa.Date),
+        sa.Column("scanned", sa.Integer),
+        sa.Column("scanned_bytes", sa.BigInteger),
+        sa.Column("delete_count", sa.Integer),
+        sa.Column("delete_bytes", sa.BigInteger),
+        sa.Column("review_count", sa.Integer),
+        sa.Column("review_bytes", sa.BigInteger),
+        sa.Column("keep_count", sa.Integer),
+        sa.Column("keep_bytes", sa.BigInteger),
+        sa.Column("applied", sa.Integer),
+        sa.Column("deleted", sa.Integer),
+        sa.Column("deleted_bytes", sa.BigInteger),
+        sa.Column("last_scan_at", sa.DateTime),
+        sa.UniqueConstraint("user_id", "day", name="uq_user_daily_stats_user_day"),
+    )
+
+
+def downgrade():
+    for name in ("user_daily_stats", "gmail_sync_states", "oauth_states", "activity_logs",
+                 "mail_decision_logs", "oauth_tokens", "users"):
+        op.drop_table(name)
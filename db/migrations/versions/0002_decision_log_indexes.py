@@ -0,0 +1,49 @@
+"""Composite and partial indexes for mail_decision_logs access paths
+
+Replaces the single-column user_id index (every query also filters or
+groups on a second column) with indexes led by user_id. On PostgreSQL the
+indexes are built CONCURRENTLY so writes keep flowing on a large table.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TABLE = "mail_decision_logs"
+DELETE_ONLY = sa.text("proposed = 'delete'")
+
+INDEXES = [
+    ("ix_mail_decision_logs_user_created", ["user_id", "created_at"], {}),
+    ("ix_mail_decision_logs_user_message", ["user_id", "message_id"], {}),
+    ("ix_mail_decision_logs_user_proposed_applied", ["user_id", "proposed", "applied"],
+     {"postgresql_include": ["size_bytes"]}),
+    ("ix_mail_decision_logs_delete_senders", ["user_id", "sender_hash"],
+     {"postgresql_include": ["size_bytes"], "postgresql_where": DELETE_ONLY, "sqlite_where": DELETE_ONLY}),
+]
+
+
+def _concurrently() -> dict:
+    return {"postgresql_concurrently": True} if op.get_context().dialect.name == "postgresql" else {}
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, columns, kwargs in INDEXES:
+            op.create_index(name, TABLE, columns, if_not_exists=True, **kwargs, **_concurrently())
+        op.drop_index("ix_mail_decision_logs_user_id", table_name=TABLE, if_exists=True, **_concurrently())
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_mail_decision_logs_user_id", TABLE, ["user_id"], if_not_exists=True, **_concurrently())
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=TABLE, if_exists=True, **_concurrently())
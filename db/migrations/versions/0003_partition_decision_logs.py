@@ -0,0 +1,117 @@
+"""Range-partition mail_decision_logs by month on created_at (PostgreSQL)
+
+The table is rebuilt as a partitioned table with one partition per month
+from the oldest row up to three months ahead, plus a default partition.
+Rows are copied over in one statement - run during a quiet period on a
+large table. db/retention.py keeps creating and dropping partitions from
+then on. Partitioned tables need the partition key in the primary key, so
+it becomes (id, created_at); ids keep coming from the same sequence.
+
+No-op on other databases.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+TABLE = "mail_decision_logs"
+COLUMNS = """
+    id INTEGER NOT NULL DEFAULT nextval('mail_decision_logs_id_seq'),
+    user_id INTEGER,
+    message_id VARCHAR,
+    sender_hash VARCHAR,
+    sender_domain VARCHAR,
+    gmail_category VARCHAR,
+    has_unsubscribe BOOLEAN,
+    size_bytes INTEGER,
+    internal_date TIMESTAMP WITHOUT TIME ZONE,
+    proposed VARCHAR,
+    confidence INTEGER,
+    applied BOOLEAN,
+    user_feedback VARCHAR,
+    created_at TIMESTAMP WITHOUT TIME ZONE {created_at}DEFAULT now()
+"""
+COLUMN_NAMES = ("id, user_id, message_id, sender_hash, sender_domain, gmail_category, has_unsubscribe, "
+                "size_bytes, internal_date, proposed, confidence, applied, user_feedback")
+INDEXES = [
+    ("ix_mail_decision_logs_message_id", "(message_id)"),
+    ("ix_mail_decision_logs_sender_hash", "(sender_hash)"),
+    ("ix_mail_decision_logs_sender_domain", "(sender_domain)"),
+    ("ix_mail_decision_logs_gmail_category", "(gmail_category)"),
+    ("ix_mail_decision_logs_user_created", "(user_id, created_at)"),
+    ("ix_mail_decision_logs_user_message", "(user_id, message_id)"),
+    ("ix_mail_decision_logs_user_proposed_applied", "(user_id, proposed, applied) INCLUDE (size_bytes)"),
+    ("ix_mail_decision_logs_delete_senders", "(user_id, sender_hash) INCLUDE (size_bytes) WHERE proposed = 'delete'"),
+]
+MONTHS_AHEAD = 3
+
+
+def _add_months(d, months):
+    years, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + years, month + 1, 1)
+
+
+def _move_to_old_name(suffix):
+    """Rename the current table, its primary key and indexes out of the way"""
+    old = f"{TABLE}_{suffix}"
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {TABLE}_pkey TO {old}_pkey")
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    return old
+
+
+def _create_indexes():
+    for name, definition in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON {TABLE} {definition}")
+
+
+def upgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    old = _move_to_old_name("unpartitioned")
+    op.execute(f"CREATE TABLE {TABLE} ({COLUMNS.format(created_at='NOT NULL ')}, "
+               f"PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    op.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    this_month = date.today().replace(day=1)
+    oldest = None
+    if not op.get_context().as_sql:
+        oldest = op.get_bind().execute(sa.text(f"SELECT min(created_at) FROM {old}")).scalar()
+    month = oldest.date().replace(day=1) if oldest else this_month
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        following = _add_months(month, 1)
+        op.execute(f"CREATE TABLE {TABLE}_y{month.year}m{month.month:02d} PARTITION OF {TABLE} "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')")
+        month = following
+
+    # Indexes on the parent cascade to every partition, current and future
+    _create_indexes()
+    op.execute(f"INSERT INTO {TABLE} ({COLUMN_NAMES}, created_at) "
+               f"SELECT {COLUMN_NAMES}, coalesce(created_at, now()) FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+    op.execute(f"ANALYZE {TABLE}")
+
+
+def downgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    old = _move_to_old_name("partitioned")
+    op.execute(f"CREATE TABLE {TABLE} ({COLUMNS.format(created_at='')}, PRIMARY KEY (id))")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    _create_indexes()
+    op.execute(f"INSERT INTO {TABLE} ({COLUMN_NAMES}, created_at) SELECT {COLUMN_NAMES}, created_at FROM {old}")
+    op.execute(f"DROP TABLE {old}")  # drops every partition with it
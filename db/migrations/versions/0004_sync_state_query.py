@@ -0,0 +1,24 @@
+"""Remember the Gmail search query of the full scan behind each sync state
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all may already have added it on a database newer than 0001
+    if op.get_context().as_sql or "query" not in {c["name"] for c in sa.inspect(op.get_bind()).get_columns("gmail_sync_states")}:
+        op.add_column("gmail_sync_states", sa.Column("query", sa.Text, nullable=True))
+
+
+def downgrade():
+    op.drop_column("gmail_sync_states", "query")
@@ -0,0 +1,34 @@
+"""Index oauth_tokens.expiry for the token refresher
+
+The refresher selects tokens by expiry. Databases built by create_all
+before the column was indexed are skipped by 0001, so the index is
+added here. On PostgreSQL it is built CONCURRENTLY.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_oauth_tokens_expiry"
+
+
+def _concurrently() -> dict:
+    return {"postgresql_concurrently": True} if op.get_context().dialect.name == "postgresql" else {}
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(INDEX, "oauth_tokens", ["expiry"], if_not_exists=True, **_concurrently())
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="oauth_tokens", if_exists=True, **_concurrently())
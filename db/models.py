@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, LargeBinary
+from sqlalchemy import Column, String, Integer, BigInteger, Date, DateTime, Text, Boolean, LargeBinary, UniqueConstraint, Index, text
 from sqlalchemy.sql import func
 from .session import Base
 
@@ -18,12 +18,29 @@ class OAuthToken(Base):
     scope = Column(Text)
     access_token = Column(LargeBinary)     # encrypted
     refresh_token = Column(LargeBinary)    # encrypted
-    expiry = Column(DateTime)
+    expiry = Column(DateTime, index=True)  # token_refresher scans by expiry
 
+# On PostgreSQL this table is range-partitioned by month on created_at
+# (migration 0003, primary key (id, created_at)); see db/retention.py
 class MailDecisionLog(Base):
     __tablename__ = "mail_decision_logs"
+    # Matched to the access paths; keep in sync with db/migrations/versions
+    __table_args__ = (
+        # time windows per user: timeline, retention, load_previous_decisions
+        Index("ix_mail_decision_logs_user_created", "user_id", "created_at"),
+        # cleanup marks applied by (user_id, message_id IN ...)
+        Index("ix_mail_decision_logs_user_message", "user_id", "message_id"),
+        # counts/sizes by decision - covering on PostgreSQL
+        Index("ix_mail_decision_logs_user_proposed_applied", "user_id", "proposed", "applied",
+              postgresql_include=["size_bytes"]),
+        # top delete senders - only "delete" rows are indexed
+        Index("ix_mail_decision_logs_delete_senders", "user_id", "sender_hash",
+              postgresql_include=["size_bytes"],
+              postgresql_where=text("proposed = 'delete'"),
+              sqlite_where=text("proposed = 'delete'")),
+    )
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)              # leads the composite indexes above
     message_id = Column(String, index=True)
     
     # Sender info (no PII - hashed/domain only)
@@ -68,4 +85,34 @@ class OAuthState(Base):
     user_id = Column(Integer, nullable=True)  # Optional: if we know the user
     redirect_uri = Column(String, nullable=True)  # Where to redirect after OAuth
     expires_at = Column(DateTime, index=True)  # State expires after 30 minutes
-    created_at = Column(DateTime, server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now())
+
+class GmailSyncState(Base):
+    __tablename__ = "gmail_sync_states"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    oauth_token_id = Column(Integer, unique=True, index=True)  # history is per mailbox, i.e. per token
+    history_id = Column(String)            # Gmail historyId the last scan is current up to
+    full_scan_at = Column(DateTime)        # start of the last full scan - older decision logs are stale
+    query = Column(Text)                   # Gmail `q` of that full scan - incremental scans must match it
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+# Per-user, per-day rollup of mail_decision_logs maintained by db/stats_rollup.py
+class UserDailyStats(Base):
+    __tablename__ = "user_daily_stats"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_user_daily_stats_user_day"),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)              # leads the unique index
+    day = Column(Date)                     # date the decisions were logged (created_at)
+    scanned = Column(Integer, default=0)
+    scanned_bytes = Column(BigInteger, default=0)
+    delete_count = Column(Integer, default=0)
+    delete_bytes = Column(BigInteger, default=0)
+    review_count = Column(Integer, default=0)
+    review_bytes = Column(BigInteger, default=0)
+    keep_count = Column(Integer, default=0)
+    keep_bytes = Column(BigInteger, default=0)
+    applied = Column(Integer, default=0)   # any applied decision (trash or label)
+    deleted = Column(Integer, default=0)   # applied "delete" decisions
+    deleted_bytes = Column(BigInteger, default=0)
+    last_scan_at = Column(DateTime)        # newest created_at logged on this day
@@ -0,0 +1,195 @@
+"""
+Connection pool configuration and telemetry
+
+Pool sizing and disconnect handling come from the environment:
+
+    DB_POOL_SIZE        connections kept open (default 5)
+    DB_MAX_OVERFLOW     extra connections allowed under load (default 10)
+    DB_POOL_TIMEOUT     seconds to wait for a connection before failing (default 30)
+    DB_POOL_RECYCLE     reconnect connections older than this many seconds (default 1800, -1 disables)
+    DB_DISCONNECT_MODE  "pre_ping" tests every connection on checkout (one extra round trip);
+                        "optimistic" skips that and relies on recycle plus SQLAlchemy
+                        invalidating the pool when a disconnect error surfaces
+
+Pools are instrumented so checkout wait time, timeouts and saturation
+(checked out / size + overflow) can be watched before the pool runs dry.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+DISCONNECT_MODES = ("pre_ping", "optimistic")
+WAIT_SAMPLES = 1000  # recent checkouts kept for the wait-time percentiles
+
+
+@dataclass
+class PoolSettings:
+    size: int = 5
+    max_overflow: int = 10
+    timeout: float = 30
+    recycle: int = 1800
+    disconnect_mode: str = "pre_ping"
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        mode = os.getenv("DB_DISCONNECT_MODE", "pre_ping").lower()
+        if mode not in DISCONNECT_MODES:
+            raise ValueError(f"DB_DISCONNECT_MODE must be one of {DISCONNECT_MODES}, got {mode!r}")
+        return cls(
+            size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            disconnect_mode=mode,
+        )
+
+    @property
+    def capacity(self) -> int | None:
+        """Most connections the pool will open, None when overflow is unlimited"""
+        return None if self.max_overflow < 0 else self.size + self.max_overflow
+
+
+class PoolMetrics:
+    """Counters and recent checkout wait times for one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.peak_checked_out = 0
+            self.max_wait = 0.0
+            self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record_checkout(self, wait: float, checked_out: int):
+        with self._lock:
+            self.checkouts += 1
+            self._waits.append(wait)
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "peak_checked_out": self.peak_checked_out,
+                "wait_ms": {
+                    "avg": round(sum(waits) / len(waits) * 1000, 3) if waits else 0.0,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+                    "max": round(self.max_wait * 1000, 3),
+                },
+            }
+
+
+# Keyed by the pool's logging name, which survives Pool.recreate() on dispose
+_metrics: dict[str, PoolMetrics] = {}
+
+
+def get_pool_metrics(name: str) -> PoolMetrics:
+    return _metrics.setdefault(name, PoolMetrics())
+
+
+class _TimedCheckout:
+    """Times how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        metrics = get_pool_metrics(self._orig_logging_name)
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_timeout(time.perf_counter() - start)
+            logger.warning(
+                f"DB pool '{self._orig_logging_name}' exhausted: no connection within {self._timeout}s "
+                f"({self.checkedout()} checked out)"
+            )
+            raise
+        metrics.record_checkout(time.perf_counter() - start, self.checkedout())
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _in_memory_sqlite(url: str) -> bool:
+    u = make_url(url)
+    return u.get_backend_name() == "sqlite" and (u.database in (None, "", ":memory:") or u.query.get("mode") == "memory")
+
+
+def engine_kwargs(url: str, name: str, settings: PoolSettings, is_async: bool = False) -> dict:
+    """Keyword arguments for create_engine / create_async_engine"""
+    kwargs = {"pool_pre_ping": settings.disconnect_mode == "pre_ping"}
+    if _in_memory_sqlite(url):
+        # One shared connection per process - sizing doesn't apply
+        return kwargs
+    kwargs.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=settings.size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.timeout,
+        pool_recycle=settings.recycle,
+        pool_logging_name=name,
+    )
+    return kwargs
+
+
+def instrument_engine(sync_engine, name: str):
+    """Count new and invalidated connections (disconnects show up here in optimistic mode)"""
+    metrics = get_pool_metrics(name)
+    event.listen(sync_engine, "connect", lambda *args: metrics.record_connect())
+    event.listen(sync_engine, "invalidate", lambda *args: metrics.record_invalidation())
+
+
+def pool_stats(pool, name: str, settings: PoolSettings) -> dict:
+    """Current occupancy plus the recorded metrics of an engine's pool"""
+    stats = {"pool_class": type(pool).__name__, "disconnect_mode": settings.disconnect_mode}
+    if isinstance(pool, QueuePool):
+        checked_out = pool.checkedout()
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": settings.max_overflow,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            # Nearing 1.0 means checkouts are about to queue for DB_POOL_TIMEOUT
+            "saturation": round(checked_out / settings.capacity, 3) if settings.capacity else None,
+        })
+    stats.update(get_pool_metrics(name).snapshot())
+    return stats
@@ -0,0 +1,256 @@
+"""
+Retention and compaction for mail_decision_logs
+
+Every scan logs one row per message, so the table grows with scans x
+mailbox size. On PostgreSQL it is range-partitioned by month on
+created_at (migration 0003) and this job:
+
+  - creates the monthly partitions for the coming months
+  - compacts preview rows: an unapplied decision older than
+    DECISION_LOG_COMPACT_AFTER_DAYS is dropped when a newer row exists for
+    the same (user_id, message_id) - only the latest decision is ever read.
+    A whole month is compacted at once, once it is past that age: its
+    surviving rows are copied into a fresh partition that is swapped in,
+    so compaction leaves no dead tuples either
+  - drops partitions older than DECISION_LOG_RETENTION_MONTHS, after
+    folding any days missing from user_daily_stats into it, so stats keep
+    their history
+
+Dropping a partition is a catalog change - no per-row DELETE, no dead
+tuples for vacuum, no index bloat. Other databases (and an unpartitioned
+PostgreSQL table) fall back to deleting superseded and expired rows.
+
+Compacted days keep their user_daily_stats rows as they were counted;
+stats_rollup.rebuild_stats() does not recompute days before
+compaction_cutoff().
+
+Run it daily from cron or a scheduled job:
+
+    python -m db.retention
+"""
+
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, exists, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, aliased
+
+from .models import MailDecisionLog
+from .stats_rollup import summarize_days
+
+logger = logging.getLogger(__name__)
+
+TABLE = MailDecisionLog.__tablename__
+RETENTION_MONTHS = int(os.getenv("DECISION_LOG_RETENTION_MONTHS", 12))  # 0 keeps everything
+COMPACT_AFTER_DAYS = int(os.getenv("DECISION_LOG_COMPACT_AFTER_DAYS", 30))
+PARTITIONS_AHEAD = int(os.getenv("DECISION_LOG_PARTITIONS_AHEAD", 3))
+
+_PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+COMPACTED = "compacted"  # table comment of a partition that was rewritten by compaction
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    """First day of the month `months` after d's month"""
+    years, month = divmod(d.month - 1 + months, 12)
+    return date(d.year + years, month + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {"table": TABLE})
+
+
+def list_partitions(db: Session) -> list[tuple[str, date]]:
+    """Monthly partitions as (name, first day of month), oldest first - the default partition is skipped"""
+    names = db.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": TABLE})
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(months, key=lambda p: p[1])
+
+
+def ensure_partitions(db: Session, today: date | None = None, ahead: int = PARTITIONS_AHEAD) -> list[str]:
+    """Create the partitions for this month and the next `ahead` months. Returns the names created."""
+    if not is_partitioned(db):
+        return []
+    existing = {name for name, _ in list_partitions(db)}
+    first = month_start(today or date.today())
+    created = []
+    for i in range(ahead + 1):
+        month = add_months(first, i)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(text(
+                    f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                ))
+        except DBAPIError as e:
+            # Rows for that month already landed in the default partition
+            logger.warning(f"Could not create partition {name}: {str(e).splitlines()[0]}")
+            continue
+        created.append(name)
+    db.commit()
+    if created:
+        logger.info(f"Created decision log partitions: {', '.join(created)}")
+    return created
+
+
+def compaction_cutoff(now: datetime | None = None) -> datetime:
+    """Decisions logged before this may have been compacted away"""
+    return (now or datetime.now()) - timedelta(days=COMPACT_AFTER_DAYS)
+
+
+def compact_previews(db: Session, before: datetime) -> int:
+    """
+    Drop unapplied decisions logged before `before` that a newer decision
+    for the same (user_id, message_id) supersedes. Returns the number of
+    rows dropped. Partitioned tables are compacted a month at a time (see
+    compact_partition); otherwise rows are deleted user by user.
+    """
+    if is_partitioned(db):
+        total = 0
+        for name, month in list_partitions(db):
+            if datetime.combine(add_months(month, 1), datetime.min.time()) > before:
+                break
+            if db.scalar(text("SELECT obj_description(CAST(:name AS regclass), 'pg_class')"), {"name": name}) != COMPACTED:
+                total += compact_partition(db, name, month)
+        return total
+    return _delete_superseded(db, before)
+
+
+def compact_partition(db: Session, name: str, month: date) -> int:
+    """
+    Rewrite a monthly partition without its superseded previews and swap it
+    in for the old one, in one transaction. Returns the number of rows dropped.
+
+    Applies to the month are blocked while it is copied so none is lost;
+    other months are only blocked for the detach/attach at the end.
+    """
+    fresh = f"{name}_compact"
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    db.execute(text(f'LOCK TABLE "{name}" IN SHARE MODE'))
+    db.execute(text(f'CREATE TABLE "{fresh}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES)'))
+    rows = db.scalar(text(f'SELECT count(*) FROM "{name}"'))
+    kept = db.execute(text(
+        f'INSERT INTO "{fresh}" SELECT * FROM "{name}" AS log '
+        f"WHERE log.applied IS NOT FALSE OR NOT EXISTS ("
+        f'SELECT 1 FROM "{TABLE}" AS newer WHERE newer.user_id = log.user_id '
+        f"AND newer.message_id = log.message_id AND newer.id > log.id)"
+    )).rowcount
+    # A CHECK matching the bounds lets ATTACH skip scanning the new partition
+    db.execute(text(f'ALTER TABLE "{fresh}" ADD CONSTRAINT "{fresh}_bounds" '
+                    f"CHECK (created_at >= '{start}' AND created_at < '{end}')"))
+    db.execute(text(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"'))
+    db.execute(text(f'DROP TABLE "{name}"'))
+    db.execute(text(f'ALTER TABLE "{fresh}" RENAME TO "{name}"'))
+    db.execute(text(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+    db.execute(text(f'ALTER TABLE "{name}" DROP CONSTRAINT "{fresh}_bounds"'))
+    db.execute(text(f"""COMMENT ON TABLE "{name}" IS '{COMPACTED}'"""))
+    db.commit()
+    dropped = rows - kept
+    logger.info(f"Compacted decision log partition {name}: {dropped} superseded previews dropped, {kept} rows kept")
+    return dropped
+
+
+def _delete_superseded(db: Session, before: datetime) -> int:
+    """Unpartitioned fallback of compact_previews: user by user, to keep transactions short"""
+    log = MailDecisionLog
+    newer = aliased(MailDecisionLog)
+    user_ids = db.scalars(select(log.user_id).where(log.created_at < before).distinct()).all()
+    total = 0
+    for user_id in user_ids:
+        result = db.execute(
+            delete(log).where(
+                log.user_id == user_id,
+                log.applied == False,  # noqa: E712
+                log.created_at < before,
+                exists().where(
+                    newer.user_id == log.user_id,
+                    newer.message_id == log.message_id,
+                    newer.id > log.id,
+                ),
+            ).execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += result.rowcount or 0
+    if total:
+        logger.info(f"Compacted {total} superseded preview decisions logged before {before:%Y-%m-%d}")
+    return total
+
+
+def drop_expired_partitions(db: Session, cutoff: date) -> list[str]:
+    """Drop monthly partitions that end on or before `cutoff`, summarizing them into the rollup first"""
+    dropped = []
+    for name, month in list_partitions(db):
+        end = add_months(month, 1)
+        if end > cutoff:
+            break
+        added = summarize_days(db, datetime.combine(month, datetime.min.time()), datetime.combine(end, datetime.min.time()))
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+        dropped.append(name)
+        logger.info(f"Dropped decision log partition {name} ({added} days added to user_daily_stats)")
+    return dropped
+
+
+def delete_expired_rows(db: Session, cutoff: date) -> int:
+    """Unpartitioned fallback: summarize, then delete rows logged before `cutoff`"""
+    cutoff_at = datetime.combine(cutoff, datetime.min.time())
+    summarize_days(db, None, cutoff_at)
+    result = db.execute(
+        delete(MailDecisionLog).where(MailDecisionLog.created_at < cutoff_at).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        logger.info(f"Deleted {result.rowcount} decision logs from before {cutoff}")
+    return result.rowcount or 0
+
+
+def run_retention(db: Session, now: datetime | None = None) -> dict:
+    """One pass of partition upkeep, compaction and retention"""
+    now = now or datetime.now()
+    summary = {
+        "partitions_created": ensure_partitions(db, now.date()),
+        "previews_compacted": compact_previews(db, compaction_cutoff(now)),
+        "partitions_dropped": [],
+        "rows_deleted": 0,
+    }
+    if RETENTION_MONTHS > 0:
+        cutoff = add_months(month_start(now.date()), -RETENTION_MONTHS)
+        if is_partitioned(db):
+            summary["partitions_dropped"] = drop_expired_partitions(db, cutoff)
+        # Unpartitioned tables, or old rows that landed in the default partition
+        summary["rows_deleted"] = delete_expired_rows(db, cutoff)
+    return summary
+
+
+if __name__ == "__main__":
+    from .session import session_scope
+
+    logging.basicConfig(level=logging.INFO)
+    with session_scope("decision_log_retention") as db:
+        logger.info(f"Decision log retention: {run_retention(db)}")
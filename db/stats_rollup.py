@@ -0,0 +1,234 @@
+"""
+Incremental per-user, per-day statistics (user_daily_stats)
+
+The stats endpoints used to aggregate a user's whole mail_decision_logs
+history on every call. Counters are now bumped in the same transaction
+that writes the log: record_decisions() when preview decisions are
+inserted, mark_applied() when a cleanup succeeds. Days are the date the
+decision was logged, so the rollup matches grouping the log by
+created_at.
+
+rebuild_stats() recomputes the rollup from the log - run it once after
+deploying over an existing database. Days old enough to have been
+compacted (db/retention.py) are only filled in where the rollup has no
+row, since their log no longer holds every decision that was counted:
+
+    python -m db.stats_rollup
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import and_, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import MailDecisionLog, UserDailyStats
+
+logger = logging.getLogger(__name__)
+
+DECISIONS = ("delete", "review", "keep")
+COUNTERS = (
+    "scanned", "scanned_bytes",
+    "delete_count", "delete_bytes", "review_count", "review_bytes", "keep_count", "keep_bytes",
+    "applied", "deleted", "deleted_bytes",
+)
+
+_TODAY = object()  # rows without created_at get the database's current date, like the log's server default
+
+
+def _as_date(value) -> date:
+    # func.date() comes back as a string on SQLite
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _upsert(db: Session, user_id: int, day, counters: dict, touch_last_scan: bool = False):
+    """Add counters to the (user_id, day) row, creating it if needed"""
+    table = UserDailyStats.__table__
+    day_value = func.current_date() if day is _TODAY else day
+    values = {"user_id": user_id, "day": day_value, **counters}
+    if touch_last_scan:
+        values["last_scan_at"] = func.now()
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).values(values)
+        set_ = {name: table.c[name] + stmt.excluded[name] for name in counters}
+        if touch_last_scan:
+            set_["last_scan_at"] = stmt.excluded.last_scan_at
+        db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "day"], set_=set_))
+        return
+
+    # Other backends: update, insert if there was nothing to update
+    set_ = {name: table.c[name] + amount for name, amount in counters.items()}
+    if touch_last_scan:
+        set_["last_scan_at"] = func.now()
+    result = db.execute(update(table).where(table.c.user_id == user_id, table.c.day == day_value).values(set_))
+    if result.rowcount == 0:
+        db.execute(insert(table).values(values))
+
+
+def _empty() -> dict:
+    return dict.fromkeys(COUNTERS, 0)
+
+
+def record_decisions(db: Session, rows: list[dict]):
+    """
+    Count freshly inserted MailDecisionLog rows (dicts of column values).
+    Does not commit - call in the transaction that inserts the rows.
+    """
+    per_day = defaultdict(_empty)
+    for row in rows:
+        created_at = row.get("created_at")
+        c = per_day[(row["user_id"], _as_date(created_at) if created_at else _TODAY)]
+        size = row.get("size_bytes") or 0
+        c["scanned"] += 1
+        c["scanned_bytes"] += size
+        if row.get("proposed") in DECISIONS:
+            c[f"{row['proposed']}_count"] += 1
+            c[f"{row['proposed']}_bytes"] += size
+        if row.get("applied"):
+            c["applied"] += 1
+            if row.get("proposed") == "delete":
+                c["deleted"] += 1
+                c["deleted_bytes"] += size
+
+    for (user_id, day), counters in per_day.items():
+        _upsert(db, user_id, day, {k: v for k, v in counters.items() if v}, touch_last_scan=True)
+
+
+def mark_applied(db: Session, user_id: int, message_ids: list[str]) -> int:
+    """
+    Mark a user's logged decisions for `message_ids` applied and count them
+    into the rollup. Only rows flipping from unapplied are counted, so
+    re-applying the same messages is a no-op. Does not commit.
+    Returns the number of log rows changed.
+    """
+    if not message_ids:
+        return 0
+    changed = db.execute(
+        update(MailDecisionLog)
+        .where(
+            MailDecisionLog.user_id == user_id,
+            MailDecisionLog.message_id.in_(message_ids),
+            MailDecisionLog.applied == False,  # noqa: E712
+        )
+        .values(applied=True)
+        .returning(MailDecisionLog.created_at, MailDecisionLog.proposed, MailDecisionLog.size_bytes),
+        execution_options={"synchronize_session": False},
+    ).all()
+
+    per_day = defaultdict(_empty)
+    for created_at, proposed, size_bytes in changed:
+        c = per_day[_as_date(created_at)]
+        c["applied"] += 1
+        if proposed == "delete":
+            c["deleted"] += 1
+            c["deleted_bytes"] += size_bytes or 0
+
+    for day, counters in per_day.items():
+        _upsert(db, user_id, day, {k: v for k, v in counters.items() if v})
+    return len(changed)
+
+
+def delete_user_stats(db: Session, user_id: int):
+    """Drop a user's rollup rows (with their decision logs). Does not commit."""
+    db.execute(delete(UserDailyStats).where(UserDailyStats.user_id == user_id))
+
+
+def _daily_aggregate(user_id: int | None = None, start: datetime | None = None, end: datetime | None = None):
+    """SELECT of rollup rows computed from mail_decision_logs, optionally limited to [start, end)"""
+    log = MailDecisionLog
+    size = func.coalesce(log.size_bytes, 0)
+    deleted = and_(log.proposed == "delete", log.applied == True)  # noqa: E712
+
+    def count_if(cond):
+        return func.sum(case((cond, 1), else_=0))
+
+    def bytes_if(cond):
+        return func.sum(case((cond, size), else_=0))
+
+    day = func.date(log.created_at)
+    aggregate = select(
+        log.user_id,
+        day.label("day"),
+        func.count(log.id),
+        func.sum(size),
+        count_if(log.proposed == "delete"), bytes_if(log.proposed == "delete"),
+        count_if(log.proposed == "review"), bytes_if(log.proposed == "review"),
+        count_if(log.proposed == "keep"), bytes_if(log.proposed == "keep"),
+        count_if(log.applied == True),  # noqa: E712
+        count_if(deleted), bytes_if(deleted),
+        func.max(log.created_at),
+    ).group_by(log.user_id, day)
+    if user_id is not None:
+        aggregate = aggregate.where(log.user_id == user_id)
+    if start is not None:
+        aggregate = aggregate.where(log.created_at >= start)
+    if end is not None:
+        aggregate = aggregate.where(log.created_at < end)
+    return aggregate
+
+
+def rebuild_stats(db: Session, user_id: int | None = None, now: datetime | None = None):
+    """
+    Recompute the rollup from mail_decision_logs for one user, or everyone. Commits.
+
+    Days older than the oldest remaining log row are left alone - their
+    logs were removed by retention (db/retention.py) and the rollup rows
+    are all that is left of them. Days before the compaction cutoff lost
+    their superseded previews, so they are only added where missing.
+    """
+    from .retention import compaction_cutoff
+
+    oldest = select(func.min(MailDecisionLog.created_at))
+    if user_id is not None:
+        oldest = oldest.where(MailDecisionLog.user_id == user_id)
+    oldest = db.scalar(oldest)
+    if oldest is None:
+        return
+
+    start = datetime.combine(max(_as_date(oldest), compaction_cutoff(now).date()), datetime.min.time())
+    clear = delete(UserDailyStats).where(UserDailyStats.day >= start.date())
+    if user_id is not None:
+        clear = clear.where(UserDailyStats.user_id == user_id)
+
+    db.execute(clear)
+    db.execute(insert(UserDailyStats).from_select(
+        ["user_id", "day", *COUNTERS, "last_scan_at"], _daily_aggregate(user_id, start=start)
+    ))
+    summarize_days(db, None, start, user_id)
+    db.commit()
+
+
+def summarize_days(db: Session, start: datetime | None, end: datetime, user_id: int | None = None) -> int:
+    """
+    Add rollup rows for days in [start, end) that have log rows but no
+    rollup row yet (history from before the rollup existed), so the logs
+    can be dropped without losing their stats. Existing rows are kept as
+    they are. Does not commit. Returns the number of rows added.
+    """
+    aggregate = _daily_aggregate(user_id, start=start, end=end).subquery()
+    missing = select(aggregate).where(~select(UserDailyStats.id).where(
+        UserDailyStats.user_id == aggregate.c.user_id,
+        UserDailyStats.day == aggregate.c.day
+    ).exists())
+    result = db.execute(insert(UserDailyStats).from_select(["user_id", "day", *COUNTERS, "last_scan_at"], missing))
+    return result.rowcount or 0
+
+
+if __name__ == "__main__":
+    from .session import session_scope
+
+    logging.basicConfig(level=logging.INFO)
+    with session_scope("stats_rollup") as db:
+        rebuild_stats(db)
+    logger.info("Rebuilt user_daily_stats from mail_decision_logs")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Query plans and latency for mail_decision_logs access paths, before and
+after the composite/partial indexes (migration 0002)
+
+Fills the table with synthetic decisions for a few fake users, then for
+each index layout prints EXPLAIN output and the median latency of the
+queries the app runs. Rebuilds indexes, so point it at a scratch database:
+
+    python scripts/benchmark_decision_log_indexes.py --database-url postgresql://.../deklutter_bench
+
+PostgreSQL plans use EXPLAIN (ANALYZE, BUFFERS); SQLite gets EXPLAIN QUERY PLAN.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import Index, create_engine, delete, insert, text  # noqa: E402
+
+from db.models import Base, MailDecisionLog  # noqa: E402
+
+TABLE = MailDecisionLog.__table__
+NEW_INDEXES = [i for i in TABLE.indexes if i.name in (
+    "ix_mail_decision_logs_user_created",
+    "ix_mail_decision_logs_user_message",
+    "ix_mail_decision_logs_user_proposed_applied",
+    "ix_mail_decision_logs_delete_senders",
+)]
+OLD_USER_INDEX = Index("ix_mail_decision_logs_user_id", TABLE.c.user_id)
+FIRST_USER_ID = 900_000_000  # synthetic users, removed afterwards
+
+QUERIES = {
+    "timeline (user_id, created_at)": """
+        SELECT date(created_at), count(*) FROM mail_decision_logs
+        WHERE user_id = :user_id AND created_at >= :since GROUP BY date(created_at)""",
+    "deleted totals (user_id, proposed, applied)": """
+        SELECT count(*), sum(size_bytes) FROM mail_decision_logs
+        WHERE user_id = :user_id AND proposed = 'delete' AND applied = :applied""",
+    "top delete senders": """
+        SELECT sender_hash, count(*), sum(size_bytes) FROM mail_decision_logs
+        WHERE user_id = :user_id AND proposed = 'delete'
+        GROUP BY sender_hash ORDER BY count(*) DESC LIMIT 10""",
+    "apply lookup (user_id, message_id IN ...)": """
+        SELECT id FROM mail_decision_logs
+        WHERE user_id = :user_id AND message_id IN ({ids}) AND applied = :unapplied""",
+}
+
+
+def populate(engine, users: int, rows_per_user: int):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for u in range(users):
+            user_id = FIRST_USER_ID + u
+            batch = []
+            for i in range(rows_per_user):
+                batch.append({
+                    "user_id": user_id,
+                    "message_id": f"m{u}-{i}",
+                    "sender_hash": f"s{random.randint(0, 500)}",
+                    "size_bytes": random.randint(2_000, 200_000),
+                    "proposed": random.choices(["delete", "review", "keep"], [5, 2, 3])[0],
+                    "confidence": 80,
+                    "applied": random.random() < 0.2,
+                    "created_at": now - timedelta(minutes=random.randint(0, 365 * 24 * 60)),
+                })
+                if len(batch) == 5000:
+                    conn.execute(insert(TABLE), batch)
+                    batch = []
+            if batch:
+                conn.execute(insert(TABLE), batch)
+
+
+def use_layout(engine, layout: str):
+    drop, create = (NEW_INDEXES, [OLD_USER_INDEX]) if layout == "before" else ([OLD_USER_INDEX], NEW_INDEXES)
+    with engine.begin() as conn:
+        for index in drop:
+            index.drop(conn, checkfirst=True)
+        for index in create:
+            index.create(conn, checkfirst=True)
+        conn.execute(text("ANALYZE mail_decision_logs" if engine.dialect.name == "postgresql" else "ANALYZE"))
+
+
+def run_queries(engine, user_id: int, runs: int):
+    params = {
+        "user_id": user_id,
+        "since": datetime.utcnow() - timedelta(days=30),
+        "applied": True,
+        "unapplied": False,
+    }
+    ids = ", ".join(f"'m{user_id - FIRST_USER_ID}-{i}'" for i in range(0, 2000, 20))
+    explain = "EXPLAIN (ANALYZE, BUFFERS)" if engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN"
+
+    with engine.connect() as conn:
+        for label, sql in QUERIES.items():
+            stmt = text(sql.format(ids=ids))
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                conn.execute(stmt, params).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            plan = conn.execute(text(f"{explain} {sql.format(ids=ids)}"), params).all()
+            print(f"\n-- {label}: median {statistics.median(timings):.2f} ms over {runs} runs")
+            for row in plan:
+                print("   ", " | ".join(str(col) for col in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="scratch database - indexes are rebuilt")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--rows-per-user", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine, tables=[TABLE])
+    random.seed(42)
+    print(f"Inserting {args.users} x {args.rows_per_user} synthetic decisions...")
+    populate(engine, args.users, args.rows_per_user)
+    try:
+        for layout in ("before", "after"):
+            use_layout(engine, layout)
+            print(f"\n===== {layout}: {'user_id only' if layout == 'before' else 'composite/partial indexes'} =====")
+            run_queries(engine, FIRST_USER_ID, args.runs)
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(TABLE).where(TABLE.c.user_id >= FIRST_USER_ID))
+        use_layout(engine, "after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Cache of verified access tokens -> authenticated user
+
+get_current_user decodes the JWT and looks the user up on every request;
+dashboard polling makes that a DB query per poll. A verified token is
+remembered by its SHA-256 digest for AUTH_CACHE_TTL seconds, never past
+the token's own exp, and dropped when the user is deactivated, revokes
+access or is deleted.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from db.models import User
+
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 60))  # seconds
+AUTH_CACHE_MAX_ENTRIES = 10_000
+
+_entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()  # digest -> (expires_at, user_id, CurrentUser)
+_digests_by_user: dict[int, set[str]] = {}
+_lock = threading.Lock()
+
+
+def token_digest(token: str) -> str:
+    """Cache key for a token - raw tokens are never kept"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_cached_user(token: str):
+    """The CurrentUser for a previously verified token, or None"""
+    digest = token_digest(token)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(digest)
+        if entry is None:
+            return None
+        expires_at, user_id, current_user = entry
+        if expires_at <= now:
+            _remove(digest, user_id)
+            return None
+        _entries.move_to_end(digest)
+        return current_user
+
+
+def cache_user(token: str, user_id: int, current_user, token_exp: float | None):
+    """Remember a verified token until min(now + AUTH_CACHE_TTL, exp)"""
+    expires_at = time.time() + AUTH_CACHE_TTL
+    if token_exp is not None:
+        expires_at = min(expires_at, token_exp)
+    digest = token_digest(token)
+    with _lock:
+        _entries[digest] = (expires_at, user_id, current_user)
+        _entries.move_to_end(digest)
+        _digests_by_user.setdefault(user_id, set()).add(digest)
+        while len(_entries) > AUTH_CACHE_MAX_ENTRIES:
+            old_digest, (_, old_user_id, _) = _entries.popitem(last=False)
+            _discard_digest(old_digest, old_user_id)
+
+
+def invalidate_user_auth(user_id: int):
+    """Forget every cached token of a user (deactivation, revoke, deletion)"""
+    with _lock:
+        for digest in _digests_by_user.pop(user_id, set()):
+            _entries.pop(digest, None)
+
+
+def clear_auth_cache():
+    """Drop every cached token (for testing)"""
+    with _lock:
+        _entries.clear()
+        _digests_by_user.clear()
+
+
+def _remove(digest: str, user_id: int):
+    _entries.pop(digest, None)
+    _discard_digest(digest, user_id)
+
+
+def _discard_digest(digest: str, user_id: int):
+    digests = _digests_by_user.get(user_id)
+    if digests is not None:
+        digests.discard(digest)
+        if not digests:
+            del _digests_by_user[user_id]
+
+
+@event.listens_for(User.is_active, "set")
+def _on_deactivate(target, value, oldvalue, initiator):
+    # ORM attribute changes only - bulk query.update() callers invalidate themselves
+    if not value and target.id is not None:
+        invalidate_user_auth(target.id)
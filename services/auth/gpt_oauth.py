@@ -10,12 +10,18 @@ from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Form
 from fastapi.responses import RedirectResponse, HTMLResponse
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.session import get_db
+from db.session import get_db, get_async_db
 from db.models import User, OAuthToken, OAuthState
 from services.auth.oauth.handler import UnifiedOAuthHandler
 from services.auth.utils import create_access_token, create_refresh_token
+from services.gmail_connector.sync import delete_sync_states
+from services.gmail_connector.metadata_cache import get_metadata_cache
+from services.gmail_connector.credential_cache import invalidate_credentials
+from services.auth.auth_cache import invalidate_user_auth
 
 logger = logging.getLogger(__name__)
 
@@ -75,18 +81,50 @@ def cleanup_expired_states(db: Session):
     return deleted
 
 
+async def create_oauth_state_async(db: AsyncSession, state: str, provider: str, source: str,
+                                   gpt_state: str = None, gpt_redirect_uri: str = None,
+                                   client_id: str = None) -> OAuthState:
+    """create_oauth_state on the async session"""
+    oauth_state = OAuthState(
+        state=state,
+        provider=provider,
+        source=source,
+        redirect_uri=gpt_redirect_uri,
+        expires_at=datetime.utcnow() + timedelta(minutes=30)
+    )
+    db.add(oauth_state)
+    await db.commit()
+    
+    logger.info(f"Created OAuth state: {state} (expires in 30 min)")
+    return oauth_state
+
+
+async def cleanup_expired_states_async(db: AsyncSession):
+    """cleanup_expired_states on the async session"""
+    result = await db.execute(
+        delete(OAuthState).where(OAuthState.expires_at <= datetime.utcnow())
+    )
+    deleted = result.rowcount
+    
+    if deleted > 0:
+        await db.commit()
+        logger.info(f"Cleaned up {deleted} expired OAuth states")
+    
+    return deleted
+
+
 # In-memory storage for refresh tokens (TODO: move to Redis in production)
 _refresh_tokens = {}
 
 
 @router.get("/gpt/oauth/authorize")
-def gpt_oauth_authorize(
+async def gpt_oauth_authorize(
     response_type: str,
     client_id: str,
     redirect_uri: str,
     scope: str = "",
     state: str = "",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     GPT OAuth authorization endpoint.
@@ -96,7 +134,7 @@ def gpt_oauth_authorize(
     """
     try:
         # Clean up expired states first
-        cleanup_expired_states(db)
+        await cleanup_expired_states_async(db)
         
         # Generate unique session ID
         oauth_session_id = secrets.token_urlsafe(32)
@@ -105,7 +143,7 @@ def gpt_oauth_authorize(
         # We'll store the full state string with gpt_state embedded
         full_state = f"google:gpt:{oauth_session_id}:gptstate:{state}"
         
-        create_oauth_state(
+        await create_oauth_state_async(
             db=db,
             state=full_state,
             provider="google",
@@ -384,12 +422,16 @@ def gpt_oauth_revoke(
         
         # Delete all OAuth tokens for this user
         db.query(OAuthToken).filter(OAuthToken.user_id == user_id).delete()
+        delete_sync_states(db, user_id)
         
         # Clean up refresh token from memory
         if f"refresh_{user_id}" in _refresh_tokens:
             del _refresh_tokens[f"refresh_{user_id}"]
         
         db.commit()
+        invalidate_credentials(user_id)
+        get_metadata_cache().invalidate_user(user_id)
+        invalidate_user_auth(user_id)
         
         logger.info(f"Revoked all access for user: {user_email}")
         
@@ -401,14 +443,14 @@ def gpt_oauth_revoke(
 
 
 @router.post("/gpt/oauth/cleanup")
-def cleanup_oauth_states_endpoint(db: Session = Depends(get_db)):
+async def cleanup_oauth_states_endpoint(db: AsyncSession = Depends(get_async_db)):
     """
     Cleanup expired OAuth states.
     
     Can be called manually or by a cron job.
     """
     try:
-        deleted = cleanup_expired_states(db)
+        deleted = await cleanup_expired_states_async(db)
         return {
             "message": f"Cleaned up {deleted} expired OAuth states",
             "deleted_count": deleted
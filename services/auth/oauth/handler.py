@@ -13,6 +13,8 @@ from cryptography.fernet import Fernet
 from services.auth.oauth.factory import OAuthProviderFactory
 from services.auth.utils import create_access_token
 from db.models import User, OAuthToken
+from services.gmail_connector.credential_cache import invalidate_credentials
+from services.auth.auth_cache import invalidate_user_auth
 
 logger = logging.getLogger(__name__)
 
@@ -207,6 +209,7 @@ class UnifiedOAuthHandler:
                 logger.info(f"Stored new {provider} tokens for user_id={user_id}")
             
             db.commit()
+            invalidate_credentials(user_id)
             
         except Exception as e:
             logger.error(f"Failed to store provider tokens: {str(e)}")
@@ -284,6 +287,8 @@ class UnifiedOAuthHandler:
                 # Delete from database
                 db.delete(token)
                 db.commit()
+                invalidate_credentials(user_id)
+                invalidate_user_auth(user_id)
                 logger.info(f"Revoked {self.provider_name} access for user_id={user_id}")
             
             return success
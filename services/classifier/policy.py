@@ -1,4 +1,5 @@
 import hashlib
+import re
 from .llm_adapter import judge_edge_cases
 
 BULK_HINTS = ("unsubscribe", "newsletter", "marketing", "promotional")
@@ -33,6 +34,25 @@ IMPORTANT_KEYWORDS = {
     "otp", "password", "reset", "delivery", "shipped", "refund"
 }
 
+def _compile_matcher(terms) -> re.Pattern:
+    """
+    Compile a set of substrings into one alternation regex.
+    `pattern.search(text)` is truthy exactly when `any(t in text for t in terms)`,
+    but scans the text once instead of once per term.
+    """
+    # Longest first so overlapping terms ("gov.in" vs "gov") prefer the specific one
+    ordered = sorted(terms, key=len, reverse=True)
+    return re.compile("|".join(re.escape(t) for t in ordered))
+
+# Built once at import time - _heuristic runs for every scanned message
+_PROTECTED_RE = _compile_matcher(PROTECTED_DOMAINS)
+_IMPORTANT_RE = _compile_matcher(IMPORTANT_KEYWORDS)
+_BULK_RE = _compile_matcher(BULK_HINTS)
+
+def is_protected_sender(sender: str) -> bool:
+    """True for senders the policy never proposes to delete (PROTECTED_DOMAINS)"""
+    return bool(_PROTECTED_RE.search(sender.lower()))
+
 def _sender_hash(sender: str) -> str:
     return hashlib.sha1(sender.lower().encode()).hexdigest()[:12]
 
@@ -43,11 +63,11 @@ def _heuristic(item):
     size = item.get("size", 0)
 
     # SAFETY: Protected domains should NEVER be auto-deleted
-    if any(domain in sender for domain in PROTECTED_DOMAINS):
+    if _PROTECTED_RE.search(sender):
         return "keep", 0.95
     
     # SAFETY: Important keywords in subject → always review
-    if any(keyword in subject for keyword in IMPORTANT_KEYWORDS):
+    if _IMPORTANT_RE.search(subject):
         return "review", 0.90  # High confidence - user should review
     
     # SAFETY: Emails in INBOX (not in promotions) → be conservative
@@ -56,15 +76,13 @@ def _heuristic(item):
 
     # PRIMARY CLASSIFICATION: Trust Gmail's categories (most accurate)
     if labels & PROMO_LABELS:
-        # Gmail already categorized as promotional/social/forums
-        # Still check for important keywords even in promotions
-        if any(keyword in subject for keyword in IMPORTANT_KEYWORDS):
-            return "review", 0.80
+        # Gmail already categorized as promotional/social/forums.
+        # Important keywords were already routed to review above.
         # Trust Gmail's categorization - safe to delete
         return "delete", 0.85  # Increased confidence (Gmail is accurate)
 
     # SECONDARY: Newsletter/marketing keywords (less reliable than Gmail)
-    if any(h in sender or h in subject for h in BULK_HINTS):
+    if _BULK_RE.search(sender) or _BULK_RE.search(subject):
         return "delete", 0.70
 
     # Large messages with attachments → review
@@ -101,4 +119,16 @@ def classify_bulk(items: list[dict]):
         "counts": counts,
         "approx_size_mb": round(total_size/1_000_000,2)
     }
-    return {"items": results, "summary": summary}
\ No newline at end of file
+    return {"items": results, "summary": summary}
+
+def summarize_items(results: list[dict]):
+    """Rebuild a classify_bulk summary from classified items (e.g. merged from several batches)"""
+    counts = {"delete":0,"review":0,"keep":0}
+    for it in results:
+        counts[it["decision"]]+=1
+    total_size = sum(it["size"] for it in results)
+    return {
+        "total_items": len(results),
+        "counts": counts,
+        "approx_size_mb": round(total_size/1_000_000,2)
+    }
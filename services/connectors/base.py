@@ -4,7 +4,7 @@ All connectors (Gmail, Yahoo, Google Drive, etc.) must implement this interface.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator
 from datetime import datetime
 from enum import Enum
 
@@ -111,6 +111,50 @@ class BaseConnector(ABC):
         """
         pass
     
+    def stream_scan_items(
+        self,
+        user_id: int,
+        days_back: int = 30,
+        limit: int = 100,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream scan results as they are produced.
+        
+        Args:
+            user_id: User ID
+            days_back: Number of days to look back
+            limit: Maximum number of items to scan
+            filters: Optional filters
+            
+        Returns:
+            Async iterator of events:
+            {"type": "batch", "items": [...], "counts": {...}}  (repeated)
+            {"type": "summary", "summary": {...}, ...}          (last)
+            {"type": "error", "error": str, "message": str}    (on failure)
+            
+        Raises:
+            ValueError: If the provider does not support streaming
+        """
+        raise ValueError(f"Streaming scans are not supported for {self._get_provider_name()}")
+    
+    def quick_summary(self, user_id: int, db) -> Dict[str, Any]:
+        """
+        Estimated item counts from the provider's own counters, without
+        scanning items - a few API calls regardless of mailbox size.
+        
+        Args:
+            user_id: User ID
+            db: Database session
+            
+        Returns:
+            Provider-specific summary with "estimated": True
+            
+        Raises:
+            ValueError: If the provider has no counters to summarize from
+        """
+        raise ValueError(f"Quick summaries are not supported for {self._get_provider_name()}")
+    
     @abstractmethod
     def apply_action(
         self,
@@ -3,19 +3,30 @@ Gmail connector implementation using the BaseConnector interface.
 """
 
 import os
-import base64
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from cryptography.fernet import Fernet
+from googleapiclient.errors import HttpError
 import requests
 
 from services.connectors.base import BaseConnector, ProviderType, ItemCategory
-from db.models import OAuthToken, MailDecisionLog
+from db.models import OAuthToken
+from db.bulk import insert_decision_logs
+from db.stats_rollup import mark_applied
 from services.classifier.policy import classify_bulk
+from services.gmail_connector.api import stream_scan
+from services.gmail_connector.query import ScanFilters, build_query
+from services.gmail_connector.fields import masked
+from services.gmail_connector.summary import mailbox_summary
+from services.gmail_connector.bulk_actions import trash_messages, label_messages
+from services.gmail_connector.metadata_cache import (
+    DETAIL_FIELDS, STALE_HISTORY_TYPES, get_metadata_cache, stale_message_ids
+)
+from services.gmail_connector.client_pool import gmail_client
+from services.gmail_connector.oauth import _fernet
+from services.gmail_connector.credential_cache import get_user_credentials, sync_refreshed_token, invalidate_credentials
+from services.auth.auth_cache import invalidate_user_auth
 
 logger = logging.getLogger(__name__)
 
@@ -33,9 +44,8 @@ class GmailConnector(BaseConnector):
         self.redirect_uri = os.getenv("GOOGLE_REDIRECT_URI")
     
     def _get_fernet(self):
-        """Get Fernet encryption instance"""
-        key = base64.urlsafe_b64encode((os.getenv("APP_SECRET", "change-me") * 2)[:32].encode())
-        return Fernet(key)
+        """Get Fernet encryption instance (cached per APP_SECRET)"""
+        return _fernet()
     
     def _get_token(self, user_id: int, db) -> Optional[OAuthToken]:
         """Get OAuth token for user"""
@@ -44,16 +54,45 @@ class GmailConnector(BaseConnector):
             OAuthToken.provider == "google"
         ).order_by(OAuthToken.id.desc()).first()
     
-    def _get_gmail_service(self, access_token: str, refresh_token: Optional[str], expiry: Optional[datetime]):
-        """Create Gmail API service"""
-        creds = Credentials(
-            token=access_token,
-            refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=self.client_id,
-            client_secret=self.client_secret
-        )
-        return build("gmail", "v1", credentials=creds, cache_discovery=False)
+    def _get_service(self, user_id: int, db, not_authorized_message: str = "Gmail not authorized"):
+        """Gmail API service for a user's cached credentials"""
+        cached = get_user_credentials(db, user_id)
+        if not cached:
+            raise ValueError(not_authorized_message)
+        return gmail_client(cached.credentials)
+    
+    def _synced_cache(self, service, user_id: int):
+        """
+        The metadata cache after evicting messages deleted or relabelled since
+        the user's history cursor (see metadata_cache)
+        """
+        cache = get_metadata_cache()
+        since = cache.get_history_id(user_id)
+        if since is not None:
+            stale, latest, page_token = set(), since, None
+            try:
+                while True:
+                    params = {"userId": "me", "startHistoryId": since, "historyTypes": STALE_HISTORY_TYPES, "maxResults": 500}
+                    if page_token:
+                        params["pageToken"] = page_token
+                    resp = service.users().history().list(**masked("history.list", **params)).execute()
+                    stale |= stale_message_ids(resp.get("history", []))
+                    latest = resp.get("historyId", latest)
+                    page_token = resp.get("nextPageToken")
+                    if not page_token:
+                        break
+            except HttpError as e:
+                if e.resp.status != 404:  # 404: history expired
+                    raise
+            else:
+                cache.invalidate(user_id, list(stale))
+                cache.set_history_id(user_id, latest)
+                return cache
+        # Entries of unknown age: start over from the mailbox's current history
+        cache.invalidate_user(user_id)
+        profile = service.users().getProfile(**masked("users.getProfile", userId="me")).execute()
+        cache.set_history_id(user_id, profile["historyId"])
+        return cache
     
     def get_oauth_url(self, user_email: str, state: Optional[str] = None) -> str:
         """Generate Gmail OAuth URL"""
@@ -117,6 +156,7 @@ class GmailConnector(BaseConnector):
             )
             db.add(tok)
             db.commit()
+            invalidate_credentials(user_id)
             
             logger.info(f"Gmail OAuth tokens stored for user_id={user_id}")
             return True
@@ -134,40 +174,43 @@ class GmailConnector(BaseConnector):
         filters: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Scan Gmail inbox for emails"""
-        tok = self._get_token(user_id, db)
-        if not tok:
-            raise ValueError("Gmail not authorized. Please complete OAuth flow.")
+        # Filters go into Gmail's search (raises ValueError on unknown ones)
+        query = build_query(days_back, ScanFilters.from_dict(filters))
         
-        # Decrypt tokens
-        f = self._get_fernet()
-        access_token = f.decrypt(tok.access_token).decode()
-        refresh_token = f.decrypt(tok.refresh_token).decode() if tok.refresh_token else None
+        # Get Gmail service (cached, already-decrypted credentials)
+        service = self._get_service(user_id, db, "Gmail not authorized. Please complete OAuth flow.")
         
-        # Get Gmail service
-        service = self._get_gmail_service(access_token, refresh_token, tok.expiry)
-        
-        logger.info(f"Scanning Gmail for user_id={user_id}, days_back={days_back}, limit={limit}")
+        logger.info(f"Scanning Gmail for user_id={user_id}, query={query!r}, limit={limit}")
         
         # Fetch messages
-        msgs_meta = []
-        resp = service.users().messages().list(userId="me", maxResults=min(100, limit)).execute()
+        resp = service.users().messages().list(
+            **masked("messages.list", userId="me", q=query, maxResults=min(100, limit))
+        ).execute()
         
         ids = [m["id"] for m in resp.get("messages", [])]
         logger.info(f"Found {len(ids)} messages for user_id={user_id}")
         
+        # Metadata seen before (and not changed since) is not fetched again
+        cache = self._synced_cache(service, user_id)
+        cached = cache.get_many(user_id, ids)
+        fetched = []
+        
         for mid in ids:
-            m = service.users().messages().get(
+            if mid in cached:
+                continue
+            m = service.users().messages().get(**masked(
+                "messages.get",
                 userId="me",
                 id=mid,
                 format="metadata",
                 metadataHeaders=["Subject", "From", "Date"]
-            ).execute()
+            )).execute()
             
             size = m.get("sizeEstimate", 0)
             labels = m.get("labelIds", [])
             headers = {h["name"]: h["value"] for h in m.get("payload", {}).get("headers", [])}
             
-            msgs_meta.append({
+            fetched.append({
                 "id": mid,
                 "from": headers.get("From", ""),
                 "subject": headers.get("Subject", ""),
@@ -176,20 +219,26 @@ class GmailConnector(BaseConnector):
                 "size": size
             })
         
+        cache.set_many(user_id, fetched)
+        sync_refreshed_token(user_id)
+        fetched_lookup = {m["id"]: m for m in fetched}
+        msgs_meta = [cached.get(mid) or fetched_lookup[mid] for mid in ids if mid in cached or mid in fetched_lookup]
+        
         # Classify emails
         plan = classify_bulk(msgs_meta)
         
-        # Persist preview log
-        for it in plan["items"]:
-            db.add(MailDecisionLog(
-                user_id=user_id,
-                message_id=it["id"],
-                sender_hash=it["sender_hash"],
-                subject=it["subject"][:500],
-                size_bytes=it["size"],
-                proposed=it["decision"],
-                confidence=int(it["confidence"] * 100)
-            ))
+        # Persist preview log (no subjects - see MailDecisionLog)
+        insert_decision_logs(db, [
+            {
+                "user_id": user_id,
+                "message_id": it["id"],
+                "sender_hash": it["sender_hash"],
+                "size_bytes": it["size"],
+                "proposed": it["decision"],
+                "confidence": int(it["confidence"] * 100)
+            }
+            for it in plan["items"]
+        ])
         db.commit()
         
         # Return standardized format
@@ -211,6 +260,24 @@ class GmailConnector(BaseConnector):
             }
         }
     
+    def stream_scan_items(
+        self,
+        user_id: int,
+        days_back: int = 30,
+        limit: int = 100,
+        filters: Optional[Dict[str, Any]] = None
+    ):
+        """Stream Gmail scan results batch by batch (see gmail_connector.api.stream_scan)"""
+        return stream_scan(user_id, days_back, limit, ScanFilters.from_dict(filters))
+    
+    def quick_summary(self, user_id: int, db) -> Dict[str, Any]:
+        """Estimated clutter from Gmail label counters in one batch request (see gmail_connector.summary)"""
+        service = self._get_service(user_id, db)
+        summary = mailbox_summary(service)
+        sync_refreshed_token(user_id)
+        summary["provider"] = "gmail"
+        return summary
+    
     def apply_action(
         self,
         user_id: int,
@@ -219,17 +286,8 @@ class GmailConnector(BaseConnector):
         action: str = "delete"
     ) -> Dict[str, Any]:
         """Apply action to Gmail messages"""
-        tok = self._get_token(user_id, db)
-        if not tok:
-            raise ValueError("Gmail not authorized")
-        
-        # Decrypt tokens
-        f = self._get_fernet()
-        access_token = f.decrypt(tok.access_token).decode()
-        refresh_token = f.decrypt(tok.refresh_token).decode() if tok.refresh_token else None
-        
-        # Get Gmail service
-        service = self._get_gmail_service(access_token, refresh_token, tok.expiry)
+        # Get Gmail service (cached, already-decrypted credentials)
+        service = self._get_service(user_id, db)
         
         processed = 0
         failed = 0
@@ -237,35 +295,25 @@ class GmailConnector(BaseConnector):
         
         try:
             if action == "delete" or action == "trash":
-                # Move to trash (recoverable)
-                for mid in item_ids:
-                    try:
-                        service.users().messages().trash(userId="me", id=mid).execute()
-                        processed += 1
-                    except Exception as e:
-                        failed += 1
-                        errors.append(f"Failed to trash {mid}: {str(e)}")
-            
+                # Move to trash (recoverable), up to 1000 IDs per call
+                result = trash_messages(service, item_ids)
             elif action == "label":
-                # Add label
-                label_id = "Deklutter_Review"
-                for mid in item_ids:
-                    try:
-                        service.users().messages().modify(
-                            userId="me",
-                            id=mid,
-                            body={"addLabelIds": [label_id]}
-                        ).execute()
-                        processed += 1
-                    except Exception as e:
-                        failed += 1
-                        errors.append(f"Failed to label {mid}: {str(e)}")
+                # Add review label (created if missing)
+                result = label_messages(service, item_ids)
+            else:
+                raise ValueError(f"Unsupported action: {action}")
+            
+            sync_refreshed_token(user_id)
+            processed = result["processed"]
+            failed = result["failed"]
+            errors = [
+                f"Chunk {c['chunk']} ({c['count']} items) failed: {c['error']}"
+                for c in result["chunks"] if not c["ok"]
+            ]
             
             # Mark as applied in database
-            db.query(MailDecisionLog).filter(
-                MailDecisionLog.user_id == user_id,
-                MailDecisionLog.message_id.in_(item_ids)
-            ).update({"applied": True}, synchronize_session=False)
+            mark_applied(db, user_id, result["succeeded_ids"])
+            get_metadata_cache().invalidate(user_id, result["succeeded_ids"])
             db.commit()
             
             logger.info(f"Applied {action} to {processed} emails for user_id={user_id}")
@@ -295,22 +343,31 @@ class GmailConnector(BaseConnector):
         item_ids: List[str]
     ) -> List[Dict[str, Any]]:
         """Get detailed information about emails"""
-        tok = self._get_token(user_id, db)
-        if not tok:
-            raise ValueError("Gmail not authorized")
+        # Get Gmail service (cached, already-decrypted credentials)
+        service = self._get_service(user_id, db)
         
-        # Decrypt tokens
-        f = self._get_fernet()
-        access_token = f.decrypt(tok.access_token).decode()
-        refresh_token = f.decrypt(tok.refresh_token).decode() if tok.refresh_token else None
-        
-        # Get Gmail service
-        service = self._get_gmail_service(access_token, refresh_token, tok.expiry)
+        # Entries cached from an earlier details call carry the full field set;
+        # scan-only entries lack To/snippet and are fetched again
+        cache = self._synced_cache(service, user_id)
+        cached = {
+            mid: item for mid, item in cache.get_many(user_id, item_ids).items()
+            if all(f in item for f in DETAIL_FIELDS)
+        }
         
         details = []
         for mid in item_ids:
+            if mid in cached:
+                details.append(cached[mid])
+                continue
             try:
-                m = service.users().messages().get(userId="me", id=mid, format="full").execute()
+                # Headers and snippet are all we read - no need for format="full" bodies
+                m = service.users().messages().get(**masked(
+                    "messages.get.details",
+                    userId="me",
+                    id=mid,
+                    format="metadata",
+                    metadataHeaders=["From", "To", "Subject", "Date"]
+                )).execute()
                 headers = {h["name"]: h["value"] for h in m.get("payload", {}).get("headers", [])}
                 
                 details.append({
@@ -326,6 +383,8 @@ class GmailConnector(BaseConnector):
             except Exception as e:
                 logger.error(f"Failed to get details for {mid}: {str(e)}")
         
+        cache.set_many(user_id, [d for d in details if d["id"] not in cached])
+        sync_refreshed_token(user_id)
         return details
     
     def revoke_access(self, user_id: int, db) -> bool:
@@ -335,6 +394,9 @@ class GmailConnector(BaseConnector):
             if tok:
                 db.delete(tok)
                 db.commit()
+                invalidate_credentials(user_id)
+                get_metadata_cache().invalidate_user(user_id)
+                invalidate_user_auth(user_id)
                 logger.info(f"Revoked Gmail access for user_id={user_id}")
             return True
         except Exception as e:
@@ -343,4 +405,4 @@ class GmailConnector(BaseConnector):
     
     def _get_supported_features(self) -> List[str]:
         """Gmail supported features"""
-        return ["scan", "delete", "trash", "label", "oauth", "details"]
+        return ["scan", "scan_stream", "quick_summary", "delete", "trash", "label", "oauth", "details"]
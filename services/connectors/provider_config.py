@@ -21,6 +21,11 @@ class ProviderConfig:
     batch_size: int
     rate_limit_delay: float  # seconds between batches
     
+    # Concurrency (async fetch pipeline)
+    max_concurrent_batches: int  # batch requests kept in flight at once
+    quota_units_per_second: int  # sustained per-user quota budget
+    quota_burst_units: int  # quota units that may be spent ahead of the budget
+    
     # Retry configuration
     max_retries: int
     retry_delay: float  # base delay in seconds
@@ -47,6 +52,11 @@ PROVIDER_CONFIGS: Dict[str, ProviderConfig] = {
         batch_size=100,  # Gmail allows up to 100 in batch request
         rate_limit_delay=0.1,  # 100ms between batches
         
+        # Concurrency
+        max_concurrent_batches=3,
+        quota_units_per_second=250,
+        quota_burst_units=5000,  # Gmail quota is a moving average, so short bursts are allowed
+        
         # Retry configuration
         max_retries=3,
         retry_delay=2.0,
@@ -72,6 +82,11 @@ PROVIDER_CONFIGS: Dict[str, ProviderConfig] = {
         batch_size=50,  # Yahoo has smaller batch limits
         rate_limit_delay=0.2,  # 200ms between batches (more conservative)
         
+        # Concurrency
+        max_concurrent_batches=1,
+        quota_units_per_second=10,
+        quota_burst_units=50,
+        
         # Retry configuration
         max_retries=3,
         retry_delay=3.0,  # Longer delay for Yahoo
@@ -97,6 +112,11 @@ PROVIDER_CONFIGS: Dict[str, ProviderConfig] = {
         batch_size=20,  # Microsoft Graph batch limit
         rate_limit_delay=0.15,  # 150ms between batches
         
+        # Concurrency
+        max_concurrent_batches=2,
+        quota_units_per_second=20,
+        quota_burst_units=100,
+        
         # Retry configuration
         max_retries=3,
         retry_delay=2.0,
@@ -123,6 +143,11 @@ PROVIDER_CONFIGS: Dict[str, ProviderConfig] = {
         batch_size=50,
         rate_limit_delay=0.2,
         
+        # Concurrency
+        max_concurrent_batches=1,
+        quota_units_per_second=10,
+        quota_burst_units=50,
+        
         # Retry configuration
         max_retries=3,
         retry_delay=2.0,
@@ -170,6 +195,10 @@ def generate_resilience_docs() -> str:
         docs += f"- Batch size: {config.batch_size}\n"
         docs += f"- Delay between batches: {config.rate_limit_delay}s\n\n"
         
+        docs += f"**Concurrency:**\n"
+        docs += f"- Concurrent batches: {config.max_concurrent_batches}\n"
+        docs += f"- Quota budget: {config.quota_units_per_second} units/s (burst {config.quota_burst_units})\n\n"
+        
         docs += f"**Retry Configuration:**\n"
         docs += f"- Max retries: {config.max_retries}\n"
         docs += f"- Base delay: {config.retry_delay}s (exponential backoff)\n"
@@ -1,10 +1,12 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db.session import get_db
+from db.session import get_db, get_async_db
 from db.models import User
 from services.auth.utils import decode_access_token
+from services.auth.auth_cache import get_cached_user, cache_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -12,10 +14,8 @@ class CurrentUser(BaseModel):
     user_id: int
     email: str
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
-    """Get current authenticated user from JWT token"""
-    
-    # Decode JWT token
+def _decode(token: str) -> tuple[dict, int]:
+    """Decode the JWT token; returns (payload, user_id)"""
     payload = decode_access_token(token)
     user_id = int(payload.get("sub"))
     email = payload.get("email")
@@ -26,9 +26,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Verify user exists and is active
-    user = db.query(User).filter(User.id == user_id).first()
+    return payload, user_id
+
+def _verified(token: str, payload: dict, user: User | None) -> CurrentUser:
+    """Check the user exists and is active, and remember the token"""
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,4 +37,31 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return CurrentUser(user_id=user.id, email=user.email)
\ No newline at end of file
+    current_user = CurrentUser(user_id=user.id, email=user.email)
+    cache_user(token, user.id, current_user, payload.get("exp"))
+    return current_user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
+    """Get current authenticated user from JWT token"""
+    
+    # Recently verified token - skip decoding and the user query
+    cached = get_cached_user(token)
+    if cached is not None:
+        return cached
+    
+    payload, user_id = _decode(token)
+    user = db.query(User).filter(User.id == user_id).first()
+    return _verified(token, payload, user)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    """
+    get_current_user for `async def` routes: the user lookup goes through the
+    async session, so authenticating takes no threadpool slot
+    """
+    cached = get_cached_user(token)
+    if cached is not None:
+        return cached
+    
+    payload, user_id = _decode(token)
+    user = await db.get(User, user_id)
+    return _verified(token, payload, user)
@@ -1,19 +1,20 @@
 
 import os
 import logging
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
-from db.session import Base, engine
+from db.session import Base, engine, dispose_async_engine
 from db import models  # Import models so they're registered with Base
 from services.gateway.routes_gmail import router as gmail_router
 from services.gateway.routes_universal import router as universal_router
 from services.gateway.routes_oauth import router as oauth_router
 from services.gateway.routes_stats import router as stats_router
+from services.gateway.deps import get_current_user
 from services.auth.routes import router as auth_router
 from services.auth.gpt_oauth import router as gpt_oauth_router
 from services.gateway.error_handlers import (
@@ -24,6 +25,7 @@ from services.gateway.error_handlers import (
     generic_exception_handler
 )
 from services.gateway.rate_limiter import limiter, rate_limit_exceeded_handler
+from services.gmail_connector.token_refresher import token_refresh_scheduler
 from slowapi.errors import RateLimitExceeded
 
 # Configure logging
@@ -114,6 +116,20 @@ app.add_middleware(
 # create tables on boot (for dev)
 Base.metadata.create_all(bind=engine)
 
+@app.on_event("startup")
+def start_token_refresher():
+    """Keep active users' Gmail access tokens fresh ahead of their expiry"""
+    if os.getenv("TOKEN_REFRESH_ENABLED", "true").lower() == "true":
+        token_refresh_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_token_refresher():
+    token_refresh_scheduler.stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
+
 @app.get("/", response_class=HTMLResponse)
 def root():
     return """
@@ -213,7 +229,7 @@ async def start():
 def health():
     """Health check endpoint for monitoring"""
     import time
-    from db.session import SessionLocal
+    from db.session import session_scope
     from sqlalchemy import text
     
     # Check database connection
@@ -222,22 +238,20 @@ def health():
     tables_exist = False
     
     try:
-        db = SessionLocal()
-        # Test basic query
-        db.execute(text("SELECT 1"))
-        db_healthy = True
-        
-        # Check if tables exist
-        result = db.execute(text("""
-            SELECT COUNT(*) 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name IN ('users', 'oauth_tokens', 'mail_decision_logs')
-        """))
-        count = result.scalar()
-        tables_exist = (count >= 3)
-        
-        db.close()
+        with session_scope("health") as db:
+            # Test basic query
+            db.execute(text("SELECT 1"))
+            db_healthy = True
+            
+            # Check if tables exist
+            result = db.execute(text("""
+                SELECT COUNT(*) 
+                FROM information_schema.tables 
+                WHERE table_schema = 'public' 
+                AND table_name IN ('users', 'oauth_tokens', 'mail_decision_logs')
+            """))
+            count = result.scalar()
+            tables_exist = (count >= 3)
     except Exception as e:
         db_error = str(e)
         logger.error(f"Database health check failed: {e}")
@@ -257,6 +271,21 @@ def health():
         } if db_error or not tables_exist else None
     }
 
+@app.get("/metrics/db", dependencies=[Depends(get_current_user)])
+def db_pool_metrics():
+    """
+    Connection pool telemetry - occupancy, saturation, checkout wait times
+    and timeouts for the sync and async pools - requires authentication
+    """
+    import time
+    from db.session import pool_status, async_pool_status
+    
+    return {
+        "timestamp": int(time.time()),
+        "sync": pool_status(),
+        "async": async_pool_status()
+    }
+
 @app.get("/debug/files")
 def debug_files():
     """Debug endpoint to see what files are available"""
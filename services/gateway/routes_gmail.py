@@ -1,14 +1,21 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal
 
 from services.gateway.rate_limiter import limiter
-from services.gateway.deps import get_current_user, CurrentUser
+from services.gateway.deps import get_current_user, get_current_user_async, CurrentUser
 from services.gmail_connector.oauth import get_google_auth_url, exchange_code_store_tokens
-from services.gmail_connector.api import scan_recent, apply_cleanup
-from db.session import get_db
+from services.gmail_connector.api import (
+    scan_recent, apply_cleanup, stream_scan, summarize_mailbox, sample_scan, apply_sender_action,
+    check_bulk_senders, MAX_SENDER_ACTION_MESSAGES
+)
+from services.gmail_connector.query import ScanFilters
+from services.gateway.streaming import ndjson_response
+from db.session import get_db, get_async_db
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +24,40 @@ router = APIRouter()
 class ScanRequest(BaseModel):
     days_back: int = 365
     limit: int = 1000
+    full_rescan: bool = False  # ignore the stored historyId and scan from scratch
+    # "sample": classify a stratified random sample of `limit` messages and
+    # extrapolate to the whole window (days_back 0 = whole mailbox)
+    mode: Literal["recent", "sample"] = "recent"
+    # Optional filters, applied by Gmail's search (see gmail_connector.query)
+    categories: list[str] = []           # e.g. ["promotions", "social"]
+    older_than_days: int | None = None
+    min_size_kb: int | None = None
+    exclude_labels: list[str] = []       # user labels to leave out
+
+    def filters(self) -> ScanFilters:
+        try:
+            return ScanFilters(
+                categories=tuple(self.categories),
+                older_than_days=self.older_than_days,
+                min_size_kb=self.min_size_kb,
+                exclude_labels=tuple(self.exclude_labels),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 class ApplyRequest(BaseModel):
     message_ids: list[str]
     mode: str = "trash"  # or "label_only"
 
+class SenderActionRequest(BaseModel):
+    senders: list[str]                  # addresses or domains, e.g. ["news@shop.com", "deals.com"]
+    mode: str = "trash"  # or "label_only"
+    categories: list[str] = []
+    days_back: int | None = None        # only messages newer than this
+    older_than_days: int | None = None
+    limit: int = MAX_SENDER_ACTION_MESSAGES
+    dry_run: bool = True                # count the matches, change nothing - turn off to act
+
 @router.post("/auth/google/init")
 def auth_google_init(user: CurrentUser = Depends(get_current_user)):
     url = get_google_auth_url(readonly=True, state=f"user:{user.email}")
@@ -155,10 +191,17 @@ def reset_user(
 ):
     """Delete current user and all their data - for testing only"""
     from db.models import OAuthToken, MailDecisionLog, ActivityLog
+    from db.stats_rollup import delete_user_stats
+    from services.gmail_connector.sync import delete_sync_states
+    from services.gmail_connector.metadata_cache import get_metadata_cache
+    from services.gmail_connector.credential_cache import invalidate_credentials
+    from services.auth.auth_cache import invalidate_user_auth
     
     # Delete all user data
     db.query(OAuthToken).filter(OAuthToken.user_id == user.user_id).delete()
+    delete_sync_states(db, user.user_id)
     db.query(MailDecisionLog).filter(MailDecisionLog.user_id == user.user_id).delete()
+    delete_user_stats(db, user.user_id)
     db.query(ActivityLog).filter(ActivityLog.user_id == user.user_id).delete()
     
     # Delete user
@@ -166,6 +209,9 @@ def reset_user(
     db.query(User).filter(User.id == user.user_id).delete()
     
     db.commit()
+    invalidate_credentials(user.user_id)
+    get_metadata_cache().invalidate_user(user.user_id)
+    invalidate_user_auth(user.user_id)
     
     return {
         "message": "User deleted successfully",
@@ -174,18 +220,18 @@ def reset_user(
     }
 
 @router.get("/gmail/status")
-def gmail_status(
-    user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def gmail_status(
+    user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Check if Gmail is connected for the current user"""
     from db.models import OAuthToken
     from datetime import datetime
     
-    token = db.query(OAuthToken).filter(
+    token = await db.scalar(select(OAuthToken).where(
         OAuthToken.user_id == user.user_id,
         OAuthToken.provider == "google"
-    ).first()
+    ).limit(1))
     
     return {
         "user_id": user.user_id,
@@ -195,6 +241,28 @@ def gmail_status(
         "token_expired": token.expiry < datetime.utcnow() if token else None
     }
 
+@router.get("/gmail/summary")
+@limiter.limit("20/minute")  # One batch request - cheap next to a scan
+def gmail_summary(
+    request: Request,
+    response: Response,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Estimated clutter in seconds, from Gmail's label counters - requires authentication
+    
+    Counts messages in the Promotions/Social/Forums categories and estimates
+    old clutter and large messages without fetching any of them.
+    """
+    result = summarize_mailbox(user, db)
+    if result.get("error") == "not_authorized":
+        raise HTTPException(
+            status_code=403,
+            detail="Gmail not authorized. Please visit /start to connect your Gmail account."
+        )
+    return result
+
 @router.post("/gmail/scan")
 @limiter.limit("5/minute")  # Max 5 scans per minute
 def gmail_scan(
@@ -205,9 +273,15 @@ def gmail_scan(
     db: Session = Depends(get_db)
 ):
     """Scan Gmail inbox - requires authentication"""
+    filters = req.filters()
     try:
-        result = scan_recent(user, req.days_back, req.limit, db)
+        if req.mode == "sample":
+            result = sample_scan(user, req.days_back, req.limit, db, filters=filters)
+        else:
+            result = scan_recent(user, req.days_back, req.limit, db, full_rescan=req.full_rescan, filters=filters)
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Gmail scan failed for user {user.email}: {str(e)}", exc_info=True)
         from fastapi import HTTPException
@@ -225,6 +299,24 @@ def gmail_scan(
             detail=f"Scan failed: {str(e)}"
         )
 
+@router.post("/gmail/scan/stream")
+@limiter.limit("5/minute")  # Shares the scan budget
+def gmail_scan_stream(
+    request: Request,
+    response: Response,
+    req: ScanRequest,
+    user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Scan Gmail inbox, streaming results as NDJSON - requires authentication
+    
+    Emits one `batch` event per classified batch (items + running counts)
+    and a final `summary` event. Errors mid-scan arrive as an `error` event.
+    """
+    if req.mode == "sample":
+        raise HTTPException(status_code=400, detail="Sampling scans are not streamed - use /gmail/scan")
+    return ndjson_response(stream_scan(user.user_id, req.days_back, req.limit, req.filters()))
+
 @router.post("/gmail/apply")
 @limiter.limit("10/minute")  # Max 10 cleanup operations per minute
 def gmail_apply(
@@ -238,6 +330,33 @@ def gmail_apply(
     result = apply_cleanup(user, req.message_ids, req.mode, db)
     return result
 
+@router.post("/gmail/apply/senders")
+@limiter.limit("10/minute")  # Shares the cleanup budget
+def gmail_apply_senders(
+    request: Request,
+    response: Response,
+    req: SenderActionRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Trash or label everything from some senders - requires authentication
+    
+    Messages are found with a Gmail search and changed with batchModify,
+    without scanning them first or sending IDs back and forth. Only counts
+    the matches unless dry_run is false.
+    """
+    try:
+        filters = ScanFilters(
+            senders=tuple(req.senders),
+            categories=tuple(req.categories),
+            older_than_days=req.older_than_days,
+        )
+        check_bulk_senders(filters.senders)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return apply_sender_action(user, filters, req.mode, req.days_back, req.limit, req.dry_run, db)
+
 @router.post("/oauth/revoke")
 def revoke_access(
     user: CurrentUser = Depends(get_current_user),
@@ -251,14 +370,22 @@ def revoke_access(
     """
     from db.models import OAuthToken
     from datetime import datetime
+    from services.gmail_connector.sync import delete_sync_states
+    from services.gmail_connector.metadata_cache import get_metadata_cache
+    from services.gmail_connector.credential_cache import invalidate_credentials
+    from services.auth.auth_cache import invalidate_user_auth
     
     try:
         # Delete all OAuth tokens for this user
         deleted_count = db.query(OAuthToken).filter(
             OAuthToken.user_id == user.user_id
         ).delete()
+        delete_sync_states(db, user.user_id)
         
         db.commit()
+        invalidate_credentials(user.user_id)
+        get_metadata_cache().invalidate_user(user.user_id)
+        invalidate_user_auth(user.user_id)
         
         logger.info(f"Revoked access for user {user.email}, deleted {deleted_count} tokens")
         
@@ -2,12 +2,14 @@
 Statistics and analytics endpoints
 """
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from db.session import get_db
-from db.models import MailDecisionLog, ActivityLog
-from services.gateway.deps import CurrentUser, get_current_user
+from typing import Literal
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, select
+from db.session import get_async_db
+from db.models import MailDecisionLog, ActivityLog, UserDailyStats
+from db.stats_rollup import DECISIONS
+from services.gateway.deps import CurrentUser, get_current_user_async
 from datetime import datetime, timedelta
 import logging
 
@@ -15,9 +17,9 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/stats")
-def get_user_stats(
-    user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_user_stats(
+    user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get user's email cleanup statistics
@@ -28,67 +30,40 @@ def get_user_stats(
     - Space saved (MB)
     - Breakdown by decision (delete/review/keep)
     - Recent activity
+    
+    Read from the per-day rollup (user_daily_stats), one row per active day.
     """
     
-    # Total emails scanned
-    total_scanned = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id
-    ).count()
-    
-    # Total emails deleted (applied)
-    total_deleted = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.proposed == "delete",
-        MailDecisionLog.applied == True
-    ).count()
-    
-    # Space saved (sum of deleted email sizes)
-    space_saved_bytes = db.query(
-        func.sum(MailDecisionLog.size_bytes)
-    ).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.proposed == "delete",
-        MailDecisionLog.applied == True
-    ).scalar() or 0
+    days = (await db.scalars(
+        select(UserDailyStats).where(UserDailyStats.user_id == user.user_id)
+    )).all()
+    
+    total_scanned = sum(d.scanned for d in days)
+    total_deleted = sum(d.deleted for d in days)
+    space_saved_bytes = sum(d.deleted_bytes for d in days)
     
     space_saved_mb = round(space_saved_bytes / (1024 * 1024), 2)
     
     # Breakdown by decision
-    breakdown = db.query(
-        MailDecisionLog.proposed,
-        func.count(MailDecisionLog.id).label('count'),
-        func.sum(MailDecisionLog.size_bytes).label('total_size')
-    ).filter(
-        MailDecisionLog.user_id == user.user_id
-    ).group_by(MailDecisionLog.proposed).all()
-    
     breakdown_dict = {}
-    for decision, count, total_size in breakdown:
-        breakdown_dict[decision] = {
-            "count": count,
-            "size_mb": round((total_size or 0) / (1024 * 1024), 2)
-        }
+    for decision in DECISIONS:
+        count = sum(getattr(d, f"{decision}_count") for d in days)
+        if count:
+            breakdown_dict[decision] = {
+                "count": count,
+                "size_mb": round(sum(getattr(d, f"{decision}_bytes") for d in days) / (1024 * 1024), 2)
+            }
     
     # Recent activity (last 7 days)
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    recent_scanned = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.created_at >= seven_days_ago
-    ).count()
-    
-    recent_deleted = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.proposed == "delete",
-        MailDecisionLog.applied == True,
-        MailDecisionLog.created_at >= seven_days_ago
-    ).count()
+    seven_days_ago = (datetime.now() - timedelta(days=7)).date()
+    recent = [d for d in days if d.day >= seven_days_ago]
+    recent_scanned = sum(d.scanned for d in recent)
+    recent_deleted = sum(d.deleted for d in recent)
     
     # Last scan date
-    last_scan = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id
-    ).order_by(desc(MailDecisionLog.created_at)).first()
+    last_scan_at = max((d.last_scan_at for d in days if d.last_scan_at), default=None)
     
-    last_scan_date = last_scan.created_at.isoformat() if last_scan else None
+    last_scan_date = last_scan_at.isoformat() if last_scan_at else None
     
     return {
         "user_id": user.user_id,
@@ -108,51 +83,59 @@ def get_user_stats(
 
 
 @router.get("/stats/top-senders")
-def get_top_spam_senders(
-    user: CurrentUser = Depends(get_current_user),
-    limit: int = 10,
-    db: Session = Depends(get_db)
+async def get_top_spam_senders(
+    user: CurrentUser = Depends(get_current_user_async),
+    limit: int = Query(10, ge=1, le=100),
+    by: Literal["sender", "domain"] = "sender",
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get top spam senders (emails marked for deletion)
     
-    Returns list of senders with:
-    - Sender hash (anonymized)
+    Returns list of senders (or sender domains with by=domain) with:
+    - Sender hash (anonymized) and domain
     - Number of emails
     - Total size
-    - Sample subject lines
+    - Share of all emails marked for deletion
+    
+    One grouped query: the overall total is a window sum over the groups,
+    computed before LIMIT.
     """
     
-    # Group by sender_hash for deleted emails
-    top_senders = db.query(
-        MailDecisionLog.sender_hash,
-        func.count(MailDecisionLog.id).label('email_count'),
-        func.sum(MailDecisionLog.size_bytes).label('total_size'),
-        func.array_agg(MailDecisionLog.subject).label('subjects')
-    ).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.proposed == "delete"
-    ).group_by(
-        MailDecisionLog.sender_hash
-    ).order_by(
-        desc('email_count')
-    ).limit(limit).all()
+    if by == "domain":
+        # Rows logged before sender_domain was recorded roll up as "unknown"
+        key = func.coalesce(MailDecisionLog.sender_domain, "unknown")
+    else:
+        key = MailDecisionLog.sender_hash
+    email_count = func.count(MailDecisionLog.id)
+    
+    top_senders = await db.execute(
+        select(
+            key.label("sender"),
+            func.max(MailDecisionLog.sender_domain).label("sender_domain"),
+            email_count.label("email_count"),
+            func.sum(MailDecisionLog.size_bytes).label("total_size"),
+            func.sum(email_count).over().label("total_count")
+        ).where(
+            MailDecisionLog.user_id == user.user_id,
+            MailDecisionLog.proposed == "delete"
+        ).group_by(
+            key
+        ).order_by(
+            desc("email_count"), key
+        ).limit(limit)
+    )
     
     results = []
-    for sender_hash, count, total_size, subjects in top_senders:
-        # Get a sample subject (first one)
-        sample_subject = subjects[0] if subjects else "No subject"
-        
-        results.append({
-            "sender_hash": sender_hash,
+    for sender, sender_domain, count, total_size, total_count in top_senders.all():
+        entry = {"sender_hash": sender} if by == "sender" else {}
+        entry.update({
+            "sender_domain": sender_domain if by == "sender" else sender,
             "email_count": count,
             "size_mb": round((total_size or 0) / (1024 * 1024), 2),
-            "sample_subject": sample_subject,
-            "percentage": round((count / max(1, db.query(MailDecisionLog).filter(
-                MailDecisionLog.user_id == user.user_id,
-                MailDecisionLog.proposed == "delete"
-            ).count())) * 100, 1)
+            "percentage": round(count / max(1, total_count) * 100, 1)
         })
+        results.append(entry)
     
     return {
         "top_spam_senders": results,
@@ -162,10 +145,10 @@ def get_top_spam_senders(
 
 
 @router.get("/stats/timeline")
-def get_cleanup_timeline(
-    user: CurrentUser = Depends(get_current_user),
+async def get_cleanup_timeline(
+    user: CurrentUser = Depends(get_current_user_async),
     days: int = 30,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get cleanup activity timeline (daily breakdown)
@@ -173,24 +156,22 @@ def get_cleanup_timeline(
     Returns daily stats for the last N days
     """
     
-    start_date = datetime.now() - timedelta(days=days)
+    start_date = (datetime.now() - timedelta(days=days)).date()
     
     # Get daily counts
-    daily_stats = db.query(
-        func.date(MailDecisionLog.created_at).label('date'),
-        func.count(MailDecisionLog.id).label('scanned'),
-        func.sum(
-            func.cast(MailDecisionLog.applied, Integer)
-        ).label('deleted')
-    ).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.created_at >= start_date
-    ).group_by(
-        func.date(MailDecisionLog.created_at)
-    ).order_by('date').all()
+    daily_stats = await db.execute(
+        select(
+            UserDailyStats.day,
+            UserDailyStats.scanned,
+            UserDailyStats.applied
+        ).where(
+            UserDailyStats.user_id == user.user_id,
+            UserDailyStats.day >= start_date
+        ).order_by(UserDailyStats.day)
+    )
     
     timeline = []
-    for date, scanned, deleted in daily_stats:
+    for date, scanned, deleted in daily_stats.all():
         timeline.append({
             "date": str(date),
             "scanned": scanned,
@@ -205,9 +186,9 @@ def get_cleanup_timeline(
 
 
 @router.get("/stats/summary")
-def get_quick_summary(
-    user: CurrentUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_quick_summary(
+    user: CurrentUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Quick summary for GPT to show users
@@ -215,34 +196,24 @@ def get_quick_summary(
     Returns a concise, user-friendly summary
     """
     
-    total_deleted = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.proposed == "delete",
-        MailDecisionLog.applied == True
-    ).count()
-    
-    space_saved_bytes = db.query(
-        func.sum(MailDecisionLog.size_bytes)
-    ).filter(
-        MailDecisionLog.user_id == user.user_id,
-        MailDecisionLog.proposed == "delete",
-        MailDecisionLog.applied == True
-    ).scalar() or 0
-    
-    space_saved_mb = round(space_saved_bytes / (1024 * 1024), 2)
+    total_deleted, space_saved_bytes, last_scan_at = (await db.execute(
+        select(
+            func.sum(UserDailyStats.deleted),
+            func.sum(UserDailyStats.deleted_bytes),
+            func.max(UserDailyStats.last_scan_at)
+        ).where(UserDailyStats.user_id == user.user_id)
+    )).one()
+    total_deleted = total_deleted or 0
     
-    # Last scan
-    last_scan = db.query(MailDecisionLog).filter(
-        MailDecisionLog.user_id == user.user_id
-    ).order_by(desc(MailDecisionLog.created_at)).first()
+    space_saved_mb = round((space_saved_bytes or 0) / (1024 * 1024), 2)
     
-    if not last_scan:
+    if not last_scan_at:
         return {
             "message": "No scans yet! Start by scanning your inbox.",
             "has_data": False
         }
     
-    days_since_last_scan = (datetime.now() - last_scan.created_at).days
+    days_since_last_scan = (datetime.now() - last_scan_at).days
     
     return {
         "message": f"🎉 You've cleaned {total_deleted} emails and saved {space_saved_mb} MB!",
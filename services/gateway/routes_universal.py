@@ -10,6 +10,7 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 
 from services.gateway.deps import get_current_user, CurrentUser
+from services.gateway.streaming import ndjson_response
 from services.connectors.factory import ConnectorFactory
 from services.connectors.base import ProviderType
 from db.session import get_db
@@ -247,6 +248,57 @@ def scan_items(
         raise HTTPException(status_code=500, detail="Scan failed")
 
 
+@router.post("/scan/stream")
+def scan_items_stream(
+    req: ScanRequest,
+    user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Scan items and stream results as NDJSON.
+    
+    Emits `batch` events (items + running counts) as they are classified,
+    then a `summary` event. Only providers with streaming support.
+    """
+    try:
+        connector = ConnectorFactory.get_connector_by_name(req.provider)
+        events = connector.stream_scan_items(
+            user_id=user.user_id,
+            days_back=req.days_back,
+            limit=req.limit,
+            filters=req.filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return ndjson_response(events)
+
+
+@router.get("/summary/{provider}")
+def quick_summary(
+    provider: str,
+    user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Estimated clutter from the provider's counters, without scanning items.
+    """
+    try:
+        connector = ConnectorFactory.get_connector_by_name(provider)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if "quick_summary" not in connector.get_provider_info()["supports"]:
+        raise HTTPException(status_code=400, detail=f"Quick summaries are not supported for {provider}")
+    
+    try:
+        return connector.quick_summary(user_id=user.user_id, db=db)
+    except ValueError as e:
+        # Provider not connected for this user
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        logger.error(f"Quick summary failed for {provider}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Summary failed")
+
+
 # ============================================================================
 # Apply Actions
 # ============================================================================
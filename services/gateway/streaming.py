@@ -0,0 +1,21 @@
+"""
+Helpers for streaming (NDJSON) responses
+"""
+
+import json
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+async def _ndjson_lines(events):
+    async for event in events:
+        yield json.dumps(event) + "\n"
+
+def ndjson_response(events) -> StreamingResponse:
+    """Stream an async iterator of dicts as newline-delimited JSON"""
+    return StreamingResponse(
+        _ndjson_lines(events),
+        media_type=NDJSON_MEDIA_TYPE,
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,14 +1,25 @@
+import asyncio
 import logging
-import time
-from datetime import datetime, timedelta
+from contextlib import aclosing
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from sqlalchemy.orm import Session
-from db.session import get_db
-from db.models import OAuthToken, MailDecisionLog
+from db.session import session_scope, threaded_session_scope
+from db.bulk import insert_decision_logs
+from db.stats_rollup import mark_applied
 from services.gateway.deps import CurrentUser
-from services.gmail_connector.oauth import _fernet, get_gmail_service
-from services.classifier.policy import classify_bulk
-from googleapiclient.errors import HttpError
-from services.gmail_connector.circuit_breaker import get_circuit_breaker, CircuitBreakerOpenError
+from services.gmail_connector.oauth import build_gmail_service
+from services.gmail_connector.credential_cache import get_user_credentials, sync_refreshed_token
+from services.gmail_connector.async_fetch import AsyncGmailFetcher, GmailFetchError, GmailListError, HistoryExpiredError
+from services.gmail_connector.sync import get_sync_state, save_sync_state, load_previous_decisions
+from services.gmail_connector.query import ScanFilters, build_query
+from services.gmail_connector.metadata_cache import get_metadata_cache
+from services.classifier.policy import classify_bulk, is_protected_sender, summarize_items
+from services.gmail_connector.circuit_breaker import CircuitBreakerOpenError
+from services.gmail_connector.bulk_actions import REVIEW_LABEL_NAME, trash_messages, label_messages, list_matching_ids
+from services.gmail_connector.summary import mailbox_summary
+from services.gmail_connector.sampling import MIN_PER_STRATUM, build_strata, estimate, sample_mailbox
 from services.connectors.provider_config import get_provider_config
 
 logger = logging.getLogger(__name__)
@@ -16,199 +27,61 @@ logger = logging.getLogger(__name__)
 # Load Gmail-specific configuration
 GMAIL_CONFIG = get_provider_config("gmail")
 
-# Get circuit breaker for Gmail API
-gmail_circuit_breaker = get_circuit_breaker(
-    "gmail_api",
-    failure_threshold=GMAIL_CONFIG.circuit_breaker_failure_threshold,
-    timeout=GMAIL_CONFIG.circuit_breaker_timeout,
-    success_threshold=GMAIL_CONFIG.circuit_breaker_success_threshold
-)
-
 # Gmail API rate limiting (from provider config)
 MAX_EMAILS_PER_SCAN = GMAIL_CONFIG.max_emails_per_scan
 BATCH_SIZE = GMAIL_CONFIG.batch_size
-RATE_LIMIT_DELAY = GMAIL_CONFIG.rate_limit_delay
-MAX_RETRIES = GMAIL_CONFIG.max_retries
-RETRY_DELAY = GMAIL_CONFIG.retry_delay
-RETRY_STATUS_CODES = GMAIL_CONFIG.retry_on_status_codes
 
-def _retry_with_backoff(func, max_retries=MAX_RETRIES, operation_name="API call", use_circuit_breaker=True):
-    """
-    Retry a function with exponential backoff for transient failures
-    Integrates with circuit breaker pattern
-    """
-    for attempt in range(max_retries):
-        try:
-            # Wrap with circuit breaker if enabled
-            if use_circuit_breaker:
-                return gmail_circuit_breaker.call(func)
-            else:
-                return func()
-                
-        except CircuitBreakerOpenError as e:
-            # Circuit breaker is open, don't retry
-            logger.error(f"{operation_name}: Circuit breaker is OPEN, aborting")
-            raise
-            
-        except HttpError as e:
-            status_code = e.resp.status
-            
-            # Retry on transient errors (configured per provider)
-            if status_code in RETRY_STATUS_CODES and attempt < max_retries - 1:
-                wait_time = RETRY_DELAY * (2 ** attempt)  # Exponential backoff
-                logger.warning(f"{operation_name} failed with {status_code}, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
-                continue
-            
-            # Don't retry on client errors (400, 401, 403, 404)
-            logger.error(f"{operation_name} failed with status {status_code}: {str(e)}")
-            raise
-            
-        except Exception as e:
-            # Retry on network errors
-            if attempt < max_retries - 1:
-                wait_time = RETRY_DELAY * (2 ** attempt)
-                logger.warning(f"{operation_name} failed with {type(e).__name__}: {str(e)}, retrying in {wait_time}s")
-                time.sleep(wait_time)
-                continue
-            
-            logger.error(f"{operation_name} failed after {max_retries} attempts: {str(e)}")
-            raise
-    
-    raise Exception(f"{operation_name} failed after {max_retries} retries")
+# Sample emails shown per decision in scan results
+SAMPLE_LIMITS = {"delete": 5, "review": 3, "keep": 3}
 
-def _get_token(db: Session, user: CurrentUser) -> OAuthToken | None:
-    return db.query(OAuthToken).filter(OAuthToken.user_id==user.user_id, OAuthToken.provider=="google").order_by(OAuthToken.id.desc()).first()
+# Messages one sender action may touch (10 list calls + 5 batchModify calls);
+# more matches come back as `truncated` and the next call picks them up
+MAX_SENDER_ACTION_MESSAGES = 5_000
 
-def scan_recent(user: CurrentUser, days_back: int, limit: int, db: Session = next(get_db())):
-    tok = _get_token(db, user)
-    if not tok: return {"error":"not_authorized"}
-    f = _fernet()
-    service = get_gmail_service(f.decrypt(tok.access_token).decode(), f.decrypt(tok.refresh_token).decode() or None, tok.expiry)
+# Shared by everyone's mail - a bare domain here would match most of an inbox
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "ymail.com", "outlook.com", "hotmail.com", "live.com",
+    "msn.com", "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "zoho.com",
+}
 
-    logger.info(f"Scanning Gmail for user_id={user.user_id}, days_back={days_back}, limit={limit}")
-    
-    # Cap limit to prevent overwhelming API and user
-    effective_limit = min(limit, MAX_EMAILS_PER_SCAN)
-    if limit > MAX_EMAILS_PER_SCAN:
-        logger.warning(f"Limit {limit} exceeds max {MAX_EMAILS_PER_SCAN}, capping to {MAX_EMAILS_PER_SCAN}")
-    
-    # Step 1: Get message IDs with pagination
-    all_ids = []
-    page_token = None
-    
+def check_bulk_senders(senders: tuple[str, ...]):
+    """
+    Sender actions skip the classifier, so its safety rules are applied here:
+    protected senders and bare free-mail domains are rejected (ValueError)
+    """
+    if not senders:
+        raise ValueError("At least one sender is required")
+    for sender in senders:
+        sender = sender.strip().lower().lstrip("@")
+        if is_protected_sender(sender):
+            raise ValueError(f"{sender!r} is a protected sender - bulk actions never touch it")
+        if sender in FREE_MAIL_DOMAINS:
+            raise ValueError(f"{sender!r} is a free-mail domain - name the sender's address instead")
+
+def _message_date(msg_meta: dict) -> datetime | None:
+    """A message's Date header as naive UTC, or None when missing or unparseable"""
     try:
-        while len(all_ids) < effective_limit:
-            batch_size = min(100, effective_limit - len(all_ids))
-            list_params = {
-                "userId": "me",
-                "maxResults": batch_size
-            }
-            if page_token:
-                list_params["pageToken"] = page_token
-            
-            # Wrap API call with retry logic
-            def list_messages():
-                return service.users().messages().list(**list_params).execute()
-            
-            resp = _retry_with_backoff(list_messages, operation_name=f"List messages (page {len(all_ids)//100 + 1})")
-            messages = resp.get("messages", [])
-            
-            if not messages:
-                break
-            
-            all_ids.extend([m["id"] for m in messages])
-            page_token = resp.get("nextPageToken")
-            
-            if not page_token:
-                break
-            
-            logger.info(f"Fetched {len(all_ids)} message IDs so far...")
-    except CircuitBreakerOpenError as e:
-        logger.error(f"Circuit breaker open for user_id={user.user_id}: {str(e)}")
-        return {"error": "service_unavailable", "message": "Gmail API is temporarily unavailable. Please try again in a minute."}
-    except Exception as e:
-        logger.error(f"Failed to list messages for user_id={user.user_id}: {str(e)}")
-        return {"error": "scan_failed", "message": "Failed to fetch email list. Please try again."}
-    
-    logger.info(f"Found {len(all_ids)} total messages for user_id={user.user_id}")
-    
-    # Step 2: Fetch metadata in batches (much faster!)
-    msgs_meta = []
-    failed_batches = 0
-    
-    for i in range(0, len(all_ids), BATCH_SIZE):
-        batch_ids = all_ids[i:i + BATCH_SIZE]
-        logger.info(f"Fetching metadata batch {i//BATCH_SIZE + 1}/{(len(all_ids)-1)//BATCH_SIZE + 1} ({len(batch_ids)} emails)")
-        
-        try:
-            # Use batch request for efficiency
-            batch = service.new_batch_http_request()
-            
-            def create_callback(message_id):
-                def callback(request_id, response, exception):
-                    if exception:
-                        logger.error(f"Error fetching message {message_id}: {exception}")
-                        return
-                    
-                    size = response.get("sizeEstimate", 0)
-                    labels = response.get("labelIds", [])
-                    headers = {h["name"]:h["value"] for h in response.get("payload",{}).get("headers",[])}
-                    msgs_meta.append({
-                        "id": message_id,
-                        "from": headers.get("From",""),
-                        "subject": headers.get("Subject",""),
-                        "date": headers.get("Date",""),
-                        "labels": labels,
-                        "size": size
-                    })
-                return callback
-            
-            for mid in batch_ids:
-                batch.add(
-                    service.users().messages().get(
-                        userId="me", 
-                        id=mid, 
-                        format="metadata", 
-                        metadataHeaders=["Subject","From","Date"]
-                    ),
-                    callback=create_callback(mid)
-                )
-            
-            # Wrap batch execution with retry
-            def execute_batch():
-                return batch.execute()
-            
-            _retry_with_backoff(execute_batch, operation_name=f"Fetch metadata batch {i//BATCH_SIZE + 1}")
-            
-            # Small delay to respect rate limits
-            if i + BATCH_SIZE < len(all_ids):
-                time.sleep(RATE_LIMIT_DELAY)
-                
-        except Exception as e:
-            failed_batches += 1
-            logger.error(f"Failed to fetch batch {i//BATCH_SIZE + 1}: {str(e)}")
-            # Continue with next batch instead of failing completely
-            if failed_batches > 3:  # Too many failures
-                logger.error(f"Too many batch failures ({failed_batches}), aborting scan")
-                return {"error": "scan_failed", "message": "Failed to fetch email metadata. Please try again."}
-    
-    logger.info(f"Successfully fetched metadata for {len(msgs_meta)} emails")
+        date = parsedate_to_datetime(msg_meta.get("date") or "")
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
 
-    plan = classify_bulk(msgs_meta)
-    
-    # Create a mapping of message_id to metadata for easy lookup
-    msg_lookup = {m["id"]: m for m in msgs_meta}
-    
-    # persist preview log (not applied) - NO SUBJECTS for privacy
-    for it in plan["items"]:
+def _persist_decisions(db: Session, user_id: int, plan_items: list[dict], msg_lookup: dict[str, dict]):
+    """Persist preview decisions (not applied) in one bulk insert - NO SUBJECTS for privacy"""
+    rows = []
+    for it in plan_items:
         # Extract sender domain from sender_hash (if available in metadata)
         msg_meta = msg_lookup.get(it["id"])
         sender_domain = None
         gmail_category = None
         has_unsubscribe = False
+        internal_date = None
         
         if msg_meta:
+            internal_date = _message_date(msg_meta)
+            
             # Extract domain from sender email
             sender_email = msg_meta.get("from", "")
             if "@" in sender_email:
@@ -225,130 +98,446 @@ def scan_recent(user: CurrentUser, days_back: int, limit: int, db: Session = nex
             headers = msg_meta.get("headers", {})
             has_unsubscribe = "list-unsubscribe" in headers or "unsubscribe" in headers
         
-        db.add(MailDecisionLog(
-            user_id=user.user_id,
-            message_id=it["id"],
-            sender_hash=it["sender_hash"],
-            sender_domain=sender_domain,
-            gmail_category=gmail_category,
-            has_unsubscribe=has_unsubscribe,
-            size_bytes=it["size"],
-            proposed=it["decision"],
-            confidence=int(it["confidence"]*100)
-        ))
+        rows.append({
+            "user_id": user_id,
+            "message_id": it["id"],
+            "sender_hash": it["sender_hash"],
+            "sender_domain": sender_domain,
+            "gmail_category": gmail_category,
+            "has_unsubscribe": has_unsubscribe,
+            "size_bytes": it["size"],
+            "internal_date": internal_date,
+            "proposed": it["decision"],
+            "confidence": int(it["confidence"]*100)
+        })
+    insert_decision_logs(db, rows)
     db.commit()
+
+def _collect_samples(samples: dict[str, list], plan_items: list[dict], msg_lookup: dict[str, dict]):
+    """Append sample emails per decision until SAMPLE_LIMITS is reached"""
+    for item in plan_items:
+        bucket = samples[item["decision"]]
+        if len(bucket) >= SAMPLE_LIMITS[item["decision"]]:
+            continue
+        msg_meta = msg_lookup.get(item["id"])
+        if msg_meta:
+            bucket.append({
+                "from": msg_meta["from"],
+                "subject": msg_meta["subject"],
+                "date": msg_meta["date"],
+                "size_kb": round(msg_meta["size"] / 1024, 1)
+            })
+
+async def _fetch_and_classify(creds, user_id: int, limit: int, query: str = ""):
+    """
+    List message IDs matching `query` and fetch their metadata in one pipeline, classifying
+    each batch as it lands. Returns (all_ids, msgs_meta, plan_items, history_id).
+    
+    The historyId is read before listing, so anything arriving mid-scan is
+    picked up again by the next incremental scan rather than missed.
+    """
+    msgs_meta = []
+    plan_items = []
+    async with AsyncGmailFetcher(creds, user_id=user_id, cache=get_metadata_cache()) as fetcher:
+        history_id = await fetcher.get_history_id()
+        async for batch in fetcher.iter_scan(limit, query):
+            msgs_meta.extend(batch)
+            plan_items.extend(classify_bulk(batch)["items"])
+    return fetcher.listed_ids, msgs_meta, plan_items, history_id
+
+async def _fetch_changes(creds, user_id: int, start_history_id: str, limit: int):
+    """
+    Fetch and classify only messages added or relabelled since start_history_id.
+    Returns (added_ids, removed_ids, msgs_meta, plan_items, history_id).
+    Raises HistoryExpiredError when a full scan is needed instead.
+    """
+    msgs_meta = []
+    plan_items = []
+    async with AsyncGmailFetcher(creds, user_id=user_id, cache=get_metadata_cache()) as fetcher:
+        added_ids, removed_ids, history_id = await fetcher.list_history(start_history_id)
+        # history is oldest first - keep the newest when over the limit
+        async for batch in fetcher.iter_ids(added_ids[-limit:]):
+            msgs_meta.extend(batch)
+            plan_items.extend(classify_bulk(batch)["items"])
+    return added_ids, removed_ids, msgs_meta, plan_items, history_id
+
+def _scan_result(plan_items: list[dict], samples: dict, scanned_count: int, hit_limit: bool):
+    return {
+        "summary": summarize_items(plan_items),
+        "safe_to_delete": [i["id"] for i in plan_items if i["decision"]=="delete"],
+        "review": [i["id"] for i in plan_items if i["decision"]=="review"],
+        "keep": [i["id"] for i in plan_items if i["decision"]=="keep"],
+        "samples": samples,
+        "scanned_count": scanned_count,
+        "hit_limit": hit_limit
+    }
+
+def _scan_incremental(user: CurrentUser, token_id: int, creds, sync_state, effective_limit: int, db: Session,
+                      days_back: int | None = None):
+    """
+    Incremental scan: classify only messages added or relabelled since the
+    last scan and merge them with the decisions already persisted, up to
+    effective_limit and within the days_back window. Returns None when the
+    stored historyId has expired and a full scan is needed.
+    """
+    try:
+        added_ids, removed_ids, msgs_meta, plan_items, history_id = asyncio.run(
+            _fetch_changes(creds, user.user_id, sync_state.history_id, effective_limit)
+        )
+    except HistoryExpiredError:
+        logger.info(f"History {sync_state.history_id} expired for user_id={user.user_id}, falling back to full scan")
+        return None
+    sync_refreshed_token(user.user_id)
+    
+    logger.info(f"Incremental scan for user_id={user.user_id}: {len(added_ids)} added, {len(removed_ids)} removed since history {sync_state.history_id}")
+    
+    msg_lookup = {m["id"]: m for m in msgs_meta}
+    _persist_decisions(db, user.user_id, plan_items, msg_lookup)
+    
+    # Relabelled messages can be older than the window the scan covers
+    newer_than = datetime.utcnow() - timedelta(days=days_back) if days_back else None
+    if newer_than is not None:
+        plan_items = [
+            it for it in plan_items
+            if (date := _message_date(msg_lookup.get(it["id"], {}))) is None or date >= newer_than
+        ]
+    
+    # New decisions win over stale ones; changed messages that were not
+    # re-classified (over the limit) and removed ones drop out. One extra row
+    # tells whether the limit cut the merge short.
+    changed_ids = set(added_ids) | removed_ids
+    room = max(effective_limit - len(plan_items), 0)
+    previous = [
+        it for it in load_previous_decisions(
+            db, user.user_id, sync_state.full_scan_at, newer_than=newer_than, limit=room + len(changed_ids) + 1
+        )
+        if it["id"] not in changed_ids
+    ]
+    merged = plan_items + previous[:room]
+    
+    save_sync_state(db, user.user_id, token_id, history_id)
+    
+    samples = {decision: [] for decision in SAMPLE_LIMITS}
+    _collect_samples(samples, plan_items, msg_lookup)
+    
+    hit_limit = len(added_ids) > effective_limit or len(previous) > room
+    result = _scan_result(merged, samples, len(merged), hit_limit)
+    result["incremental"] = True
+    result["new_count"] = len(plan_items)
+    return result
+
+def scan_recent(user: CurrentUser, days_back: int, limit: int, db: Session | None = None, full_rescan: bool = False,
+                filters: ScanFilters | None = None):
+    if db is None:
+        # Called outside a request (worker, scheduler) - use a session of our own
+        with session_scope("scan_recent") as db:
+            return scan_recent(user, days_back, limit, db, full_rescan=full_rescan, filters=filters)
+    
+    cached = get_user_credentials(db, user.user_id)
+    if not cached: return {"error":"not_authorized"}
+    creds = cached.credentials
+
+    # Filtering happens in Gmail's search, so nothing outside the window is listed or fetched
+    query = build_query(days_back, filters)
+    # Targeted scans (category, size, labels) are one-offs: history.list can't
+    # apply their filters, so they neither use nor replace the sync baseline
+    targeted = bool(filters and filters.targeted)
+    logger.info(f"Scanning Gmail for user_id={user.user_id}, query={query!r}, limit={limit}")
     
-    # Helper function to get sample emails for a category
-    def get_samples(items, category, max_samples=5):
-        category_items = [i for i in items if i["decision"] == category]
-        samples = []
-        for item in category_items[:max_samples]:
-            msg_meta = msg_lookup.get(item["id"])
-            if msg_meta:
-                samples.append({
-                    "from": msg_meta["from"],
-                    "subject": msg_meta["subject"],
-                    "date": msg_meta["date"],
-                    "size_kb": round(msg_meta["size"] / 1024, 1)
-                })
-        return samples
+    # Cap limit to prevent overwhelming API and user
+    effective_limit = min(limit, MAX_EMAILS_PER_SCAN)
+    if limit > MAX_EMAILS_PER_SCAN:
+        logger.warning(f"Limit {limit} exceeds max {MAX_EMAILS_PER_SCAN}, capping to {MAX_EMAILS_PER_SCAN}")
+    
+    try:
+        # After a full scan, later scans only need what changed since its historyId
+        sync_state = None if full_rescan or targeted else get_sync_state(db, cached.token_id)
+        if sync_state and sync_state.history_id and (sync_state.query or "") == query:
+            result = _scan_incremental(user, cached.token_id, creds, sync_state, effective_limit, db, days_back)
+            if result is not None:
+                return result
+        
+        # List message IDs and fetch metadata as a pipeline: each page of IDs is
+        # fetched while the next page is being listed
+        full_scan_at = datetime.utcnow()
+        all_ids, msgs_meta, plan_items, history_id = asyncio.run(_fetch_and_classify(creds, user.user_id, effective_limit, query))
+    except CircuitBreakerOpenError as e:
+        logger.error(f"Circuit breaker open for user_id={user.user_id}: {str(e)}")
+        return {"error": "service_unavailable", "message": "Gmail API is temporarily unavailable. Please try again in a minute."}
+    except GmailListError as e:
+        logger.error(f"Failed to list messages for user_id={user.user_id}: {str(e)}")
+        return {"error": "scan_failed", "message": "Failed to fetch email list. Please try again."}
+    except GmailFetchError as e:
+        logger.error(f"{str(e)}, aborting scan for user_id={user.user_id}")
+        return {"error": "scan_failed", "message": "Failed to fetch email metadata. Please try again."}
+    
+    sync_refreshed_token(user.user_id)
+    logger.info(f"Found {len(all_ids)} total messages for user_id={user.user_id}")
+    logger.info(f"Successfully fetched metadata for {len(msgs_meta)} emails")
+    
+    # Create a mapping of message_id to metadata for easy lookup
+    msg_lookup = {m["id"]: m for m in msgs_meta}
+    
+    # persist preview log (not applied) - NO SUBJECTS for privacy
+    _persist_decisions(db, user.user_id, plan_items, msg_lookup)
+    if not targeted:
+        save_sync_state(db, user.user_id, cached.token_id, history_id, full_scan_at=full_scan_at, query=query)
     
     # Get sample emails for each category
-    samples = {
-        "delete": get_samples(plan["items"], "delete", 5),
-        "review": get_samples(plan["items"], "review", 3),
-        "keep": get_samples(plan["items"], "keep", 3)
-    }
+    samples = {decision: [] for decision in SAMPLE_LIMITS}
+    _collect_samples(samples, plan_items, msg_lookup)
     
-    result = {
-        "summary": plan["summary"],
-        "safe_to_delete": [i["id"] for i in plan["items"] if i["decision"]=="delete"],
-        "review": [i["id"] for i in plan["items"] if i["decision"]=="review"],
-        "keep": [i["id"] for i in plan["items"] if i["decision"]=="keep"],
+    result = _scan_result(plan_items, samples, len(all_ids), len(all_ids) >= effective_limit)
+    result["incremental"] = False
+    result["new_count"] = len(plan_items)
+    return result
+
+async def _sample_and_classify(creds, user_id: int, strata: list, sample_size: int):
+    """Draw, fetch and classify a stratified sample. Returns (strata, msgs_meta)."""
+    async with AsyncGmailFetcher(creds, user_id=user_id, cache=get_metadata_cache()) as fetcher:
+        return await sample_mailbox(fetcher, strata, sample_size)
+
+def sample_scan(user: CurrentUser, days_back: int, sample_size: int, db: Session | None = None,
+                filters: ScanFilters | None = None):
+    """
+    Whole-mailbox estimate from a stratified random sample (see sampling.py).
+    The sample costs the same API budget as a scan of `sample_size` messages.
+    """
+    if db is None:
+        with session_scope("sample_scan") as db:
+            return sample_scan(user, days_back, sample_size, db, filters)
+    
+    cached = get_user_credentials(db, user.user_id)
+    if not cached: return {"error":"not_authorized"}
+    
+    strata = build_strata(days_back, filters)
+    effective_size = min(sample_size, MAX_EMAILS_PER_SCAN)
+    # Checked before listing any frame: every stratum may turn out non-empty
+    if effective_size < MIN_PER_STRATUM * len(strata):
+        raise ValueError(f"Sample size must be at least {MIN_PER_STRATUM * len(strata)} for {len(strata)} strata")
+    logger.info(f"Sampling Gmail for user_id={user.user_id}: {len(strata)} strata, sample_size={effective_size}")
+    
+    try:
+        strata, msgs_meta = asyncio.run(_sample_and_classify(cached.credentials, user.user_id, strata, effective_size))
+    except CircuitBreakerOpenError as e:
+        logger.error(f"Circuit breaker open for user_id={user.user_id}: {str(e)}")
+        return {"error": "service_unavailable", "message": "Gmail API is temporarily unavailable. Please try again in a minute."}
+    except GmailListError as e:
+        logger.error(f"Failed to list sample frames for user_id={user.user_id}: {str(e)}")
+        return {"error": "scan_failed", "message": "Failed to fetch email list. Please try again."}
+    except GmailFetchError as e:
+        logger.error(f"{str(e)}, aborting sample scan for user_id={user.user_id}")
+        return {"error": "scan_failed", "message": "Failed to fetch email metadata. Please try again."}
+    
+    sync_refreshed_token(user.user_id)
+    
+    # Sampled decisions are not logged: they stand for the whole mailbox, and
+    # counting them into the stats rollup as scanned messages would skew it
+    plan_items = [it for s in strata for it in s.items]
+    samples = {decision: [] for decision in SAMPLE_LIMITS}
+    _collect_samples(samples, plan_items, {m["id"]: m for m in msgs_meta})
+    
+    return {
+        "mode": "sample",
+        "summary": estimate(strata),
+        "strata": [
+            {"query": s.query, "population": s.population, "sampled": len(s.items)}
+            for s in strata if s.population
+        ],
         "samples": samples,
-        "scanned_count": len(all_ids),
-        "hit_limit": len(all_ids) >= effective_limit
+        "scanned_count": len(plan_items),
+        "estimated": True
     }
+
+async def stream_scan(user_id: int, days_back: int, limit: int, filters: ScanFilters | None = None):
+    """
+    Streaming variant of scan_recent
+    
+    Async generator of events: one "batch" event per classified metadata batch
+    (items plus running counts), then a final "summary" event. Each batch is
+    persisted as it lands, so nothing but counts and samples is held for the
+    whole scan. Failures arrive as an "error" event because the response has
+    already started by then.
+    
+    Opens its own session: request-scoped sessions are closed before a
+    streaming response body is sent. The session is only used from worker
+    threads, including when it is closed.
+    """
+    async with threaded_session_scope("stream_scan") as db:
+        cached = await asyncio.to_thread(get_user_credentials, db, user_id)
+        if not cached:
+            yield {"type": "error", "error": "not_authorized"}
+            return
+        creds = cached.credentials
+        
+        query = build_query(days_back, filters)
+        logger.info(f"Streaming Gmail scan for user_id={user_id}, query={query!r}, limit={limit}")
+        effective_limit = min(limit, MAX_EMAILS_PER_SCAN)
+        
+        counts = {"delete": 0, "review": 0, "keep": 0}
+        total_size = 0
+        samples = {decision: [] for decision in SAMPLE_LIMITS}
+        
+        full_scan_at = datetime.utcnow()
+        try:
+            async with AsyncGmailFetcher(creds, user_id=user_id, cache=get_metadata_cache()) as fetcher:
+                history_id = await fetcher.get_history_id()
+                async with aclosing(fetcher.iter_scan(effective_limit, query)) as batches:
+                    async for batch in batches:
+                        plan = classify_bulk(batch)
+                        msg_lookup = {m["id"]: m for m in batch}
+                        await asyncio.to_thread(_persist_decisions, db, user_id, plan["items"], msg_lookup)
+                    
+                        for decision, n in plan["summary"]["counts"].items():
+                            counts[decision] += n
+                        total_size += sum(it["size"] for it in plan["items"])
+                        _collect_samples(samples, plan["items"], msg_lookup)
+                    
+                        yield {
+                            "type": "batch",
+                            "items": [
+                                {"id": it["id"], "decision": it["decision"], "confidence": it["confidence"], "size": it["size"]}
+                                for it in plan["items"]
+                            ],
+                            "counts": dict(counts)
+                        }
+        except CircuitBreakerOpenError as e:
+            logger.error(f"Circuit breaker open for user_id={user_id}: {str(e)}")
+            yield {"type": "error", "error": "service_unavailable", "message": "Gmail API is temporarily unavailable. Please try again in a minute."}
+            return
+        except GmailListError as e:
+            logger.error(f"Failed to list messages for user_id={user_id}: {str(e)}")
+            yield {"type": "error", "error": "scan_failed", "message": "Failed to fetch email list. Please try again."}
+            return
+        except GmailFetchError as e:
+            logger.error(f"{str(e)}, aborting scan for user_id={user_id}")
+            yield {"type": "error", "error": "scan_failed", "message": "Failed to fetch email metadata. Please try again."}
+            return
+        
+        sync_refreshed_token(user_id)
+        
+        # Streaming is always a full scan; unless targeted it becomes the baseline for incremental ones
+        if not (filters and filters.targeted):
+            await asyncio.to_thread(save_sync_state, db, user_id, cached.token_id, history_id, full_scan_at, query)
+        
+        yield {
+            "type": "summary",
+            "summary": {
+                "total_items": sum(counts.values()),
+                "counts": counts,
+                "approx_size_mb": round(total_size/1_000_000,2)
+            },
+            "samples": samples,
+            "scanned_count": len(fetcher.listed_ids),
+            "hit_limit": len(fetcher.listed_ids) >= effective_limit
+        }
+
+def summarize_mailbox(user: CurrentUser, db: Session | None = None):
+    """Estimated clutter from Gmail's label counters - no messages are fetched (see summary.py)"""
+    if db is None:
+        with session_scope("summarize_mailbox") as db:
+            return summarize_mailbox(user, db)
     
+    cached = get_user_credentials(db, user.user_id)
+    if not cached: return {"error":"not_authorized"}
+    
+    try:
+        result = mailbox_summary(build_gmail_service(cached.credentials))
+    except CircuitBreakerOpenError as e:
+        logger.error(f"Circuit breaker open for user_id={user.user_id}: {str(e)}")
+        return {"error": "service_unavailable", "message": "Gmail API is temporarily unavailable. Please try again in a minute."}
+    except Exception as e:
+        logger.error(f"Mailbox summary failed for user_id={user.user_id}: {str(e)}")
+        return {"error": "summary_failed", "message": "Failed to read mailbox counters. Please try again."}
+    
+    sync_refreshed_token(user.user_id)
     return result
 
-def apply_cleanup(user: CurrentUser, message_ids: list[str], mode: str, db: Session = next(get_db())):
-    tok = _get_token(db, user)
-    if not tok: return {"error":"not_authorized"}
-    f = _fernet()
-    service = get_gmail_service(f.decrypt(tok.access_token).decode(), f.decrypt(tok.refresh_token).decode() or None, tok.expiry)
+def apply_cleanup(user: CurrentUser, message_ids: list[str], mode: str, db: Session | None = None):
+    if db is None:
+        with session_scope("apply_cleanup") as db:
+            return apply_cleanup(user, message_ids, mode, db)
+    
+    cached = get_user_credentials(db, user.user_id)
+    if not cached: return {"error":"not_authorized"}
+    service = build_gmail_service(cached.credentials)
 
     logger.info(f"Applying cleanup for user_id={user.user_id}, mode={mode}, count={len(message_ids)}")
     
     try:
         if mode == "trash":
-            # move to Trash (undo possible in Gmail)
-            failed_count = 0
-            for mid in message_ids:
-                try:
-                    def trash_message():
-                        return service.users().messages().trash(userId="me", id=mid).execute()
-                    
-                    _retry_with_backoff(trash_message, operation_name=f"Trash message {mid}")
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to trash message {mid}: {str(e)}")
-                    if failed_count > 5:  # Too many failures
-                        logger.error(f"Too many failures ({failed_count}), aborting cleanup")
-                        return {"error": "cleanup_failed", "message": "Failed to delete some emails. Please try again."}
-            
-            if failed_count > 0:
-                logger.warning(f"Cleanup completed with {failed_count} failures out of {len(message_ids)}")
+            # move to Trash (undo possible in Gmail) - up to 1000 IDs per call
+            result = trash_messages(service, message_ids)
         else:
-            # label only - create label if it doesn't exist
-            label_name = "Deklutter_Review"
-            
-            # Get existing labels with retry
-            def list_labels():
-                return service.users().labels().list(userId="me").execute()
-            
-            labels_response = _retry_with_backoff(list_labels, operation_name="List labels")
-            existing_labels = {label['name']: label['id'] for label in labels_response.get('labels', [])}
-            
-            # Create label if it doesn't exist
-            if label_name not in existing_labels:
-                label_object = {
-                    'name': label_name,
-                    'labelListVisibility': 'labelShow',
-                    'messageListVisibility': 'show'
-                }
-                
-                def create_label():
-                    return service.users().labels().create(userId="me", body=label_object).execute()
-                
-                created_label = _retry_with_backoff(create_label, operation_name="Create label")
-                label_id = created_label['id']
-                logger.info(f"Created label '{label_name}' with ID: {label_id}")
-            else:
-                label_id = existing_labels[label_name]
-            
-            # Apply label to messages
-            failed_count = 0
-            for mid in message_ids:
-                try:
-                    def modify_message():
-                        return service.users().messages().modify(userId="me", id=mid, body={"addLabelIds":[label_id]}).execute()
-                    
-                    _retry_with_backoff(modify_message, operation_name=f"Label message {mid}")
-                except Exception as e:
-                    failed_count += 1
-                    logger.error(f"Failed to label message {mid}: {str(e)}")
-                    if failed_count > 5:
-                        logger.error(f"Too many failures ({failed_count}), aborting labeling")
-                        return {"error": "cleanup_failed", "message": "Failed to label some emails. Please try again."}
+            # label only - label is created if it doesn't exist
+            result = label_messages(service, message_ids)
+        
+        if message_ids and result["processed"] == 0:
+            logger.error(f"Cleanup failed for every chunk for user_id={user.user_id}")
+            return {"error": "cleanup_failed", "message": "Failed to complete cleanup. Please try again.", "chunks": result["chunks"]}
+        if result["failed"] > 0:
+            logger.warning(f"Cleanup completed with {result['failed']} failures out of {len(message_ids)}")
 
-        # mark applied
-        db.query(MailDecisionLog).filter(MailDecisionLog.user_id==user.user_id, MailDecisionLog.message_id.in_(message_ids)).update({"applied": True}, synchronize_session=False)
+        sync_refreshed_token(user.user_id)
+        
+        # mark applied - only messages whose chunk succeeded
+        mark_applied(db, user.user_id, result["succeeded_ids"])
         db.commit()
+        # Their labels just changed - don't let a cached copy outlive that
+        get_metadata_cache().invalidate(user.user_id, result["succeeded_ids"])
         
-        logger.info(f"Cleanup completed successfully for user_id={user.user_id}")
-        return {"deleted": len(message_ids) if mode=="trash" else 0, "labeled": len(message_ids) if mode!="trash" else 0}
+        logger.info(f"Cleanup completed for user_id={user.user_id}: {result['processed']} processed, {result['failed']} failed")
+        return {
+            "deleted": result["processed"] if mode=="trash" else 0,
+            "labeled": result["processed"] if mode!="trash" else 0,
+            "failed": result["failed"],
+            "chunks": result["chunks"]
+        }
         
     except Exception as e:
         logger.error(f"Cleanup failed for user_id={user.user_id}: {str(e)}")
-        return {"error": "cleanup_failed", "message": "Failed to complete cleanup. Please try again."}
\ No newline at end of file
+        return {"error": "cleanup_failed", "message": "Failed to complete cleanup. Please try again."}
+
+def apply_sender_action(user: CurrentUser, filters: ScanFilters, mode: str, days_back: int | None = None,
+                        limit: int = MAX_SENDER_ACTION_MESSAGES, dry_run: bool = True, db: Session | None = None):
+    """
+    Trash (or label) everything from `filters.senders`, optionally narrowed by
+    the other filters and days_back. IDs come straight from a Gmail search and
+    go straight into batchModify - no message is fetched or classified, so
+    5k messages cost ~10 list calls and 5 batchModify calls.
+    Only the matches are counted unless dry_run is turned off. Each call acts
+    on at most MAX_SENDER_ACTION_MESSAGES; handled messages stop matching
+    (trash is not searched, labelled ones are excluded), so repeating the call
+    continues where it stopped.
+    """
+    check_bulk_senders(filters.senders)
+    if mode != "trash":
+        filters = replace(filters, exclude_labels=filters.exclude_labels + (REVIEW_LABEL_NAME,))
+    if db is None:
+        with session_scope("apply_sender_action") as db:
+            return apply_sender_action(user, filters, mode, days_back, limit, dry_run, db)
+    
+    cached = get_user_credentials(db, user.user_id)
+    if not cached: return {"error":"not_authorized"}
+    service = build_gmail_service(cached.credentials)
+    
+    query = build_query(days_back, filters)
+    limit = min(limit, MAX_SENDER_ACTION_MESSAGES)
+    logger.info(f"Sender action for user_id={user.user_id}: mode={mode}, query={query!r}, limit={limit}, dry_run={dry_run}")
+    
+    try:
+        message_ids, truncated = list_matching_ids(service, query, limit)
+    except CircuitBreakerOpenError as e:
+        logger.error(f"Circuit breaker open for user_id={user.user_id}: {str(e)}")
+        return {"error": "service_unavailable", "message": "Gmail API is temporarily unavailable. Please try again in a minute."}
+    except Exception as e:
+        logger.error(f"Sender search failed for user_id={user.user_id}: {str(e)}")
+        return {"error": "cleanup_failed", "message": "Failed to find the sender's emails. Please try again."}
+    
+    if dry_run or not message_ids:
+        sync_refreshed_token(user.user_id)
+        return {"query": query, "matched": len(message_ids), "truncated": truncated, "dry_run": dry_run}
+    
+    result = apply_cleanup(user, message_ids, mode, db)
+    return {"query": query, "matched": len(message_ids), "truncated": truncated, **result}
+
@@ -0,0 +1,594 @@
+"""
+Asynchronous Gmail metadata fetcher
+Keeps several batch requests in flight under a quota-aware concurrency limit,
+and overlaps message-ID listing with metadata fetching
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+import weakref
+from contextlib import aclosing
+from email.parser import Parser
+from urllib.parse import urlencode
+
+import httpx
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from google.oauth2.credentials import Credentials
+
+from services.connectors.provider_config import get_provider_config
+from services.gmail_connector.circuit_breaker import get_circuit_breaker, CircuitBreakerOpenError
+from services.gmail_connector.fields import GZIP_HEADERS, masked
+from services.gmail_connector.metadata_cache import STALE_HISTORY_TYPES, MetadataCache, stale_message_ids
+
+logger = logging.getLogger(__name__)
+
+GMAIL_CONFIG = get_provider_config("gmail")
+
+# Same breaker as the synchronous client - both talk to the same API
+gmail_circuit_breaker = get_circuit_breaker(
+    "gmail_api",
+    failure_threshold=GMAIL_CONFIG.circuit_breaker_failure_threshold,
+    timeout=GMAIL_CONFIG.circuit_breaker_timeout,
+    success_threshold=GMAIL_CONFIG.circuit_breaker_success_threshold
+)
+
+GMAIL_API_BASE = "https://gmail.googleapis.com/gmail/v1/users/me"
+GMAIL_BATCH_URL = "https://gmail.googleapis.com/batch/gmail/v1"
+LIST_PAGE_SIZE = 100
+FRAME_PAGE_SIZE = 500  # messages.list maximum
+METADATA_HEADERS = ["Subject", "From", "Date"]
+MAX_FAILED_BATCHES = 3
+
+# Quota units per Gmail API method
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_COST = {
+    "messages.get": 5,
+    "messages.list": 5,
+    "history.list": 2,
+    "users.getProfile": 1,
+}
+
+# History record types that change which messages a scan should report, or how
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+# A message carrying one of these labels has left the mailbox as far as scans care
+REMOVED_LABELS = {"TRASH", "SPAM"}
+
+
+class GmailFetchError(Exception):
+    """Raised when too many metadata batches fail to abort a scan"""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GmailListError(GmailFetchError):
+    """Raised when listing message IDs fails after retries"""
+    pass
+
+
+class HistoryExpiredError(GmailFetchError):
+    """startHistoryId is too old for history.list - a full scan is needed"""
+    pass
+
+
+class QuotaLimiter:
+    """
+    Token bucket over Gmail quota units
+
+    Tokens refill at `rate` units/second up to `burst`. A request may take the
+    bucket negative, which delays the next caller until the debt is repaid -
+    this lets a 500-unit batch through a 250 units/s budget without deadlocking.
+
+    Gmail's quota is per user, so one limiter is shared by all of a user's
+    fetchers (quota_limiter_for). Scans run on their own event loops in
+    worker threads, hence a threading lock, held only for the arithmetic.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, units: float):
+        """Spend `units`, first waiting out any debt left by earlier callers"""
+        with self._lock:
+            self._refill()
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.tokens -= units
+        if wait_time:
+            logger.info(f"Quota budget exhausted, waiting {wait_time:.2f}s")
+            await asyncio.sleep(wait_time)
+
+
+# Live limiters by user; a user's entry goes away with their last fetcher
+_user_limiters: "weakref.WeakValueDictionary[int, QuotaLimiter]" = weakref.WeakValueDictionary()
+_user_limiters_lock = threading.Lock()
+
+
+def quota_limiter_for(user_id: int | None, config=GMAIL_CONFIG) -> QuotaLimiter:
+    """The limiter shared by every fetcher of `user_id` (a private one without a user)"""
+    if user_id is None:
+        return QuotaLimiter(config.quota_units_per_second, config.quota_burst_units)
+    with _user_limiters_lock:
+        limiter = _user_limiters.get(user_id)
+        if limiter is None:
+            limiter = _user_limiters[user_id] = QuotaLimiter(config.quota_units_per_second, config.quota_burst_units)
+        return limiter
+
+
+def parse_message_metadata(message_id: str, response: dict) -> dict:
+    """Flatten a messages.get(format=metadata) response into the classifier's item shape"""
+    headers = {h["name"]: h["value"] for h in response.get("payload", {}).get("headers", [])}
+    return {
+        "id": message_id,
+        "from": headers.get("From", ""),
+        "subject": headers.get("Subject", ""),
+        "date": headers.get("Date", ""),
+        "labels": response.get("labelIds", []),
+        "size": response.get("sizeEstimate", 0)
+    }
+
+
+def _parse_batch_response(content_type: str, content: str) -> dict[int, tuple[int, str]]:
+    """
+    Split a multipart/mixed batch response into {part_index: (status, body)}
+    Mirrors googleapiclient.http.BatchHttpRequest._execute
+    """
+    mime_response = Parser().parsestr(f"content-type: {content_type}\r\n\r\n{content}")
+    if not mime_response.is_multipart():
+        raise GmailFetchError("Batch response is not multipart")
+
+    parts = {}
+    for part in mime_response.get_payload():
+        # Content-ID comes back as "<response-N>"
+        content_id = part["Content-ID"].strip("<>").rsplit("-", 1)[-1]
+        payload = part.get_payload()
+        status_line, rest = payload.split("\n", 1)
+        status = int(status_line.split(" ", 2)[1])
+        inner = Parser().parsestr(rest)
+        parts[int(content_id)] = (status, inner.get_payload())
+    return parts
+
+
+class AsyncGmailFetcher:
+    """
+    Fetches message metadata with several Gmail batch requests in flight
+
+    Usage:
+        async with AsyncGmailFetcher(creds, user_id=user_id, cache=get_metadata_cache()) as fetcher:
+            async for batch in fetcher.iter_scan(limit):
+                ...
+
+    With a cache, messages already cached for `user_id` are served from it
+    and only the rest are fetched (and then cached). The cache is brought up
+    to date with the mailbox's history once, before the first batch.
+    """
+
+    def __init__(self, credentials: Credentials, config=GMAIL_CONFIG, user_id: int | None = None,
+                 cache: MetadataCache | None = None, transport: httpx.AsyncBaseTransport | None = None):
+        self.credentials = credentials
+        self.config = config
+        self.user_id = user_id
+        self.cache = cache if user_id is not None else None
+        self.batch_size = config.batch_size
+        self.max_retries = config.max_retries
+        self.retry_delay = config.retry_delay
+        self.retry_status_codes = set(config.retry_on_status_codes)
+        self._semaphore = asyncio.Semaphore(config.max_concurrent_batches)
+        self._quota = quota_limiter_for(user_id, config)
+        self._token_lock = asyncio.Lock()
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._cache_sync: asyncio.Task | None = None
+        self.listed_ids: list[str] = []
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=self.config.max_concurrent_batches),
+            headers=GZIP_HEADERS,  # httpx decompresses transparently
+            transport=self._transport
+        )
+        await self._ensure_token()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+        self._client = None
+
+    async def _ensure_token(self, force: bool = False):
+        """Refresh the access token (off the event loop) if it is missing or expired"""
+        if force or not self.credentials.valid:
+            logger.info("Refreshing Gmail access token")
+            await asyncio.to_thread(self.credentials.refresh, GoogleAuthRequest())
+
+    async def _reauth(self, rejected_token: str):
+        """
+        Refresh after a 401, once per expired token: concurrent batches that
+        were rejected with the same token wait for the first one's refresh
+        """
+        async with self._token_lock:
+            if self.credentials.token == rejected_token:
+                await self._ensure_token(force=True)
+
+    def _retry_wait(self, e: Exception, attempt: int) -> float | None:
+        """Backoff before the next attempt, or None if `e` should not be retried"""
+        status_code = getattr(getattr(e, "response", None), "status_code", None)
+        retryable = status_code is None or status_code in self.retry_status_codes
+        if retryable and attempt < self.max_retries - 1:
+            return self.retry_delay * (2 ** attempt)
+        return None
+
+    async def _get_json(self, path: str, params: dict, reauth: bool = True) -> dict:
+        """GET a Gmail REST resource under users/me"""
+        token = self.credentials.token
+        response = await self._client.get(
+            f"{GMAIL_API_BASE}{path}",
+            params=params,
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        if response.status_code == 401 and reauth:
+            await self._reauth(token)
+            return await self._get_json(path, params, reauth=False)
+        response.raise_for_status()
+        return response.json()
+
+    async def _get_with_retry(self, path: str, params: dict, operation_name: str, cost: int, error_cls=GmailFetchError) -> dict:
+        """GET with quota accounting, circuit breaker and retry"""
+        for attempt in range(self.max_retries):
+            await self._quota.acquire(cost)
+            try:
+                return await gmail_circuit_breaker.call_async(self._get_json, path, params)
+            except CircuitBreakerOpenError:
+                logger.error(f"{operation_name}: Circuit breaker is OPEN, aborting")
+                raise
+            except httpx.HTTPError as e:
+                wait_time = self._retry_wait(e, attempt)
+                if wait_time is None:
+                    status_code = getattr(getattr(e, "response", None), "status_code", None)
+                    raise error_cls(f"{operation_name} failed: {str(e)}", status_code=status_code) from e
+                logger.warning(f"{operation_name} failed, retrying in {wait_time}s (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(wait_time)
+
+    async def _list_page(self, page_num: int, params: dict) -> dict:
+        """One messages.list call with retry"""
+        return await self._get_with_retry(
+            "/messages", masked("messages.list", **params), f"List messages (page {page_num})",
+            QUOTA_COST["messages.list"], error_cls=GmailListError
+        )
+
+    async def list_frame(self, query: str, max_results: int = FRAME_PAGE_SIZE) -> tuple[list[str], int, bool]:
+        """
+        First page of message IDs matching `query`, newest first, for sampling
+        Returns (ids, estimated_total, complete) - complete when no page follows.
+        """
+        resp = await self._get_with_retry(
+            "/messages", masked("messages.list.frame", q=query, maxResults=max_results),
+            f"List sample frame ({query})", QUOTA_COST["messages.list"], error_cls=GmailListError
+        )
+        ids = [m["id"] for m in resp.get("messages", [])]
+        complete = not resp.get("nextPageToken")
+        return ids, len(ids) if complete else max(resp.get("resultSizeEstimate", 0), len(ids)), complete
+
+    async def get_history_id(self) -> str:
+        """Current mailbox historyId (users.getProfile) - the baseline for the next incremental scan"""
+        profile = await self._get_with_retry(
+            "/profile", masked("users.getProfile"), "Get profile", QUOTA_COST["users.getProfile"]
+        )
+        return profile["historyId"]
+
+    async def _history_pages(self, start_history_id: str, history_types: list[str]):
+        """
+        Yield users.history.list responses since start_history_id, all pages
+        Raises HistoryExpiredError when Gmail no longer has that history.
+        """
+        page_token = None
+        page_num = 0
+        while True:
+            page_num += 1
+            params = {"startHistoryId": start_history_id, "historyTypes": history_types, "maxResults": 500}
+            if page_token:
+                params["pageToken"] = page_token
+            try:
+                resp = await self._get_with_retry(
+                    "/history", masked("history.list", **params), f"List history (page {page_num})",
+                    QUOTA_COST["history.list"]
+                )
+            except GmailFetchError as e:
+                if e.status_code == 404:
+                    raise HistoryExpiredError(f"History {start_history_id} expired", status_code=404) from e
+                raise
+            yield resp
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+    async def list_history(self, start_history_id: str) -> tuple[list[str], set[str], str]:
+        """
+        Changes since start_history_id (users.history.list, all pages)
+
+        Returns (added_ids, removed_ids, latest_history_id). Added IDs are the
+        messages to (re)classify, in history order: new messages and messages
+        whose labels changed (starred, refiled, untrashed, ...), since labels
+        drive the classifier. Trashed, spammed and deleted messages are removed.
+        Raises HistoryExpiredError when Gmail no longer has that history.
+        """
+        added: dict[str, None] = {}
+        removed: set[str] = set()
+        latest_history_id = start_history_id
+
+        def changed(mid: str, gone: bool):
+            added.pop(mid, None)
+            if gone:
+                removed.add(mid)
+            else:
+                added[mid] = None  # moves to the end: history order
+                removed.discard(mid)
+
+        async for resp in self._history_pages(start_history_id, HISTORY_TYPES):
+            for record in resp.get("history", []):
+                for entry in record.get("messagesAdded", []):
+                    if REMOVED_LABELS.isdisjoint(entry["message"].get("labelIds", [])):
+                        changed(entry["message"]["id"], gone=False)
+                for entry in record.get("messagesDeleted", []):
+                    changed(entry["message"]["id"], gone=True)
+                # message.labelIds are the labels after the change
+                for entry in record.get("labelsAdded", []):
+                    labels = set(entry.get("labelIds", [])) | set(entry["message"].get("labelIds", []))
+                    changed(entry["message"]["id"], gone=not REMOVED_LABELS.isdisjoint(labels))
+                for entry in record.get("labelsRemoved", []):
+                    labels = entry["message"].get("labelIds", [])
+                    changed(entry["message"]["id"], gone=not REMOVED_LABELS.isdisjoint(labels))
+
+            latest_history_id = resp.get("historyId", latest_history_id)
+
+        return list(added), removed, latest_history_id
+
+    async def _sync_cache(self):
+        """Evict cached messages deleted or relabelled since the user's history cursor"""
+        since = await asyncio.to_thread(self.cache.get_history_id, self.user_id)
+        if since is not None:
+            stale: set[str] = set()
+            latest = since
+            try:
+                async for resp in self._history_pages(since, STALE_HISTORY_TYPES):
+                    stale |= stale_message_ids(resp.get("history", []))
+                    latest = resp.get("historyId", latest)
+            except HistoryExpiredError:
+                since = None
+            else:
+                await asyncio.to_thread(self.cache.invalidate, self.user_id, list(stale))
+                await asyncio.to_thread(self.cache.set_history_id, self.user_id, latest)
+                logger.info(f"Metadata cache synced for user_id={self.user_id}: {len(stale)} changed messages evicted")
+                return
+        # Entries of unknown age: start over from the mailbox's current history
+        await asyncio.to_thread(self.cache.invalidate_user, self.user_id)
+        await asyncio.to_thread(self.cache.set_history_id, self.user_id, await self.get_history_id())
+
+    async def _cached(self, message_ids: list[str]) -> dict[str, dict]:
+        """Cached metadata for message_ids, after syncing the cache once per fetcher"""
+        if self.cache is None:
+            return {}
+        if self._cache_sync is None:
+            self._cache_sync = asyncio.create_task(self._sync_cache())
+        try:
+            await asyncio.shield(self._cache_sync)
+        except CircuitBreakerOpenError:
+            raise
+        except Exception as e:
+            # Entries that could not be checked are not served; fetch everything
+            logger.warning(f"Metadata cache sync failed for user_id={self.user_id}, bypassing the cache: {str(e)}")
+            self.cache = None
+            return {}
+        return await asyncio.to_thread(self.cache.get_many, self.user_id, message_ids)
+
+    async def list_message_ids(self, limit: int, query: str = ""):
+        """Yield pages of message IDs matching `query` (Gmail search syntax) until `limit` IDs have been listed"""
+        listed = 0
+        page_token = None
+        page_num = 0
+
+        while listed < limit:
+            page_num += 1
+            params = {"maxResults": min(LIST_PAGE_SIZE, limit - listed)}
+            if query:
+                params["q"] = query
+            if page_token:
+                params["pageToken"] = page_token
+
+            resp = await self._list_page(page_num, params)
+            ids = [m["id"] for m in resp.get("messages", [])]
+            if not ids:
+                break
+
+            listed += len(ids)
+            yield ids
+
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+            logger.info(f"Fetched {listed} message IDs so far...")
+
+    async def _post_batch(self, message_ids: list[str], reauth: bool = True) -> dict[int, tuple[int, str]]:
+        """Send one multipart batch of messages.get calls"""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        query = urlencode(
+            [("format", "metadata")]
+            + [("metadataHeaders", h) for h in METADATA_HEADERS]
+            + list(masked("messages.get").items())
+        )
+        body = "".join(
+            f"--{boundary}\r\n"
+            f"Content-Type: application/http\r\n"
+            f"Content-ID: <{i}>\r\n\r\n"
+            f"GET /gmail/v1/users/me/messages/{mid}?{query}\r\n\r\n"
+            for i, mid in enumerate(message_ids)
+        ) + f"--{boundary}--"
+
+        token = self.credentials.token
+        response = await self._client.post(
+            GMAIL_BATCH_URL,
+            content=body.encode(),
+            headers={
+                "Content-Type": f"multipart/mixed; boundary={boundary}",
+                "Authorization": f"Bearer {token}"
+            }
+        )
+        if response.status_code == 401 and reauth:
+            # Token expired mid-scan - refresh once and resend
+            await self._reauth(token)
+            return await self._post_batch(message_ids, reauth=False)
+        response.raise_for_status()
+        return _parse_batch_response(response.headers["content-type"], response.text)
+
+    async def _fetch_batch(self, batch_num: int, message_ids: list[str]) -> list[dict]:
+        """
+        Fetch one batch with retry, serving cached messages from the cache
+        Whole-request failures back off and retry; parts that come back with a
+        retryable status (typically 429) are re-sent on the next attempt.
+        """
+        cached = await self._cached(message_ids)
+        results = list(cached.values())
+        pending = [mid for mid in message_ids if mid not in cached]
+        if not pending:
+            logger.info(f"Metadata batch {batch_num} served from cache ({len(results)} emails)")
+            return results
+
+        fetched_from = len(results)
+        async with self._semaphore:
+            for attempt in range(self.max_retries):
+                await self._quota.acquire(QUOTA_COST["messages.get"] * len(pending))
+                try:
+                    parts = await gmail_circuit_breaker.call_async(self._post_batch, pending)
+                except CircuitBreakerOpenError:
+                    logger.error(f"Metadata batch {batch_num}: Circuit breaker is OPEN, aborting")
+                    raise
+                except (httpx.HTTPError, GmailFetchError) as e:
+                    wait_time = self._retry_wait(e, attempt)
+                    if wait_time is None:
+                        raise
+                    logger.warning(f"Metadata batch {batch_num} failed ({type(e).__name__}), retrying in {wait_time}s (attempt {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+                    continue
+
+                retry_ids = []
+                for i, mid in enumerate(pending):
+                    status, body = parts.get(i, (None, ""))
+                    if status == 200:
+                        results.append(parse_message_metadata(mid, json.loads(body)))
+                    elif status in self.retry_status_codes:
+                        retry_ids.append(mid)
+                    else:
+                        logger.error(f"Error fetching message {mid}: status {status}")
+
+                if not retry_ids:
+                    break
+                pending = retry_ids
+                if attempt < self.max_retries - 1:
+                    wait_time = self.retry_delay * (2 ** attempt)
+                    logger.warning(f"Metadata batch {batch_num}: {len(retry_ids)} messages throttled, retrying in {wait_time}s")
+                    await asyncio.sleep(wait_time)
+                else:
+                    logger.error(f"Metadata batch {batch_num}: giving up on {len(retry_ids)} throttled messages")
+
+        if self.cache is not None and len(results) > fetched_from:
+            await asyncio.to_thread(self.cache.set_many, self.user_id, results[fetched_from:])
+
+        logger.info(f"Fetched metadata batch {batch_num} ({len(results)}/{len(message_ids)} emails, {fetched_from} cached)")
+        return results
+
+    async def iter_metadata(self, id_pages):
+        """
+        Yield lists of message metadata as each batch completes (completion order)
+
+        `id_pages` is an async iterable of ID lists (e.g. list_message_ids). Each
+        page is split into batches and scheduled as soon as it arrives, so
+        listing the next page overlaps with fetching the previous one.
+        Raises GmailFetchError after more than MAX_FAILED_BATCHES failed batches,
+        and GmailListError if listing fails.
+        """
+        results: asyncio.Queue = asyncio.Queue()
+        tasks = []
+
+        async def run_batch(batch_num, chunk):
+            try:
+                results.put_nowait(("batch", await self._fetch_batch(batch_num, chunk)))
+            except Exception as e:
+                results.put_nowait(("error", e))
+
+        async def produce():
+            try:
+                async for page in id_pages:
+                    for i in range(0, len(page), self.batch_size):
+                        chunk = page[i:i + self.batch_size]
+                        tasks.append(asyncio.create_task(run_batch(len(tasks) + 1, chunk)))
+                results.put_nowait(("listed", None))
+            except Exception as e:
+                results.put_nowait(("list_error", e))
+
+        producer = asyncio.create_task(produce())
+        listing_done = False
+        received = 0
+        failed_batches = 0
+
+        try:
+            while not (listing_done and received == len(tasks)):
+                kind, payload = await results.get()
+                if kind == "listed":
+                    listing_done = True
+                elif kind == "list_error":
+                    raise payload
+                elif kind == "error":
+                    received += 1
+                    if isinstance(payload, CircuitBreakerOpenError):
+                        raise payload
+                    failed_batches += 1
+                    logger.error(f"Failed to fetch metadata batch: {str(payload)}")
+                    if failed_batches > MAX_FAILED_BATCHES:
+                        raise GmailFetchError(f"Too many batch failures ({failed_batches})")
+                else:
+                    received += 1
+                    yield payload
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def iter_ids(self, message_ids: list[str]):
+        """Fetch metadata for a known list of IDs (e.g. from list_history)"""
+        async def single_page():
+            if message_ids:
+                yield message_ids
+
+        async with aclosing(self.iter_metadata(single_page())) as batches:
+            async for batch in batches:
+                yield batch
+
+    async def iter_scan(self, limit: int, query: str = ""):
+        """
+        List up to `limit` message IDs matching `query` and fetch their metadata in one pipeline
+        IDs seen so far are recorded in `self.listed_ids`.
+        """
+        self.listed_ids = []
+
+        async def record(pages):
+            async for page in pages:
+                self.listed_ids.extend(page)
+                yield page
+
+        # Closing this generator must close iter_metadata too, which cancels the batches in flight
+        async with aclosing(self.iter_metadata(record(self.list_message_ids(limit, query)))) as batches:
+            async for batch in batches:
+                yield batch
@@ -0,0 +1,141 @@
+"""
+Bulk Gmail actions via users.messages.batchModify
+One call labels (or trashes) up to 1000 messages instead of one call per message
+"""
+
+import logging
+from services.gmail_connector.circuit_breaker import CircuitBreakerOpenError
+from services.gmail_connector.retry import retry_with_backoff
+from services.gmail_connector.fields import masked
+
+logger = logging.getLogger(__name__)
+
+# Gmail rejects batchModify calls with more than 1000 IDs
+BATCH_MODIFY_MAX_IDS = 1000
+LIST_MAX_RESULTS = 500  # messages.list page size limit
+
+TRASH_LABEL = "TRASH"
+REVIEW_LABEL_NAME = "Deklutter_Review"
+
+
+def list_matching_ids(service, query: str, limit: int) -> tuple[list[str], bool]:
+    """
+    Message IDs matching a Gmail search, up to `limit`, one page of 500 per call.
+    Only IDs are requested - acting on a search needs no message metadata.
+    Returns (ids, truncated) where truncated means more messages matched.
+    """
+    ids = []
+    page_token = None
+    while len(ids) < limit:
+        params = {"userId": "me", "q": query, "maxResults": min(LIST_MAX_RESULTS, limit - len(ids))}
+        if page_token:
+            params["pageToken"] = page_token
+
+        def list_page():
+            return service.users().messages().list(**masked("messages.list", **params)).execute()
+
+        resp = retry_with_backoff(list_page, operation_name=f"List '{query}' (page {len(ids) // LIST_MAX_RESULTS + 1})")
+        ids.extend(m["id"] for m in resp.get("messages", []))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return ids, False
+    return ids, True
+
+
+def batch_modify(
+    service,
+    message_ids: list[str],
+    add_label_ids: list[str] | None = None,
+    remove_label_ids: list[str] | None = None,
+    chunk_size: int = BATCH_MODIFY_MAX_IDS,
+    operation_name: str = "batchModify"
+) -> dict:
+    """
+    Add/remove labels on many messages, one batchModify call per chunk.
+
+    Each chunk is retried independently; a failed chunk does not stop the
+    others, except when the circuit breaker opens, which fails every
+    remaining chunk without calling Gmail.
+
+    Returns:
+        {
+            "processed": int,
+            "failed": int,
+            "succeeded_ids": [message_ids],
+            "chunks": [{"chunk": int, "count": int, "ok": bool, "error": str | None}]
+        }
+    """
+    body_labels = {}
+    if add_label_ids:
+        body_labels["addLabelIds"] = add_label_ids
+    if remove_label_ids:
+        body_labels["removeLabelIds"] = remove_label_ids
+
+    chunks = [message_ids[i:i + chunk_size] for i in range(0, len(message_ids), chunk_size)]
+    succeeded_ids = []
+    chunk_results = []
+    breaker_open = False
+
+    for n, chunk in enumerate(chunks, start=1):
+        if breaker_open:
+            chunk_results.append({"chunk": n, "count": len(chunk), "ok": False, "error": "circuit_open"})
+            continue
+
+        body = {"ids": chunk, **body_labels}
+
+        def modify_chunk():
+            return service.users().messages().batchModify(**masked("messages.batchModify", userId="me", body=body)).execute()
+
+        try:
+            retry_with_backoff(modify_chunk, operation_name=f"{operation_name} chunk {n}/{len(chunks)}")
+            succeeded_ids.extend(chunk)
+            chunk_results.append({"chunk": n, "count": len(chunk), "ok": True, "error": None})
+        except CircuitBreakerOpenError:
+            breaker_open = True
+            chunk_results.append({"chunk": n, "count": len(chunk), "ok": False, "error": "circuit_open"})
+        except Exception as e:
+            logger.error(f"{operation_name} chunk {n}/{len(chunks)} failed: {str(e)}")
+            chunk_results.append({"chunk": n, "count": len(chunk), "ok": False, "error": str(e)})
+
+    return {
+        "processed": len(succeeded_ids),
+        "failed": len(message_ids) - len(succeeded_ids),
+        "succeeded_ids": succeeded_ids,
+        "chunks": chunk_results
+    }
+
+
+def trash_messages(service, message_ids: list[str]) -> dict:
+    """Move messages to Trash (recoverable) by adding the TRASH label"""
+    return batch_modify(service, message_ids, add_label_ids=[TRASH_LABEL], operation_name="Trash")
+
+
+def get_or_create_label(service, label_name: str = REVIEW_LABEL_NAME) -> str:
+    """Return the ID of a user label, creating it if it doesn't exist"""
+    def list_labels():
+        return service.users().labels().list(**masked("labels.list", userId="me")).execute()
+
+    labels_response = retry_with_backoff(list_labels, operation_name="List labels")
+    existing_labels = {label['name']: label['id'] for label in labels_response.get('labels', [])}
+
+    if label_name in existing_labels:
+        return existing_labels[label_name]
+
+    label_object = {
+        'name': label_name,
+        'labelListVisibility': 'labelShow',
+        'messageListVisibility': 'show'
+    }
+
+    def create_label():
+        return service.users().labels().create(**masked("labels.create", userId="me", body=label_object)).execute()
+
+    created_label = retry_with_backoff(create_label, operation_name="Create label")
+    logger.info(f"Created label '{label_name}' with ID: {created_label['id']}")
+    return created_label['id']
+
+
+def label_messages(service, message_ids: list[str], label_name: str = REVIEW_LABEL_NAME) -> dict:
+    """Apply a (possibly new) user label to messages"""
+    label_id = get_or_create_label(service, label_name)
+    return batch_modify(service, message_ids, add_label_ids=[label_id], operation_name=f"Label {label_name}")
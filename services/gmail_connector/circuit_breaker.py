@@ -51,16 +51,8 @@ class CircuitBreaker:
         Execute function through circuit breaker
         """
         # Check if circuit is open
-        if self.state == CircuitState.OPEN:
-            # Check if timeout has passed
-            if self.opened_at and (datetime.now() - self.opened_at).seconds >= self.timeout:
-                logger.info(f"Circuit breaker '{self.name}': Timeout passed, entering HALF_OPEN state")
-                self.state = CircuitState.HALF_OPEN
-                self.success_count = 0
-            else:
-                logger.warning(f"Circuit breaker '{self.name}': OPEN - rejecting request")
-                raise CircuitBreakerOpenError(f"Circuit breaker '{self.name}' is OPEN")
-        
+        self._check_open()
+
         # Try to execute the function
         try:
             result = func(*args, **kwargs)
@@ -70,6 +62,31 @@ class CircuitBreaker:
             self._on_failure()
             raise
     
+    async def call_async(self, func, *args, **kwargs):
+        """
+        Await a coroutine function through circuit breaker
+        """
+        self._check_open()
+
+        try:
+            result = await func(*args, **kwargs)
+            self._on_success()
+            return result
+        except Exception as e:
+            self._on_failure()
+            raise
+
+    def _check_open(self):
+        """Raise if the circuit is open, or move to HALF_OPEN once the timeout has passed"""
+        if self.state == CircuitState.OPEN:
+            if self.opened_at and (datetime.now() - self.opened_at).seconds >= self.timeout:
+                logger.info(f"Circuit breaker '{self.name}': Timeout passed, entering HALF_OPEN state")
+                self.state = CircuitState.HALF_OPEN
+                self.success_count = 0
+            else:
+                logger.warning(f"Circuit breaker '{self.name}': OPEN - rejecting request")
+                raise CircuitBreakerOpenError(f"Circuit breaker '{self.name}' is OPEN")
+
     def _on_success(self):
         """Handle successful request"""
         if self.state == CircuitState.HALF_OPEN:
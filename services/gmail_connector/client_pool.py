@@ -0,0 +1,63 @@
+"""
+Reusable Gmail API clients
+build() re-reads and parses the discovery document and every new httplib2
+transport pays a fresh TLS handshake. The parsed document is kept for the
+life of the process and each worker thread keeps one keep-alive transport;
+per request only the credentials are swapped in.
+"""
+
+import json
+import logging
+import threading
+from functools import lru_cache
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 30  # seconds, same as the async fetcher
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def _discovery_doc() -> dict | None:
+    """Parsed Gmail v1 discovery document (bundled with googleapiclient)"""
+    doc = get_static_doc("gmail", "v1")
+    if doc is None:
+        logger.warning("No bundled Gmail discovery document, falling back to build()")
+        return None
+    return json.loads(doc)
+
+
+def _transport() -> httplib2.Http:
+    """This thread's transport - httplib2.Http is not thread-safe, but keeps connections alive"""
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = httplib2.Http(timeout=HTTP_TIMEOUT)
+        _local.http = http
+    return http
+
+
+def gmail_client(creds: Credentials):
+    """
+    Gmail service for `creds` on a pooled transport
+
+    Use the service from the thread that created it (one request's worth of
+    calls); other threads get their own transport.
+    """
+    authed_http = AuthorizedHttp(creds, http=_transport())
+    doc = _discovery_doc()
+    if doc is None:
+        return build("gmail", "v1", http=authed_http, cache_discovery=False)
+    return build_from_document(doc, http=authed_http)
+
+
+def reset_pool():
+    """Drop this thread's transport and the parsed document (for testing)"""
+    _local.http = None
+    _discovery_doc.cache_clear()
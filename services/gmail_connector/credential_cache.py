@@ -0,0 +1,139 @@
+"""
+Decrypted Gmail credentials cache
+Every scan/apply used to query the newest OAuthToken and Fernet-decrypt
+both tokens. Decrypted Credentials are kept in memory per user for a
+bounded time instead; tokens refreshed while in use are written back to
+the database in the background.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from google.oauth2.credentials import Credentials
+from sqlalchemy.orm import Session
+
+from db.models import OAuthToken
+from db.session import session_scope
+from services.gmail_connector.oauth import _fernet, get_gmail_credentials
+
+logger = logging.getLogger(__name__)
+
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", 300))  # seconds
+CREDENTIAL_CACHE_MAX_USERS = int(os.getenv("CREDENTIAL_CACHE_MAX_USERS", 10_000))
+
+
+@dataclass
+class CachedCredentials:
+    token_id: int                # OAuthToken.id the credentials were decrypted from
+    credentials: Credentials
+    persisted_token: str         # access token as last stored in the DB
+    expires_at: float            # time.monotonic() deadline for this entry
+
+
+_entries: OrderedDict[int, CachedCredentials] = OrderedDict()
+_last_used: dict[int, float] = {}  # user_id -> time.monotonic() of the last lookup
+_lock = threading.Lock()
+# One writer is plenty - refreshes happen about once an hour per user
+_write_back_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-write-back")
+
+
+def _get_token(db: Session, user_id: int) -> OAuthToken | None:
+    return db.query(OAuthToken).filter(OAuthToken.user_id==user_id, OAuthToken.provider=="google").order_by(OAuthToken.id.desc()).first()
+
+
+def _load(db: Session, user_id: int) -> CachedCredentials | None:
+    tok = _get_token(db, user_id)
+    if not tok:
+        return None
+    f = _fernet()
+    access_token = f.decrypt(tok.access_token).decode()
+    refresh_token = f.decrypt(tok.refresh_token).decode() if tok.refresh_token else ""
+    creds = get_gmail_credentials(access_token, refresh_token or None, tok.expiry)
+    return CachedCredentials(
+        token_id=tok.id,
+        credentials=creds,
+        persisted_token=access_token,
+        expires_at=time.monotonic() + CREDENTIAL_CACHE_TTL
+    )
+
+
+def get_user_credentials(db: Session, user_id: int) -> CachedCredentials | None:
+    """Credentials for a user's newest Google token, or None if not authorized"""
+    now = time.monotonic()
+    with _lock:
+        _last_used[user_id] = now
+        entry = _entries.get(user_id)
+        if entry and entry.expires_at > now:
+            _entries.move_to_end(user_id)
+            return entry
+
+    entry = _load(db, user_id)
+    with _lock:
+        _entries.pop(user_id, None)
+        if entry is not None:
+            _entries[user_id] = entry
+            while len(_entries) > CREDENTIAL_CACHE_MAX_USERS:
+                _entries.popitem(last=False)
+    return entry
+
+
+def _write_back(token_id: int, access_token: str, expiry):
+    try:
+        with session_scope("token_write_back") as db:
+            db.query(OAuthToken).filter(OAuthToken.id == token_id).update(
+                {"access_token": _fernet().encrypt(access_token.encode()), "expiry": expiry},
+                synchronize_session=False
+            )
+            db.commit()
+        logger.info(f"Persisted refreshed access token for token_id={token_id}")
+    except Exception as e:
+        logger.error(f"Failed to persist refreshed token for token_id={token_id}: {str(e)}")
+
+
+def sync_refreshed_token(user_id: int):
+    """Queue a DB write if the user's credentials were refreshed since they were stored"""
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None or not entry.credentials.token or entry.credentials.token == entry.persisted_token:
+            return
+        entry.persisted_token = entry.credentials.token
+        token_id, token, expiry = entry.token_id, entry.credentials.token, entry.credentials.expiry
+    _write_back_executor.submit(_write_back, token_id, token, expiry)
+
+
+def recently_active_users(window_seconds: float) -> list[int]:
+    """Users whose credentials were looked up in this process within the window"""
+    cutoff = time.monotonic() - window_seconds
+    with _lock:
+        for user_id in [u for u, t in _last_used.items() if t < cutoff]:
+            del _last_used[user_id]
+        return list(_last_used)
+
+
+def update_cached_token(user_id: int, token_id: int, access_token: str, expiry):
+    """Swap a token refreshed elsewhere (already persisted) into the cached credentials"""
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None or entry.token_id != token_id:
+            return
+        entry.credentials.token = access_token
+        entry.credentials.expiry = expiry
+        entry.persisted_token = access_token
+
+
+def invalidate_credentials(user_id: int):
+    """Drop a user's cached credentials (revoke, re-authorization)"""
+    with _lock:
+        _entries.pop(user_id, None)
+
+
+def clear_credential_cache():
+    """Drop every cached credential (for testing)"""
+    with _lock:
+        _entries.clear()
+        _last_used.clear()
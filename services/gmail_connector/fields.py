@@ -0,0 +1,49 @@
+"""
+Gmail partial responses
+Every Gmail API call names the fields it reads with the standard `fields`
+parameter, so Google leaves out everything else (payload part trees,
+threadId, internalDate, historyId on each message, ...). Combined with
+gzip this cuts most of the bytes - and JSON parsing - of a large scan.
+Syntax: https://developers.google.com/gmail/api/guides/performance#partial
+
+When code starts reading a new response field, add it to the mask here -
+anything not listed comes back missing.
+"""
+
+FIELD_MASKS = {
+    "messages.list": "messages/id,nextPageToken",
+    "messages.get": "id,labelIds,sizeEstimate,payload/headers(name,value)",
+    "messages.get.details": "id,labelIds,sizeEstimate,snippet,payload/headers(name,value)",
+    "history.list": (
+        "history(messagesAdded/message(id,labelIds),messagesDeleted/message/id,"
+        "labelsAdded(labelIds,message(id,labelIds)),labelsRemoved(labelIds,message(id,labelIds))),"
+        "historyId,nextPageToken"
+    ),
+    "messages.list.estimate": "resultSizeEstimate",
+    "messages.list.frame": "messages/id,nextPageToken,resultSizeEstimate",
+    "users.getProfile": "historyId",
+    "users.getProfile.totals": "messagesTotal,threadsTotal",
+    "labels.get": "id,messagesTotal,messagesUnread,threadsTotal",
+    "labels.list": "labels(id,name)",
+    "labels.create": "id",
+    "messages.batchModify": "",  # empty response body anyway
+}
+
+# Google only gzips responses for clients that say so in both headers
+# (googleapiclient already sends these; the async fetcher uses httpx directly)
+GZIP_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "User-Agent": "deklutter (gzip)",
+}
+
+
+def masked(operation: str, **params) -> dict:
+    """
+    Request parameters for `operation` with its field mask added
+
+        service.users().messages().list(**masked("messages.list", userId="me", q=q))
+    """
+    fields = FIELD_MASKS[operation]
+    if fields:
+        params["fields"] = fields
+    return params
@@ -0,0 +1,260 @@
+"""
+Per-user Gmail message metadata cache
+A message's sender, subject, date and size never change, so scans only
+fetch them once per TTL. Labels do change - cleanups trash and label
+messages, users star and file them. Each user's entries come with a
+history cursor (a mailbox historyId): before serving them, a reader replays
+users.history.list since the cursor and evicts every message deleted or
+relabelled since (stale_message_ids). One history call (2 quota units)
+replaces a messages.get (5 units) per cached message. Without a cursor, or
+when Gmail no longer has that much history, the user's entries are dropped.
+
+Backends (METADATA_CACHE_BACKEND):
+- memory: in-process LRU with TTL (default)
+- redis:  shared across workers, entries expire via SETEX; configure the
+          server with maxmemory-policy allkeys-lru for LRU eviction
+- none:   caching disabled
+
+Entries hold subjects, so they are only ever kept in memory/Redis with a
+TTL - never written to the database (see MailDecisionLog). Redis values
+are encrypted with the APP_SECRET key, like stored OAuth tokens.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.fernet import InvalidToken
+
+logger = logging.getLogger(__name__)
+
+# The classifier's item shape; labels are kept fresh through the history cursor
+CACHED_FIELDS = ("id", "from", "subject", "date", "labels", "size")
+# Extra fields kept when the entry came from a full message (get_item_details)
+DETAIL_FIELDS = ("to", "snippet")
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 100_000
+REDIS_KEY_PREFIX = "deklutter:meta"
+
+# users.history.list record types that make a cached entry stale
+STALE_HISTORY_TYPES = ["messageDeleted", "labelAdded", "labelRemoved"]
+
+
+def _entry(item: dict) -> dict:
+    """The cacheable subset of a metadata item"""
+    return {f: item[f] for f in CACHED_FIELDS + DETAIL_FIELDS if f in item}
+
+
+def stale_message_ids(history: list[dict]) -> set[str]:
+    """IDs of messages deleted or relabelled in users.history.list records"""
+    return {
+        entry["message"]["id"]
+        for record in history
+        for kind in ("messagesDeleted", "labelsAdded", "labelsRemoved")
+        for entry in record.get(kind, [])
+    }
+
+
+class MetadataCache:
+    """
+    Interface: get_many/set_many are keyed by (user_id, message_id);
+    get_history_id/set_history_id hold the user's history cursor
+    """
+
+    def get_many(self, user_id: int, message_ids: list[str]) -> dict[str, dict]:
+        """Return {message_id: metadata} for the IDs that are cached"""
+        return {}
+
+    def set_many(self, user_id: int, items: list[dict]):
+        pass
+
+    def invalidate(self, user_id: int, message_ids: list[str]):
+        """Drop entries for messages that were changed or deleted"""
+        pass
+
+    def invalidate_user(self, user_id: int):
+        pass
+
+    def get_history_id(self, user_id: int) -> str | None:
+        """historyId up to which the user's entries are known to be current"""
+        return None
+
+    def set_history_id(self, user_id: int, history_id: str):
+        pass
+
+
+class InMemoryMetadataCache(MetadataCache):
+    """Process-local LRU; entries expire `ttl` seconds after being written"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[int, str], tuple[float, dict]] = OrderedDict()
+        self._history_ids: dict[int, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, user_id: int, message_ids: list[str]) -> dict[str, dict]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for mid in message_ids:
+                key = (user_id, mid)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, item = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[mid] = item
+        return found
+
+    def set_many(self, user_id: int, items: list[dict]):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for item in items:
+                key = (user_id, item["id"])
+                self._entries[key] = (expires_at, _entry(item))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, message_ids: list[str]):
+        with self._lock:
+            for mid in message_ids:
+                self._entries.pop((user_id, mid), None)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+            self._history_ids.pop(user_id, None)
+
+    def get_history_id(self, user_id: int) -> str | None:
+        with self._lock:
+            expires_at, history_id = self._history_ids.get(user_id, (0.0, None))
+            return history_id if expires_at > time.monotonic() else None
+
+    def set_history_id(self, user_id: int, history_id: str):
+        with self._lock:
+            self._history_ids[user_id] = (time.monotonic() + self.ttl, history_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisMetadataCache(MetadataCache):
+    """Redis-backed cache shared by all workers; one encrypted JSON string per message"""
+
+    def __init__(self, client, ttl: int = DEFAULT_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, user_id: int, message_id: str) -> str:
+        return f"{REDIS_KEY_PREFIX}:{user_id}:{message_id}"
+
+    def _history_key(self, user_id: int) -> str:
+        # "@" never appears in a message ID
+        return f"{REDIS_KEY_PREFIX}:{user_id}:@history"
+
+    @staticmethod
+    def _encode(item: dict) -> bytes:
+        from services.gmail_connector.oauth import _fernet
+        return _fernet().encrypt(json.dumps(_entry(item)).encode())
+
+    @staticmethod
+    def _decode(value: bytes) -> dict | None:
+        from services.gmail_connector.oauth import _fernet
+        try:
+            return json.loads(_fernet().decrypt(value))
+        except InvalidToken:
+            return None  # written under another APP_SECRET
+
+    def get_many(self, user_id: int, message_ids: list[str]) -> dict[str, dict]:
+        if not message_ids:
+            return {}
+        try:
+            values = self.client.mget([self._key(user_id, mid) for mid in message_ids])
+        except Exception as e:
+            # A cache outage should only cost quota, never fail a scan
+            logger.warning(f"Metadata cache read failed: {str(e)}")
+            return {}
+        found = {mid: self._decode(v) for mid, v in zip(message_ids, values) if v is not None}
+        return {mid: item for mid, item in found.items() if item is not None}
+
+    def set_many(self, user_id: int, items: list[dict]):
+        if not items:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for item in items:
+                pipe.setex(self._key(user_id, item["id"]), self.ttl, self._encode(item))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Metadata cache write failed: {str(e)}")
+
+    def invalidate(self, user_id: int, message_ids: list[str]):
+        if not message_ids:
+            return
+        try:
+            self.client.delete(*[self._key(user_id, mid) for mid in message_ids])
+        except Exception as e:
+            logger.warning(f"Metadata cache invalidation failed for user_id={user_id}: {str(e)}")
+
+    def invalidate_user(self, user_id: int):
+        try:
+            keys = list(self.client.scan_iter(match=f"{REDIS_KEY_PREFIX}:{user_id}:*", count=1000))
+            if keys:
+                self.client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Metadata cache invalidation failed for user_id={user_id}: {str(e)}")
+
+    def get_history_id(self, user_id: int) -> str | None:
+        try:
+            value = self.client.get(self._history_key(user_id))
+        except Exception as e:
+            logger.warning(f"Metadata cache read failed: {str(e)}")
+            return None
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set_history_id(self, user_id: int, history_id: str):
+        try:
+            self.client.setex(self._history_key(user_id), self.ttl, history_id)
+        except Exception as e:
+            logger.warning(f"Metadata cache write failed: {str(e)}")
+
+
+_cache: MetadataCache | None = None
+
+
+def _build_cache() -> MetadataCache:
+    backend = os.getenv("METADATA_CACHE_BACKEND", "memory").lower()
+    ttl = int(os.getenv("METADATA_CACHE_TTL", DEFAULT_TTL_SECONDS))
+
+    if backend == "none":
+        return MetadataCache()
+    if backend == "redis":
+        try:
+            import redis
+            client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            client.ping()
+            logger.info("Using Redis metadata cache")
+            return RedisMetadataCache(client, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"Redis metadata cache unavailable ({str(e)}), falling back to in-process cache")
+
+    max_entries = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    return InMemoryMetadataCache(max_entries=max_entries, ttl=ttl)
+
+
+def get_metadata_cache() -> MetadataCache:
+    """Process-wide cache, built from the environment on first use"""
+    global _cache
+    if _cache is None:
+        _cache = _build_cache()
+    return _cache
@@ -1,10 +1,11 @@
 import os
 import base64
 import logging
+from functools import lru_cache
 from datetime import datetime, timedelta
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from services.gmail_connector.client_pool import gmail_client
 from db.models import OAuthToken
 from cryptography.fernet import Fernet
 from services.gateway.deps import CurrentUser
@@ -14,10 +15,15 @@ logger = logging.getLogger(__name__)
 _SCOPES_READONLY = ["https://www.googleapis.com/auth/gmail.readonly"]
 _SCOPES_MODIFY   = ["https://www.googleapis.com/auth/gmail.modify"]
 
-def _fernet():
-    key = base64.urlsafe_b64encode((os.getenv("APP_SECRET","change-me")*2)[:32].encode())
+@lru_cache(maxsize=4)
+def _fernet_for(secret: str) -> Fernet:
+    key = base64.urlsafe_b64encode((secret*2)[:32].encode())
     return Fernet(key)
 
+def _fernet():
+    # Keyed by the secret so a changed APP_SECRET still takes effect
+    return _fernet_for(os.getenv("APP_SECRET","change-me"))
+
 def get_google_auth_url(readonly: bool, state: str | None = None) -> str:
     client_id = os.getenv("GOOGLE_CLIENT_ID")
     client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -74,11 +80,20 @@ def exchange_code_store_tokens(code: str, user: CurrentUser, db, scopes: list[st
         )
         db.add(tok)
         db.commit()
+        # Newer token supersedes whatever credentials were cached
+        from services.gmail_connector.credential_cache import invalidate_credentials
+        invalidate_credentials(user.user_id)
         return True
     except Exception as e:
         logger.error(f"OAuth token exchange failed for user_id={user.user_id}: {str(e)}")
         raise
 
+def get_gmail_credentials(access_token: str, refresh_token: str | None, expiry: datetime | None) -> Credentials:
+    # expiry (naive UTC) lets google-auth tell a stale token apart without a failed call
+    return Credentials(token=access_token, refresh_token=refresh_token, token_uri="https://oauth2.googleapis.com/token", client_id=os.getenv("GOOGLE_CLIENT_ID"), client_secret=os.getenv("GOOGLE_CLIENT_SECRET"), expiry=expiry)
+
+def build_gmail_service(creds: Credentials):
+    return gmail_client(creds)
+
 def get_gmail_service(access_token: str, refresh_token: str | None, expiry: datetime | None):
-    creds = Credentials(token=access_token, refresh_token=refresh_token, token_uri="https://oauth2.googleapis.com/token", client_id=os.getenv("GOOGLE_CLIENT_ID"), client_secret=os.getenv("GOOGLE_CLIENT_SECRET"))
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
\ No newline at end of file
+    return build_gmail_service(get_gmail_credentials(access_token, refresh_token, expiry))
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Gmail search query builder
+Turns scan parameters into the `q` of messages.list so Gmail does the
+filtering - messages a scan would discard are never listed or fetched.
+Search operators: https://support.google.com/mail/answer/7190
+"""
+
+import re
+from dataclasses import dataclass
+
+CATEGORIES = {"primary", "social", "promotions", "updates", "forums", "reservations", "purchases"}
+_SENDER = re.compile(r"^[\w.+-]*@?[\w-]+(\.[\w-]+)+$")
+_LABEL = re.compile(r"^\w[\w&.+-]*$")  # label name as Gmail search spells it
+
+
+@dataclass(frozen=True)
+class ScanFilters:
+    """Optional narrowing of a scan beyond its days_back window"""
+    categories: tuple[str, ...] = ()      # category:promotions, OR-ed together
+    older_than_days: int | None = None    # skip the most recent messages
+    min_size_kb: int | None = None        # larger:
+    exclude_labels: tuple[str, ...] = ()  # -label:
+    senders: tuple[str, ...] = ()         # from:, OR-ed together
+
+    def __post_init__(self):
+        unknown = {c.lower() for c in self.categories} - CATEGORIES
+        if unknown:
+            raise ValueError(f"Unknown Gmail categories: {sorted(unknown)}. Available: {sorted(CATEGORIES)}")
+        for name, value in (("older_than_days", self.older_than_days), ("min_size_kb", self.min_size_kb)):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive")
+        for sender in self.senders:
+            # an address or a domain - anything else could smuggle extra search operators in
+            if not _SENDER.match(sender.strip()):
+                raise ValueError(f"Invalid sender {sender!r}: use an email address or a domain")
+        for label in self.exclude_labels:
+            _label_term(label)
+
+    @classmethod
+    def from_dict(cls, filters: dict | None) -> "ScanFilters":
+        """Build from a connector `filters` dict; unrelated keys are ignored"""
+        filters = filters or {}
+        return cls(
+            categories=tuple(filters.get("categories") or ()),
+            older_than_days=filters.get("older_than_days"),
+            min_size_kb=filters.get("min_size_kb"),
+            exclude_labels=tuple(filters.get("exclude_labels") or ()),
+            senders=tuple(filters.get("senders") or ()),
+        )
+
+    @property
+    def targeted(self) -> bool:
+        """True when anything beyond the date window is filtered"""
+        return bool(self.categories or self.older_than_days or self.min_size_kb or self.exclude_labels or self.senders)
+
+
+def _label_term(label: str) -> str:
+    # Gmail search spells spaces and nesting slashes in label names as dashes
+    term = re.sub(r"[\s/]+", "-", label.strip().lower())
+    if not term:
+        raise ValueError("Empty label name")
+    # quotes, braces, parentheses or colons would change the search itself
+    if not _LABEL.match(term):
+        raise ValueError(f"Invalid label {label!r}: use letters, digits, spaces and - _ . & + /")
+    return term
+
+
+def _any_of(terms: list[str]) -> list[str]:
+    # Gmail ORs the terms inside braces
+    if len(terms) > 1:
+        return ["{" + " ".join(terms) + "}"]
+    return terms
+
+
+def build_query(days_back: int | None = None, filters: ScanFilters | None = None) -> str:
+    """Gmail `q` for a scan, e.g. 'newer_than:30d category:promotions larger:1048576 -label:receipts'"""
+    terms = []
+    if days_back:
+        terms.append(f"newer_than:{days_back}d")
+    if filters:
+        terms.extend(_any_of([f"from:{s.strip().lower().lstrip('@')}" for s in filters.senders]))
+        if filters.older_than_days:
+            terms.append(f"older_than:{filters.older_than_days}d")
+        terms.extend(_any_of([f"category:{c.lower()}" for c in filters.categories]))
+        if filters.min_size_kb:
+            terms.append(f"larger:{filters.min_size_kb * 1024}")
+        terms.extend(f"-label:{_label_term(label)}" for label in filters.exclude_labels)
+    return " ".join(terms)
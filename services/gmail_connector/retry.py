@@ -0,0 +1,71 @@
+"""
+Retry with exponential backoff for synchronous Gmail API calls
+"""
+
+import logging
+import time
+from googleapiclient.errors import HttpError
+from services.gmail_connector.circuit_breaker import get_circuit_breaker, CircuitBreakerOpenError
+from services.connectors.provider_config import get_provider_config
+
+logger = logging.getLogger(__name__)
+
+# Load Gmail-specific configuration
+GMAIL_CONFIG = get_provider_config("gmail")
+
+# Get circuit breaker for Gmail API
+gmail_circuit_breaker = get_circuit_breaker(
+    "gmail_api",
+    failure_threshold=GMAIL_CONFIG.circuit_breaker_failure_threshold,
+    timeout=GMAIL_CONFIG.circuit_breaker_timeout,
+    success_threshold=GMAIL_CONFIG.circuit_breaker_success_threshold
+)
+
+MAX_RETRIES = GMAIL_CONFIG.max_retries
+RETRY_DELAY = GMAIL_CONFIG.retry_delay
+RETRY_STATUS_CODES = GMAIL_CONFIG.retry_on_status_codes
+
+def retry_with_backoff(func, max_retries=MAX_RETRIES, operation_name="API call", use_circuit_breaker=True):
+    """
+    Retry a function with exponential backoff for transient failures
+    Integrates with circuit breaker pattern
+    """
+    for attempt in range(max_retries):
+        try:
+            # Wrap with circuit breaker if enabled
+            if use_circuit_breaker:
+                return gmail_circuit_breaker.call(func)
+            else:
+                return func()
+                
+        except CircuitBreakerOpenError as e:
+            # Circuit breaker is open, don't retry
+            logger.error(f"{operation_name}: Circuit breaker is OPEN, aborting")
+            raise
+            
+        except HttpError as e:
+            status_code = e.resp.status
+            
+            # Retry on transient errors (configured per provider)
+            if status_code in RETRY_STATUS_CODES and attempt < max_retries - 1:
+                wait_time = RETRY_DELAY * (2 ** attempt)  # Exponential backoff
+                logger.warning(f"{operation_name} failed with {status_code}, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})")
+                time.sleep(wait_time)
+                continue
+            
+            # Don't retry on client errors (400, 401, 403, 404)
+            logger.error(f"{operation_name} failed with status {status_code}: {str(e)}")
+            raise
+            
+        except Exception as e:
+            # Retry on network errors
+            if attempt < max_retries - 1:
+                wait_time = RETRY_DELAY * (2 ** attempt)
+                logger.warning(f"{operation_name} failed with {type(e).__name__}: {str(e)}, retrying in {wait_time}s")
+                time.sleep(wait_time)
+                continue
+            
+            logger.error(f"{operation_name} failed after {max_retries} attempts: {str(e)}")
+            raise
+    
+    raise Exception(f"{operation_name} failed after {max_retries} retries")
@@ -0,0 +1,215 @@
+"""
+Sampling scans
+A regular scan classifies the newest MAX_EMAILS_PER_SCAN messages, which
+says little about a 200k-message mailbox. A sampling scan splits the
+mailbox into strata - date bands x Gmail categories - classifies a
+stratified random sample of fixed size and extrapolates decision counts
+and sizes to the whole mailbox, with confidence intervals (stratified
+estimator, normal approximation).
+
+API budget: one messages.list per stratum (its sampling frame and size)
+plus one messages.get per sampled message, whatever the mailbox size.
+
+A stratum's frame is its newest FRAME_PAGE_SIZE messages. A sample drawn
+from a stratum larger than that would only see its most recent part, so
+such strata are split in two date bands and listed again until every frame
+is complete, within MAX_FRAME_SPLITS extra list calls. Whatever is still
+incomplete after that (a single day of more mail than a frame holds, or
+the budget ran out) makes the estimate `biased`; `frame_coverage` says how
+much of the mailbox the frames covered.
+"""
+
+import asyncio
+import math
+import random
+import statistics
+from dataclasses import dataclass, field, replace
+
+from services.classifier.policy import classify_bulk
+from services.gmail_connector.query import ScanFilters, build_query
+
+# (newer than, older than) in days; None is open-ended
+DATE_BANDS = [(0, 7), (7, 30), (30, 90), (90, 180), (180, 365), (365, 730), (730, 1825), (1825, 3650), (3650, None)]
+STRATA_CATEGORIES = ("primary", "social", "promotions", "updates", "forums")
+DECISIONS = ("delete", "review", "keep")
+MIN_PER_STRATUM = 2  # a stratum's variance needs two sampled messages
+MAX_FRAME_SPLITS = 64  # extra messages.list calls spent on splitting incomplete frames
+
+
+@dataclass
+class Stratum:
+    query: str
+    population: int = 0                                # Gmail's estimate, exact when the frame is complete
+    frame: list[str] = field(default_factory=list)     # message IDs the sample is drawn from
+    sample: list[str] = field(default_factory=list)
+    items: list[dict] = field(default_factory=list)    # classified sample (classify_bulk items)
+    # Date band in days (None is open-ended) and the other filters, for splitting
+    start: int = 0
+    end: int | None = None
+    filters: ScanFilters | None = None
+
+
+def _stratum(start: int, end: int | None, filters: ScanFilters) -> Stratum:
+    query = build_query(end, replace(filters, older_than_days=start or None))
+    return Stratum(query, start=start, end=end, filters=filters)
+
+
+def split_stratum(stratum: Stratum) -> list[Stratum] | None:
+    """The stratum's date band cut in two, None when it is a single day wide"""
+    if stratum.filters is None:
+        return None
+    if stratum.end is None:
+        middle = max(2 * stratum.start, stratum.start + 1)
+    elif stratum.end - stratum.start < 2:
+        return None
+    else:
+        middle = (stratum.start + stratum.end) // 2
+    return [_stratum(stratum.start, middle, stratum.filters), _stratum(middle, stratum.end, stratum.filters)]
+
+
+def build_strata(days_back: int | None, filters: ScanFilters | None = None) -> list[Stratum]:
+    """
+    One stratum per date band and category, within `days_back` (0 or None
+    for the whole mailbox). Category filters replace the default
+    categories; other filters apply to every stratum.
+    """
+    filters = filters or ScanFilters()
+    categories = filters.categories or STRATA_CATEGORIES
+    strata = []
+    for start, end in DATE_BANDS:
+        if days_back:
+            if start >= days_back:
+                break
+            end = days_back if end is None else min(end, days_back)
+        if filters.older_than_days:
+            if end is not None and end <= filters.older_than_days:
+                continue
+            start = max(start, filters.older_than_days)
+        for category in categories:
+            strata.append(_stratum(start, end, replace(filters, categories=(category,))))
+    return strata
+
+
+def allocate(populations: list[int], frame_sizes: list[int], sample_size: int) -> list[int]:
+    """
+    Split `sample_size` across strata in proportion to their populations,
+    at least MIN_PER_STRATUM per non-empty stratum and never more than its frame.
+    The allocations never add up to more than `sample_size`; a budget too
+    small for the minimums raises ValueError.
+    """
+    total = sum(populations)
+    if not total:
+        return [0] * len(populations)
+    nonempty = sum(1 for n in populations if n)
+    if sample_size < MIN_PER_STRATUM * nonempty:
+        raise ValueError(f"A sample of {sample_size} cannot cover {nonempty} strata - use at least {MIN_PER_STRATUM * nonempty}")
+    alloc = [
+        min(frame, max(MIN_PER_STRATUM, round(sample_size * n / total))) if n else 0
+        for n, frame in zip(populations, frame_sizes)
+    ]
+    # The minimums can push the total over budget - take it back from the largest allocations
+    while sum(alloc) > sample_size:
+        i = max(range(len(alloc)), key=alloc.__getitem__)
+        if alloc[i] <= MIN_PER_STRATUM:
+            break
+        alloc[i] -= 1
+    return alloc
+
+
+async def list_frames(fetcher, strata: list[Stratum], max_strata: int | None = None) -> list[Stratum]:
+    """
+    List every stratum's frame, splitting strata whose frame is incomplete
+    until it is complete, MAX_FRAME_SPLITS extra list calls were spent or
+    there are `max_strata` strata. Returns the final strata with frame and
+    population filled in.
+    """
+    max_strata = max_strata or math.inf
+    listed, pending, splits, count = [], strata, 0, len(strata)
+    while pending:
+        frames = await asyncio.gather(*(fetcher.list_frame(s.query) for s in pending))
+        next_round = []
+        for stratum, (ids, population, complete) in zip(pending, frames):
+            stratum.frame, stratum.population = ids, population
+            can_split = splits + 2 <= MAX_FRAME_SPLITS and count < max_strata
+            halves = None if complete or not can_split else split_stratum(stratum)
+            if halves:
+                splits += 2
+                count += 1
+                next_round.extend(halves)
+            else:
+                listed.append(stratum)
+        pending = next_round
+    return listed
+
+
+async def sample_mailbox(fetcher, strata: list[Stratum], sample_size: int, rng: random.Random | None = None):
+    """
+    List the strata's frames (see list_frames), draw the sample and fetch and
+    classify it. Returns (strata, msgs_meta) with the final strata filled in.
+    """
+    rng = rng or random.Random()
+    # Every stratum must be able to get its MIN_PER_STRATUM share of the sample
+    strata = await list_frames(fetcher, strata, max(sample_size // MIN_PER_STRATUM, len(strata)))
+
+    sizes = allocate([s.population for s in strata], [len(s.frame) for s in strata], sample_size)
+    for stratum, n in zip(strata, sizes):
+        stratum.sample = rng.sample(stratum.frame, n)
+
+    owner = {mid: s for s in strata for mid in s.sample}
+    msgs_meta = []
+    async for batch in fetcher.iter_ids(list(owner)):
+        msgs_meta.extend(batch)
+        for item in classify_bulk(batch)["items"]:
+            owner[item["id"]].items.append(item)
+    return strata, msgs_meta
+
+
+def _stratified_total(strata: list[Stratum], value) -> tuple[float, float]:
+    """Estimated mailbox-wide sum of value(item) and the variance of that estimate"""
+    total = variance = 0.0
+    for stratum in strata:
+        n = len(stratum.items)
+        if not n:
+            continue
+        values = [value(item) for item in stratum.items]
+        total += stratum.population * statistics.fmean(values)
+        if n >= 2 and stratum.population > n:
+            # finite population correction: a fully sampled stratum has no error
+            variance += stratum.population ** 2 * (1 - n / stratum.population) * statistics.variance(values) / n
+    return total, variance
+
+
+def _interval(total: float, variance: float, z: float, scale: float = 1, digits: int | None = None) -> dict:
+    half_width = z * math.sqrt(variance)
+    low, high = max(0.0, total - half_width), total + half_width
+    return {
+        "estimate": round(total / scale, digits),
+        "low": round(low / scale, digits),
+        "high": round(high / scale, digits),
+    }
+
+
+def estimate(strata: list[Stratum], confidence: float = 0.95) -> dict:
+    """Extrapolated counts and sizes with `confidence` intervals, shaped like a scan summary"""
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    population = sum(s.population for s in strata)
+    framed = sum(len(s.frame) for s in strata)
+
+    counts = {
+        decision: _interval(*_stratified_total(strata, lambda it, d=decision: it["decision"] == d), z)
+        for decision in DECISIONS
+    }
+    delete_bytes = _stratified_total(strata, lambda it: it["size"] if it["decision"] == "delete" else 0)
+    coverage = round(framed / population, 3) if population else 1.0
+    return {
+        "total_items": population,
+        "sampled": sum(len(s.items) for s in strata),
+        "counts": counts,
+        "approx_size_mb": _interval(*_stratified_total(strata, lambda it: it["size"]), z, 1_000_000, 2),
+        "delete_size_mb": _interval(*delete_bytes, z, 1_000_000, 2),
+        "confidence": confidence,
+        "frame_coverage": coverage,
+        # Some strata were sampled from their newest messages only: the
+        # intervals do not account for that skew
+        "biased": coverage < 1,
+    }
@@ -0,0 +1,76 @@
+"""
+Incremental scan state (Gmail historyId sync)
+A full scan records the mailbox historyId; later scans only fetch what
+users.history.list reports as added or relabelled since then and reuse the
+persisted decisions for everything else
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from db.models import GmailSyncState, MailDecisionLog
+
+logger = logging.getLogger(__name__)
+
+
+def get_sync_state(db: Session, oauth_token_id: int) -> GmailSyncState | None:
+    return db.query(GmailSyncState).filter(GmailSyncState.oauth_token_id == oauth_token_id).first()
+
+
+def save_sync_state(db: Session, user_id: int, oauth_token_id: int, history_id: str, full_scan_at: datetime | None = None, query: str = ""):
+    """Upsert the historyId for a token; full_scan_at and query are only moved by full scans"""
+    state = get_sync_state(db, oauth_token_id)
+    if state is None:
+        state = GmailSyncState(user_id=user_id, oauth_token_id=oauth_token_id)
+        db.add(state)
+    state.history_id = history_id
+    if full_scan_at is not None:
+        state.full_scan_at = full_scan_at
+        state.query = query
+    db.commit()
+
+
+def delete_sync_states(db: Session, user_id: int) -> int:
+    """Forget sync state for a user (revoke / reset) - does not commit"""
+    return db.query(GmailSyncState).filter(GmailSyncState.user_id == user_id).delete()
+
+
+def load_previous_decisions(db: Session, user_id: int, since: datetime | None,
+                            newer_than: datetime | None = None, limit: int | None = None) -> list[dict]:
+    """
+    Latest unapplied decision per message persisted since the last full scan,
+    newest first, at most `limit`. With newer_than, messages dated before it
+    have left the scan window and are skipped (undated rows are kept).
+
+    Items have the classify_bulk item shape minus subject (never persisted).
+    """
+    latest = db.query(func.max(MailDecisionLog.id)).filter(MailDecisionLog.user_id == user_id)
+    if since is not None:
+        latest = latest.filter(MailDecisionLog.created_at >= since)
+    latest = latest.group_by(MailDecisionLog.message_id)
+
+    rows = db.query(
+        MailDecisionLog.message_id,
+        MailDecisionLog.sender_hash,
+        MailDecisionLog.size_bytes,
+        MailDecisionLog.proposed,
+        MailDecisionLog.confidence,
+    ).filter(
+        MailDecisionLog.id.in_(latest),
+        MailDecisionLog.applied == False,  # noqa: E712
+    )
+    if newer_than is not None:
+        rows = rows.filter(or_(MailDecisionLog.internal_date >= newer_than, MailDecisionLog.internal_date.is_(None)))
+    rows = rows.order_by(MailDecisionLog.id.desc()).limit(limit).all()
+
+    return [
+        {
+            "id": r.message_id,
+            "sender_hash": r.sender_hash,
+            "size": r.size_bytes or 0,
+            "decision": r.proposed,
+            "confidence": (r.confidence or 0) / 100,
+        }
+        for r in rows
+    ]
@@ -0,0 +1,220 @@
+"""
+Background Gmail access token refresh
+Refreshes tokens shortly before OAuthToken.expiry so user-facing scans
+never wait on Google's token endpoint. Only users active in this process
+recently are kept warm - refreshing every stored token hourly would burn
+refresh calls on people who no longer use the app. Every worker process
+runs its own refresher for its own active users; advisory locks keep two
+of them from refreshing the same token (PostgreSQL).
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from db.models import OAuthToken
+from db.session import engine, session_scope
+from services.gmail_connector.oauth import _fernet, get_gmail_credentials
+from services.gmail_connector.credential_cache import recently_active_users, update_cached_token
+
+logger = logging.getLogger(__name__)
+
+REFRESH_AHEAD = timedelta(seconds=int(os.getenv("TOKEN_REFRESH_AHEAD", 600)))
+REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", 60))  # seconds between passes
+REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", 50))
+REFRESH_WORKERS = 4  # token endpoint calls in flight at once
+ACTIVE_WINDOW = int(os.getenv("TOKEN_REFRESH_ACTIVE_WINDOW", 24 * 3600))  # seconds
+# A token whose refresh failed is retried after REFRESH_INTERVAL, doubling per
+# consecutive failure up to this - a revoked grant must not be hit every pass
+MAX_FAILURE_BACKOFF = timedelta(seconds=int(os.getenv("TOKEN_REFRESH_MAX_BACKOFF", 6 * 3600)))
+# First key of the PostgreSQL advisory locks claiming a token (second key: token id)
+ADVISORY_LOCK_NAMESPACE = 0x746F6B  # "tok"
+
+# token id -> (consecutive failures, earliest next attempt)
+_failures: dict[int, tuple[int, datetime]] = {}
+_failures_lock = threading.Lock()
+
+
+def _backing_off(now: datetime) -> set[int]:
+    with _failures_lock:
+        return {token_id for token_id, (_, retry_at) in _failures.items() if retry_at > now}
+
+
+def _record_failure(token_id: int, now: datetime) -> timedelta:
+    """Push the token's next attempt back; returns the delay"""
+    with _failures_lock:
+        count = _failures.get(token_id, (0, now))[0] + 1
+        delay = min(timedelta(seconds=REFRESH_INTERVAL) * 2 ** (count - 1), MAX_FAILURE_BACKOFF)
+        _failures[token_id] = (count, now + delay)
+    return delay
+
+
+def _record_success(token_id: int):
+    with _failures_lock:
+        _failures.pop(token_id, None)
+
+
+def _refresh_one(tok):
+    """Call Google's token endpoint; returns (access_token, expiry)"""
+    f = _fernet()
+    creds = get_gmail_credentials(None, f.decrypt(tok.refresh_token).decode(), None)
+    creds.refresh(GoogleAuthRequest())
+    return creds.token, creds.expiry
+
+
+def _load_expiring(db: Session, user_ids: list[int], now: datetime, skip: set[int]) -> list:
+    """Each user's newest Google token if it expires within REFRESH_AHEAD, soonest first, as plain rows"""
+    newest = db.query(func.max(OAuthToken.id)).filter(
+        OAuthToken.provider == "google",
+        OAuthToken.user_id.in_(user_ids)
+    ).group_by(OAuthToken.user_id)
+
+    query = db.query(OAuthToken.id, OAuthToken.user_id, OAuthToken.refresh_token, OAuthToken.expiry).filter(
+        OAuthToken.id.in_(newest),
+        OAuthToken.expiry < now + REFRESH_AHEAD,
+        OAuthToken.refresh_token != b""
+    )
+    if skip:
+        query = query.filter(OAuthToken.id.notin_(skip))
+    return query.order_by(OAuthToken.expiry).limit(REFRESH_BATCH_SIZE).all()
+
+
+@contextmanager
+def _claimed(tokens: list):
+    """
+    The tokens no other worker is refreshing right now
+    
+    On PostgreSQL each token is claimed with a session-level advisory lock,
+    held on a connection of its own that stays idle (no open transaction)
+    until the tokens are written back. Elsewhere there is a single worker.
+    """
+    if engine.dialect.name != "postgresql" or not tokens:
+        yield tokens
+        return
+    with engine.connect() as conn:
+        claimed = [
+            tok for tok in tokens
+            if conn.execute(text("SELECT pg_try_advisory_lock(:ns, :id)"),
+                            {"ns": ADVISORY_LOCK_NAMESPACE, "id": tok.id}).scalar()
+        ]
+        conn.commit()
+        try:
+            yield claimed
+        finally:
+            for tok in claimed:
+                conn.execute(text("SELECT pg_advisory_unlock(:ns, :id)"), {"ns": ADVISORY_LOCK_NAMESPACE, "id": tok.id})
+            conn.commit()
+
+
+def refresh_expiring_tokens(user_ids: list[int], now: datetime | None = None,
+                            attempted: set[int] | None = None) -> int:
+    """
+    Refresh up to REFRESH_BATCH_SIZE Google tokens of `user_ids` expiring
+    within REFRESH_AHEAD (soonest first, newest token per user) and persist
+    them. Returns the count.
+    Token IDs in `attempted` are skipped; the IDs tried here are added to it.
+    Tokens whose last refresh failed are skipped until their backoff ends.
+    
+    No database session is open while Google's token endpoint is called:
+    tokens are loaded in one short session and written back in another.
+    """
+    if not user_ids:
+        return 0
+    now = now or datetime.utcnow()
+
+    with session_scope("token_refresher") as db:
+        tokens = _load_expiring(db, user_ids, now, (attempted or set()) | _backing_off(now))
+    if attempted is not None:
+        attempted.update(tok.id for tok in tokens)
+    if not tokens:
+        return 0
+
+    with _claimed(tokens) as claimed:
+        with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+            futures = [(tok, pool.submit(_refresh_one, tok)) for tok in claimed]
+
+        results = []
+        for tok, future in futures:
+            try:
+                access_token, expiry = future.result()
+            except Exception as e:
+                # Usually a revoked grant - the next user request surfaces it
+                delay = _record_failure(tok.id, now)
+                logger.warning(f"Proactive refresh failed for token_id={tok.id}, next try in {delay}: {str(e)}")
+                continue
+            _record_success(tok.id)
+            results.append((tok, access_token, expiry))
+
+        refreshed = []
+        if results:
+            f = _fernet()
+            with session_scope("token_refresher") as db:
+                for tok, access_token, expiry in results:
+                    # A request-path refresh may have written a newer token meanwhile
+                    written = db.query(OAuthToken).filter(
+                        OAuthToken.id == tok.id, OAuthToken.expiry == tok.expiry
+                    ).update({"access_token": f.encrypt(access_token.encode()), "expiry": expiry},
+                             synchronize_session=False)
+                    if written:
+                        refreshed.append((tok.user_id, tok.id, access_token, expiry))
+                db.commit()
+
+    for user_id, token_id, access_token, expiry in refreshed:
+        update_cached_token(user_id, token_id, access_token, expiry)
+
+    logger.info(f"Proactively refreshed {len(refreshed)}/{len(tokens)} Gmail tokens")
+    return len(refreshed)
+
+
+class TokenRefreshScheduler:
+    """Daemon thread running refresh_expiring_tokens every REFRESH_INTERVAL seconds"""
+
+    def __init__(self, interval: int = REFRESH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+        self._thread.start()
+        logger.info(f"Token refresh scheduler started (every {self.interval}s, {REFRESH_AHEAD} ahead)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def run_once(self) -> int:
+        try:
+            # Keep going while whole batches come back expiring. Each token is
+            # tried once per pass, even if it is still expiring afterwards
+            # (failed refresh, or Google returned a short-lived token).
+            user_ids = recently_active_users(ACTIVE_WINDOW)
+            attempted: set[int] = set()
+            total = 0
+            while not self._stop.is_set():
+                before = len(attempted)
+                total += refresh_expiring_tokens(user_ids, attempted=attempted)
+                if len(attempted) - before < REFRESH_BATCH_SIZE:
+                    break
+            return total
+        except Exception as e:
+            logger.error(f"Token refresh pass failed: {str(e)}")
+            return 0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+token_refresh_scheduler = TokenRefreshScheduler()
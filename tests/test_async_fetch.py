@@ -0,0 +1,324 @@
+"""
+Tests for the asynchronous Gmail fetcher against a mocked Gmail (httpx.MockTransport)
+"""
+
+import asyncio
+import json
+import re
+from contextlib import aclosing
+from dataclasses import replace
+
+import httpx
+import pytest
+
+from services.gmail_connector import async_fetch
+from services.gmail_connector.async_fetch import (
+    GMAIL_CONFIG, AsyncGmailFetcher, GmailFetchError, GmailListError, QuotaLimiter, quota_limiter_for
+)
+from services.gmail_connector.circuit_breaker import reset_all_circuit_breakers
+
+CONFIG = replace(GMAIL_CONFIG, retry_delay=0, quota_burst_units=10**9)
+REQUESTED_ID = re.compile(r"GET /gmail/v1/users/me/messages/(\w+)\?")
+
+
+class FakeCredentials:
+    """Stands in for google Credentials: each refresh issues a new token"""
+
+    def __init__(self):
+        self.token = "token-0"
+        self.valid = True
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+
+
+def _message(mid):
+    return {
+        "id": mid, "labelIds": ["INBOX"], "sizeEstimate": 42,
+        "payload": {"headers": [{"name": "From", "value": f"{mid}@shop.com"}, {"name": "Subject", "value": "Hi"}]},
+    }
+
+
+def batch_response(parts: list[tuple[int, dict]]) -> httpx.Response:
+    """multipart/mixed batch response with one (status, body) part per request"""
+    boundary = "batch_response"
+    body = "".join(
+        f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{i}>\r\n\r\n"
+        f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+        for i, (status, payload) in enumerate(parts)
+    ) + f"--{boundary}--"
+    return httpx.Response(200, headers={"content-type": f"multipart/mixed; boundary={boundary}"}, text=body)
+
+
+def requested_ids(request: httpx.Request) -> list[str]:
+    return REQUESTED_ID.findall(request.content.decode())
+
+
+@pytest.fixture(autouse=True)
+def closed_breaker():
+    """Failures in one test must not leave the shared breaker open for the next"""
+    reset_all_circuit_breakers()
+    yield
+    reset_all_circuit_breakers()
+
+
+def run(handler, coro_fn, credentials=None, user_id=None):
+    """Run coro_fn(fetcher) with a fetcher whose HTTP goes to `handler`"""
+    async def main():
+        fetcher = AsyncGmailFetcher(credentials or FakeCredentials(), config=CONFIG, user_id=user_id,
+                                    transport=httpx.MockTransport(handler))
+        async with fetcher:
+            return await coro_fn(fetcher)
+    return asyncio.run(main())
+
+
+class TestBatchRequests:
+    """Test the multipart batch round trip"""
+
+    def test_batch_is_built_and_parsed(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return batch_response([(200, _message(mid)) for mid in requested_ids(request)])
+
+        items = run(handler, lambda f: f._fetch_batch(1, ["a1", "b2"]))
+
+        assert requested_ids(seen[0]) == ["a1", "b2"]
+        assert seen[0].headers["authorization"] == "Bearer token-0"
+        assert "fields=" in seen[0].content.decode()
+        assert items == [
+            {"id": "a1", "from": "a1@shop.com", "subject": "Hi", "date": "", "labels": ["INBOX"], "size": 42},
+            {"id": "b2", "from": "b2@shop.com", "subject": "Hi", "date": "", "labels": ["INBOX"], "size": 42},
+        ]
+
+    def test_throttled_parts_are_resent_alone(self):
+        sent = []
+
+        def handler(request):
+            ids = requested_ids(request)
+            sent.append(ids)
+            if len(sent) == 1:
+                return batch_response([(429, {}) if mid == "b2" else (200, _message(mid)) for mid in ids])
+            return batch_response([(200, _message(mid)) for mid in ids])
+
+        items = run(handler, lambda f: f._fetch_batch(1, ["a1", "b2", "c3"]))
+
+        assert sent == [["a1", "b2", "c3"], ["b2"]]
+        assert sorted(i["id"] for i in items) == ["a1", "b2", "c3"]
+
+    def test_missing_message_is_skipped(self):
+        def handler(request):
+            return batch_response([(404, {}) if mid == "gone" else (200, _message(mid)) for mid in requested_ids(request)])
+
+        items = run(handler, lambda f: f._fetch_batch(1, ["a1", "gone"]))
+        assert [i["id"] for i in items] == ["a1"]
+
+
+class TestReauth:
+    """Test token refresh on 401"""
+
+    def test_expired_token_is_refreshed_and_resent(self):
+        credentials = FakeCredentials()
+
+        def handler(request):
+            if request.headers["authorization"] == "Bearer token-0":
+                return httpx.Response(401)
+            return batch_response([(200, _message(mid)) for mid in requested_ids(request)])
+
+        items = run(handler, lambda f: f._fetch_batch(1, ["a1"]), credentials)
+        assert credentials.refreshes == 1
+        assert [i["id"] for i in items] == ["a1"]
+
+    def test_concurrent_401s_refresh_once(self):
+        credentials = FakeCredentials()
+        arrived = []
+
+        async def handler(request):
+            if request.headers["authorization"] == "Bearer token-0":
+                # Hold every stale request until all batches were rejected together
+                arrived.append(request)
+                while len(arrived) < 3:
+                    await asyncio.sleep(0)
+                return httpx.Response(401)
+            return batch_response([(200, _message(mid)) for mid in requested_ids(request)])
+
+        async def fetch_three(fetcher):
+            return await asyncio.gather(*(fetcher._fetch_batch(i, [f"m{i}"]) for i in range(3)))
+
+        batches = run(handler, fetch_three, credentials)
+        assert credentials.refreshes == 1
+        assert [b[0]["id"] for b in batches] == ["m0", "m1", "m2"]
+
+
+class TestFailedBatches:
+    """Test aborting a scan once too many batches failed"""
+
+    def test_too_many_failed_batches_abort(self):
+        def handler(request):
+            return httpx.Response(400)  # not retryable
+
+        async def fetch_all(fetcher):
+            ids = [f"m{i}" for i in range(async_fetch.MAX_FAILED_BATCHES + 2)]
+            fetcher.batch_size = 1
+            return [batch async for batch in fetcher.iter_ids(ids)]
+
+        with pytest.raises(GmailFetchError, match="Too many batch failures"):
+            run(handler, fetch_all)
+
+    def test_a_few_failed_batches_are_tolerated(self):
+        def handler(request):
+            ids = requested_ids(request)
+            if ids == ["m0"]:
+                return httpx.Response(400)
+            return batch_response([(200, _message(mid)) for mid in ids])
+
+        async def fetch_all(fetcher):
+            fetcher.batch_size = 1
+            return [batch async for batch in fetcher.iter_ids(["m0", "m1", "m2"])]
+
+        batches = run(handler, fetch_all)
+        assert sorted(b[0]["id"] for b in batches) == ["m1", "m2"]
+
+
+def mailbox(pages: list[list[str]], fetch):
+    """
+    Handler serving messages.list from `pages` (one page per pageToken) and
+    batches through `fetch(mid)`, an async callable returning a (status, body) part
+    """
+    async def handler(request):
+        if request.method == "GET":
+            page = int(request.url.params.get("pageToken", 0))
+            if isinstance(pages[page], int):
+                return httpx.Response(pages[page])
+            resp = {"messages": [{"id": mid} for mid in pages[page]]}
+            if page + 1 < len(pages):
+                resp["nextPageToken"] = str(page + 1)
+            return httpx.Response(200, json=resp)
+        return batch_response([await fetch(mid) for mid in requested_ids(request)])
+    return handler
+
+
+async def found(mid):
+    return 200, _message(mid)
+
+
+class TestScanPipeline:
+    """Test iter_scan / iter_metadata: listing and fetching overlap"""
+
+    def test_batches_arrive_in_completion_order(self):
+        async def fetch(mid):
+            if mid == "m0":
+                await asyncio.sleep(0.05)  # first listed, last fetched
+            return await found(mid)
+
+        async def scan(fetcher):
+            fetcher.batch_size = 1
+            batches = [batch async for batch in fetcher.iter_scan(10)]
+            return [b[0]["id"] for b in batches], fetcher.listed_ids
+
+        fetched, listed = run(mailbox([["m0", "m1"], ["m2"]], fetch), scan)
+        assert fetched[-1] == "m0"
+        assert sorted(fetched) == ["m0", "m1", "m2"]
+        assert listed == ["m0", "m1", "m2"]
+
+    def test_listing_stops_at_the_limit(self):
+        async def scan(fetcher):
+            return [batch async for batch in fetcher.iter_scan(2)], fetcher.listed_ids
+
+        batches, listed = run(mailbox([["m0", "m1"], ["m2"]], found), scan)
+        assert listed == ["m0", "m1"]
+        assert sum(len(b) for b in batches) == 2
+
+    def test_list_error_propagates(self):
+        async def scan(fetcher):
+            async for _ in fetcher.iter_scan(10):
+                pass
+
+        with pytest.raises(GmailListError):
+            run(mailbox([["m0"], 400], found), scan)
+
+    def test_early_exit_cancels_outstanding_batches(self):
+        started, cancelled = [], []
+
+        async def fetch(mid):
+            if mid == "m0":
+                while len(started) < 2:  # answer once the other batches are in flight
+                    await asyncio.sleep(0)
+                return await found(mid)
+            started.append(mid)
+            try:
+                await asyncio.Event().wait()  # never answers
+            except asyncio.CancelledError:
+                cancelled.append(mid)
+                raise
+
+        async def scan(fetcher):
+            fetcher.batch_size = 1
+            async with aclosing(fetcher.iter_scan(10)) as batches:
+                async for batch in batches:
+                    break
+            await asyncio.sleep(0)  # let the cancellations land
+            return batch, sorted(cancelled)
+
+        batch, cancelled_ids = run(mailbox([["m0", "m1", "m2"]], fetch), scan)
+        assert batch[0]["id"] == "m0"
+        assert cancelled_ids == ["m1", "m2"]
+
+    def test_cancelled_consumer_cancels_outstanding_batches(self):
+        in_flight = asyncio.Event()
+        cancelled = []
+
+        async def fetch(mid):
+            in_flight.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(mid)
+                raise
+
+        async def scan(fetcher):
+            async def consume():
+                async for _ in fetcher.iter_scan(10):
+                    pass
+
+            task = asyncio.create_task(consume())
+            await in_flight.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0)
+            return cancelled
+
+        assert run(mailbox([["m0"]], fetch), scan) == ["m0"]
+
+
+class TestQuotaLimiter:
+    """Test the per-user quota budget"""
+
+    def test_debt_delays_the_next_caller(self, monkeypatch):
+        slept = []
+
+        async def fake_sleep(seconds):
+            slept.append(seconds)
+
+        monkeypatch.setattr(async_fetch.asyncio, "sleep", fake_sleep)
+        monkeypatch.setattr(async_fetch.time, "monotonic", lambda: 1000.0)
+        limiter = QuotaLimiter(rate=100, burst=100)
+
+        async def spend():
+            await limiter.acquire(300)  # within burst: no wait, 200 in debt
+            await limiter.acquire(5)
+
+        asyncio.run(spend())
+        assert slept == [2.0]
+
+    def test_one_limiter_per_user(self):
+        a = AsyncGmailFetcher(FakeCredentials(), user_id=31)
+        b = AsyncGmailFetcher(FakeCredentials(), user_id=31)
+        other = AsyncGmailFetcher(FakeCredentials(), user_id=32)
+        assert a._quota is b._quota is quota_limiter_for(31)
+        assert other._quota is not a._quota
+        assert AsyncGmailFetcher(FakeCredentials())._quota is not AsyncGmailFetcher(FakeCredentials())._quota
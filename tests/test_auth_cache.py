@@ -0,0 +1,149 @@
+"""
+Unit tests for cached access-token verification in get_current_user
+"""
+
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from db.models import User
+from services.auth import auth_cache
+from services.auth.auth_cache import cache_user, get_cached_user, invalidate_user_auth, clear_auth_cache
+from services.auth.utils import create_access_token
+from services.gateway.deps import get_current_user, get_current_user_async, CurrentUser
+
+
+class FakeSession:
+    """Counts user lookups; returns `user` for any query"""
+
+    def __init__(self, user):
+        self.user = user
+        self.queries = 0
+
+    def query(self, model):
+        self.queries += 1
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return self.user
+
+
+class FakeAsyncSession:
+    """AsyncSession stand-in: counts user lookups, returns `user` for any get"""
+
+    def __init__(self, user):
+        self.user = user
+        self.queries = 0
+
+    async def get(self, model, ident):
+        self.queries += 1
+        return self.user
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_auth_cache()
+    yield
+    clear_auth_cache()
+
+
+class TestGetCurrentUserCache:
+    """Test that a verified token skips decoding and the user query"""
+
+    def test_second_request_skips_user_query(self):
+        token = create_access_token({"sub": "7", "email": "a@example.com"})
+        db = FakeSession(User(id=7, email="a@example.com", is_active=True))
+
+        first = get_current_user(token, db)
+        second = get_current_user(token, db)
+
+        assert first == second == CurrentUser(user_id=7, email="a@example.com")
+        assert db.queries == 1
+
+    def test_inactive_user_is_not_cached(self):
+        token = create_access_token({"sub": "7", "email": "a@example.com"})
+        db = FakeSession(User(id=7, email="a@example.com", is_active=False))
+
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                get_current_user(token, db)
+        assert db.queries == 2
+
+    def test_invalidate_forces_lookup(self):
+        token = create_access_token({"sub": "7", "email": "a@example.com"})
+        db = FakeSession(User(id=7, email="a@example.com", is_active=True))
+
+        get_current_user(token, db)
+        invalidate_user_auth(7)
+        get_current_user(token, db)
+        assert db.queries == 2
+
+
+class TestGetCurrentUserAsync:
+    """Test the async dependency shares the cache and checks of get_current_user"""
+
+    def test_cached_token_skips_user_query(self):
+        token = create_access_token({"sub": "7", "email": "a@example.com"})
+        db = FakeAsyncSession(User(id=7, email="a@example.com", is_active=True))
+
+        first = asyncio.run(get_current_user_async(token, db))
+        second = asyncio.run(get_current_user_async(token, db))
+
+        assert first == second == CurrentUser(user_id=7, email="a@example.com")
+        assert db.queries == 1
+
+    def test_shares_the_cache_with_the_sync_dependency(self):
+        token = create_access_token({"sub": "7", "email": "a@example.com"})
+        get_current_user(token, FakeSession(User(id=7, email="a@example.com", is_active=True)))
+
+        db = FakeAsyncSession(None)
+        assert asyncio.run(get_current_user_async(token, db)) == CurrentUser(user_id=7, email="a@example.com")
+        assert db.queries == 0
+
+    @pytest.mark.parametrize("user", [None, User(id=7, email="a@example.com", is_active=False)])
+    def test_missing_or_inactive_user_rejected(self, user):
+        token = create_access_token({"sub": "7", "email": "a@example.com"})
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(get_current_user_async(token, FakeAsyncSession(user)))
+        assert exc.value.status_code == 401
+        assert get_cached_user(token) is None
+
+
+class TestAuthCache:
+    """Test TTL capping and deactivation"""
+
+    def test_ttl_is_capped_at_token_exp(self, monkeypatch):
+        now = [1_000_000.0]
+        monkeypatch.setattr(auth_cache.time, "time", lambda: now[0])
+        cache_user("tok", 1, "user-1", token_exp=now[0] + 5)
+
+        now[0] += 4
+        assert get_cached_user("tok") == "user-1"
+        now[0] += 2
+        assert get_cached_user("tok") is None
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        now = [1_000_000.0]
+        monkeypatch.setattr(auth_cache.time, "time", lambda: now[0])
+        cache_user("tok", 1, "user-1", token_exp=now[0] + 3600)
+
+        now[0] += auth_cache.AUTH_CACHE_TTL + 1
+        assert get_cached_user("tok") is None
+
+    def test_deactivating_user_invalidates(self):
+        cache_user("tok", 5, "user-5", token_exp=time.time() + 3600)
+        user = User(id=5, email="b@example.com", is_active=True)
+
+        user.is_active = False
+
+        assert get_cached_user("tok") is None
+
+    def test_invalidate_only_affects_that_user(self):
+        cache_user("tok-a", 1, "user-1", token_exp=None)
+        cache_user("tok-b", 2, "user-2", token_exp=None)
+        invalidate_user_auth(1)
+        assert get_cached_user("tok-a") is None
+        assert get_cached_user("tok-b") == "user-2"
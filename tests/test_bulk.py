@@ -0,0 +1,113 @@
+"""
+Tests for bulk decision log inserts
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.bulk import DECISION_LOG_CHUNK_SIZE, insert_decision_logs
+from db.models import MailDecisionLog, UserDailyStats
+from db.session import Base, SessionLocal, engine
+from db.stats_rollup import delete_user_stats
+
+USER_ID = 7171
+
+
+def _rows(n, proposed="delete", created_at=None):
+    return [
+        {
+            "user_id": USER_ID,
+            "message_id": f"m{i}",
+            "sender_hash": "s",
+            "size_bytes": 10,
+            "proposed": proposed,
+            "confidence": 90,
+            **({"created_at": created_at} if created_at else {}),
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    session.query(MailDecisionLog).filter(MailDecisionLog.user_id == USER_ID).delete()
+    delete_user_stats(session, USER_ID)
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def chunks(db, monkeypatch):
+    """Sizes of the executemany calls made through db.execute"""
+    sizes = []
+    execute = db.execute
+
+    def spy(statement, params=None, *args, **kwargs):
+        if isinstance(params, list):
+            sizes.append(len(params))
+        return execute(statement, params, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", spy)
+    return sizes
+
+
+def _logged(db):
+    return db.query(MailDecisionLog).filter(MailDecisionLog.user_id == USER_ID).count()
+
+
+class TestInsertDecisionLogs:
+    """Test chunked inserts and the rollup written with them"""
+
+    def test_chunks_across_the_boundary(self, db, chunks):
+        n = DECISION_LOG_CHUNK_SIZE * 2 + 1
+        assert insert_decision_logs(db, _rows(n)) == n
+        db.commit()
+
+        assert chunks == [DECISION_LOG_CHUNK_SIZE, DECISION_LOG_CHUNK_SIZE, 1]
+        assert _logged(db) == n
+
+    def test_exact_multiple_has_no_empty_chunk(self, db, chunks):
+        insert_decision_logs(db, _rows(DECISION_LOG_CHUNK_SIZE))
+        assert chunks == [DECISION_LOG_CHUNK_SIZE]
+
+    def test_custom_chunk_size(self, db, chunks):
+        insert_decision_logs(db, _rows(7), chunk_size=3)
+        assert chunks == [3, 3, 1]
+
+    def test_nothing_to_insert(self, db, chunks):
+        assert insert_decision_logs(db, []) == 0
+        assert chunks == []
+
+    def test_rollup_counts_every_chunk(self, db):
+        n = DECISION_LOG_CHUNK_SIZE + 5
+        insert_decision_logs(db, _rows(n))
+        db.commit()
+
+        stats = db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).one()
+        assert (stats.scanned, stats.scanned_bytes, stats.delete_count) == (n, 10 * n, n)
+        assert stats.last_scan_at is not None
+
+    def test_rollup_shares_the_transaction(self, db):
+        """Rolled-back inserts leave neither log rows nor counts behind"""
+        insert_decision_logs(db, _rows(3))
+        db.rollback()
+
+        assert _logged(db) == 0
+        assert db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).count() == 0
+
+    def test_rollup_by_logged_day(self, db):
+        yesterday = datetime.now() - timedelta(days=1)
+        insert_decision_logs(db, _rows(2, created_at=yesterday) + _rows(1, proposed="keep"))
+        db.commit()
+
+        days = {
+            str(s.day): (s.scanned, s.delete_count, s.keep_count)
+            for s in db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID)
+        }
+        assert days[str(yesterday.date())] == (2, 2, 0)
+        assert sorted(days.values()) == [(1, 0, 1), (2, 2, 0)]
@@ -0,0 +1,146 @@
+"""
+Unit tests for batchModify-based bulk actions
+"""
+
+import pytest
+from services.gmail_connector import bulk_actions
+from services.gmail_connector.bulk_actions import batch_modify, list_matching_ids, trash_messages
+from services.gmail_connector.circuit_breaker import CircuitBreakerOpenError
+
+
+class FakeGmailService:
+    """Records batchModify bodies; fails the chunks listed in fail_chunks"""
+    
+    def __init__(self, fail_chunks=()):
+        self.calls = []
+        self.fail_chunks = set(fail_chunks)
+    
+    def users(self):
+        return self
+    
+    def messages(self):
+        return self
+    
+    def batchModify(self, userId, body):
+        self.calls.append(body)
+        chunk_num = len(self.calls)
+        fail = chunk_num in self.fail_chunks
+        
+        class Request:
+            def execute(self_inner):
+                if fail:
+                    raise RuntimeError(f"chunk {chunk_num} failed")
+                return {}
+        return Request()
+
+
+@pytest.fixture(autouse=True)
+def no_retry(monkeypatch):
+    """Run each call once, without backoff or the shared circuit breaker"""
+    monkeypatch.setattr(bulk_actions, "retry_with_backoff", lambda func, **kwargs: func())
+
+
+class TestBatchModify:
+    
+    def test_chunks_at_limit(self):
+        """IDs are split into chunks of at most chunk_size"""
+        service = FakeGmailService()
+        ids = [f"m{i}" for i in range(2500)]
+        result = batch_modify(service, ids, add_label_ids=["X"])
+        
+        assert [len(c["ids"]) for c in service.calls] == [1000, 1000, 500]
+        assert all(c["addLabelIds"] == ["X"] for c in service.calls)
+        assert result["processed"] == 2500
+        assert result["failed"] == 0
+    
+    def test_failed_chunk_reported(self):
+        """A failed chunk does not stop the others and is reported per chunk"""
+        service = FakeGmailService(fail_chunks={2})
+        ids = [f"m{i}" for i in range(25)]
+        result = batch_modify(service, ids, add_label_ids=["X"], chunk_size=10)
+        
+        assert result["processed"] == 15
+        assert result["failed"] == 10
+        assert result["succeeded_ids"] == ids[:10] + ids[20:]
+        assert [c["ok"] for c in result["chunks"]] == [True, False, True]
+    
+    def test_circuit_open_fails_remaining_chunks(self, monkeypatch):
+        """Once the breaker opens, remaining chunks are not sent"""
+        service = FakeGmailService()
+        
+        def open_breaker(func, **kwargs):
+            if len(service.calls) >= 1:
+                raise CircuitBreakerOpenError("open")
+            return func()
+        monkeypatch.setattr(bulk_actions, "retry_with_backoff", open_breaker)
+        
+        result = batch_modify(service, [f"m{i}" for i in range(30)], add_label_ids=["X"], chunk_size=10)
+        assert len(service.calls) == 1
+        assert [c["error"] for c in result["chunks"]] == [None, "circuit_open", "circuit_open"]
+    
+    def test_trash_adds_trash_label(self):
+        service = FakeGmailService()
+        trash_messages(service, ["a", "b"])
+        assert service.calls == [{"ids": ["a", "b"], "addLabelIds": ["TRASH"]}]
+    
+    def test_empty_ids(self):
+        service = FakeGmailService()
+        result = batch_modify(service, [], add_label_ids=["X"])
+        assert service.calls == []
+        assert result["processed"] == 0
+
+
+
+class FakeListService:
+    """Serves messages.list pages over `total` matching IDs and records the params"""
+    
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+    
+    def users(self):
+        return self
+    
+    def messages(self):
+        return self
+    
+    def list(self, **params):
+        self.calls.append(params)
+        start = int(params.get("pageToken", 0))
+        end = min(start + params["maxResults"], self.total)
+        resp = {"messages": [{"id": f"m{i}"} for i in range(start, end)]}
+        if end < self.total:
+            resp["nextPageToken"] = str(end)
+        
+        class Request:
+            def execute(self_inner):
+                return resp
+        return Request()
+
+
+class TestListMatchingIds:
+    
+    def test_pages_through_all_matches(self):
+        """500 IDs per call until the search is exhausted"""
+        service = FakeListService(1200)
+        ids, truncated = list_matching_ids(service, "from:news@shop.com", 10_000)
+        
+        assert len(ids) == 1200 and not truncated
+        assert [c["maxResults"] for c in service.calls] == [500, 500, 500]
+        assert all(c["q"] == "from:news@shop.com" for c in service.calls)
+        assert all(c["fields"] == "messages/id,nextPageToken" for c in service.calls)
+    
+    def test_stops_at_limit(self):
+        service = FakeListService(1200)
+        ids, truncated = list_matching_ids(service, "from:a.com", 700)
+        
+        assert ids == [f"m{i}" for i in range(700)]
+        assert truncated
+        assert [c["maxResults"] for c in service.calls] == [500, 200]
+    
+    def test_no_matches(self):
+        assert list_matching_ids(FakeListService(0), "from:a.com", 100) == ([], False)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
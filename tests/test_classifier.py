@@ -3,7 +3,10 @@ Unit tests for email classification logic
 """
 
 import pytest
-from services.classifier.policy import classify_bulk, _heuristic
+from services.classifier.policy import (
+    classify_bulk, summarize_items, _heuristic,
+    PROTECTED_DOMAINS, IMPORTANT_KEYWORDS, BULK_HINTS, PROMO_LABELS
+)
 
 class TestHeuristic:
     """Test individual heuristic classification"""
@@ -334,5 +337,72 @@ class TestProtectedDomains:
         assert decision == "keep"
 
 
+def _reference_heuristic(item):
+    """Original per-term substring scan, kept as the oracle for the compiled matchers"""
+    sender = item.get("from", "").lower()
+    subject = (item.get("subject") or "").lower()
+    labels = set(item.get("labels") or [])
+    size = item.get("size", 0)
+    if any(d in sender for d in PROTECTED_DOMAINS):
+        return "keep", 0.95
+    if any(k in subject for k in IMPORTANT_KEYWORDS):
+        return "review", 0.90
+    if "INBOX" in labels and not (labels & PROMO_LABELS):
+        return "keep", 0.85
+    if labels & PROMO_LABELS:
+        return "delete", 0.85
+    if any(h in sender or h in subject for h in BULK_HINTS):
+        return "delete", 0.70
+    if size > 3_000_000:
+        return "review", 0.75
+    return "keep", 0.65
+
+
+class TestCompiledMatchers:
+    """Compiled matchers must agree with the plain substring scans"""
+    
+    SENDERS = [
+        "", "friend@gmail.com", "alerts@chase.com", "noreply@epfindia.gov.in",
+        "news@NEWSLETTER.example.com", "deals@shop.io", "team@notion.so",
+        "Marketing Team <promo@brand.co>", "x@ola.example", "bot@example.edu",
+    ]
+    SUBJECTS = [
+        None, "", "Hey there", "Your OTP is 1234", "ACTION REQUIRED: verify",
+        "Weekly newsletter", "Unsubscribe anytime", "Big sale", "Password reset",
+        "promotional offer inside",
+    ]
+    LABELS = [
+        None, [], ["INBOX"], ["CATEGORY_PROMOTIONS"], ["INBOX", "CATEGORY_SOCIAL"],
+        ["CATEGORY_UPDATES"],
+    ]
+    
+    def test_parity_with_reference(self):
+        """Every sender/subject/label combination yields the same decision and confidence"""
+        for sender in self.SENDERS:
+            for subject in self.SUBJECTS:
+                for labels in self.LABELS:
+                    for size in (0, 5_000_000):
+                        email = {"from": sender, "subject": subject, "labels": labels, "size": size}
+                        assert _heuristic(email) == _reference_heuristic(email), email
+    
+    def test_bulk_hint_in_sender_only(self):
+        """Bulk hints are matched in the sender as well as the subject"""
+        email = {"from": "marketing@shop.io", "subject": "Hi", "labels": [], "size": 0}
+        assert _heuristic(email) == ("delete", 0.70)
+
+
+class TestSummaries:
+    """Summaries of merged batches"""
+    
+    def test_summarize_merged_batches(self):
+        """Summaries rebuilt from per-batch items match a single classify_bulk call"""
+        emails = [
+            {"id": f"m{i}", "from": "a@b.com", "subject": "Sale", "labels": ["CATEGORY_PROMOTIONS"] if i % 2 else ["INBOX"], "size": 1_000_000 + i}
+            for i in range(7)
+        ]
+        merged = classify_bulk(emails[:3])["items"] + classify_bulk(emails[3:])["items"]
+        assert summarize_items(merged) == classify_bulk(emails)["summary"]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
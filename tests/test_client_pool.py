@@ -0,0 +1,39 @@
+"""
+Unit tests for the pooled Gmail API client
+"""
+
+import threading
+from google.oauth2.credentials import Credentials
+from services.gmail_connector import client_pool
+from services.gmail_connector.client_pool import gmail_client
+
+
+class TestGmailClientPool:
+    """Test that clients share the parsed document and transport but not credentials"""
+
+    def setup_method(self):
+        client_pool.reset_pool()
+
+    def test_credentials_are_per_client(self):
+        alice = gmail_client(Credentials(token="alice"))
+        bob = gmail_client(Credentials(token="bob"))
+        assert alice._http.credentials.token == "alice"
+        assert bob._http.credentials.token == "bob"
+
+    def test_transport_is_reused_within_a_thread(self):
+        first = gmail_client(Credentials(token="a"))
+        second = gmail_client(Credentials(token="b"))
+        assert first._http.http is second._http.http
+
+    def test_threads_get_their_own_transport(self):
+        here = gmail_client(Credentials(token="a"))._http.http
+        there = []
+        t = threading.Thread(target=lambda: there.append(gmail_client(Credentials(token="b"))._http.http))
+        t.start()
+        t.join()
+        assert there[0] is not here
+
+    def test_requests_target_gmail(self):
+        service = gmail_client(Credentials(token="a"))
+        request = service.users().messages().list(userId="me", maxResults=5)
+        assert request.uri.startswith("https://gmail.googleapis.com/gmail/v1/users/me/messages")
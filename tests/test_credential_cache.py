@@ -0,0 +1,86 @@
+"""
+Unit tests for the decrypted Gmail credentials cache
+"""
+
+import pytest
+from google.oauth2.credentials import Credentials
+from services.gmail_connector import credential_cache
+from services.gmail_connector.credential_cache import (
+    CachedCredentials, get_user_credentials, sync_refreshed_token, invalidate_credentials, clear_credential_cache
+)
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append(args)
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Count DB loads; each load returns fresh credentials for token_id=42"""
+    clear_credential_cache()
+    calls = []
+    clock = [1000.0]
+    monkeypatch.setattr(credential_cache.time, "monotonic", lambda: clock[0])
+
+    def fake_load(db, user_id):
+        calls.append(user_id)
+        return CachedCredentials(
+            token_id=42,
+            credentials=Credentials(token="access-1", refresh_token="refresh"),
+            persisted_token="access-1",
+            expires_at=clock[0] + credential_cache.CREDENTIAL_CACHE_TTL
+        )
+
+    monkeypatch.setattr(credential_cache, "_load", fake_load)
+    yield calls, clock
+    clear_credential_cache()
+
+
+class TestCredentialCache:
+    """Test caching, expiry, invalidation and refreshed-token write-back"""
+
+    def test_second_lookup_is_cached(self, loads):
+        calls, _ = loads
+        first = get_user_credentials(None, 1)
+        second = get_user_credentials(None, 1)
+        assert first is second
+        assert calls == [1]
+
+    def test_entries_expire(self, loads):
+        calls, clock = loads
+        get_user_credentials(None, 1)
+        clock[0] += credential_cache.CREDENTIAL_CACHE_TTL + 1
+        get_user_credentials(None, 1)
+        assert calls == [1, 1]
+
+    def test_invalidate_forces_reload(self, loads):
+        calls, _ = loads
+        get_user_credentials(None, 1)
+        invalidate_credentials(1)
+        get_user_credentials(None, 1)
+        assert calls == [1, 1]
+
+    def test_unauthorized_user_is_not_cached(self, monkeypatch):
+        clear_credential_cache()
+        calls = []
+        monkeypatch.setattr(credential_cache, "_load", lambda db, user_id: calls.append(user_id))
+        assert get_user_credentials(None, 1) is None
+        assert get_user_credentials(None, 1) is None
+        assert calls == [1, 1]
+
+    def test_refreshed_token_is_written_back_once(self, loads, monkeypatch):
+        executor = RecordingExecutor()
+        monkeypatch.setattr(credential_cache, "_write_back_executor", executor)
+        cached = get_user_credentials(None, 1)
+
+        sync_refreshed_token(1)
+        assert executor.calls == []
+
+        cached.credentials.token = "access-2"
+        sync_refreshed_token(1)
+        sync_refreshed_token(1)
+        assert [(token_id, token) for token_id, token, _ in executor.calls] == [(42, "access-2")]
@@ -0,0 +1,115 @@
+"""
+Tests for connection pool configuration and telemetry
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, text
+
+from db.pool import (
+    InstrumentedQueuePool,
+    PoolSettings,
+    engine_kwargs,
+    get_pool_metrics,
+    instrument_engine,
+    pool_stats,
+)
+from services.gateway.deps import CurrentUser, get_current_user
+from services.gateway.main import app
+
+
+@pytest.fixture
+def small_engine(tmp_path):
+    settings = PoolSettings(size=1, max_overflow=1, timeout=0.05, disconnect_mode="optimistic")
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url, **engine_kwargs(url, "test-pool", settings))
+    instrument_engine(engine, "test-pool")
+    get_pool_metrics("test-pool").reset()
+    yield engine, settings
+    engine.dispose()
+
+
+class TestPoolSettings:
+    """Tests for PoolSettings.from_env"""
+
+    def test_reads_env(self, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "20")
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+        monkeypatch.setenv("DB_DISCONNECT_MODE", "Optimistic")
+        settings = PoolSettings.from_env()
+        assert (settings.size, settings.max_overflow, settings.capacity) == (20, 5, 25)
+        assert settings.disconnect_mode == "optimistic"
+
+    def test_rejects_unknown_mode(self, monkeypatch):
+        monkeypatch.setenv("DB_DISCONNECT_MODE", "sometimes")
+        with pytest.raises(ValueError):
+            PoolSettings.from_env()
+
+    def test_unlimited_overflow_has_no_capacity(self):
+        assert PoolSettings(max_overflow=-1).capacity is None
+
+
+class TestEngineKwargs:
+    """Tests for engine_kwargs"""
+
+    def test_optimistic_mode_skips_pre_ping(self):
+        kwargs = engine_kwargs("postgresql://u@h/db", "x", PoolSettings(disconnect_mode="optimistic"))
+        assert kwargs["pool_pre_ping"] is False
+        assert kwargs["poolclass"] is InstrumentedQueuePool
+
+    def test_in_memory_sqlite_keeps_default_pool(self):
+        kwargs = engine_kwargs("sqlite://", "x", PoolSettings())
+        assert "poolclass" not in kwargs and "pool_size" not in kwargs
+
+
+class TestPoolTelemetry:
+    """Tests for checkout timing and saturation"""
+
+    def test_checkouts_and_saturation(self, small_engine):
+        engine, settings = small_engine
+        conn = engine.connect()
+        conn.execute(text("SELECT 1"))
+        stats = pool_stats(engine.pool, "test-pool", settings)
+        assert stats["checked_out"] == 1
+        assert stats["saturation"] == 0.5
+        assert stats["checkouts"] == 1
+        assert stats["connects"] == 1
+        conn.close()
+
+    def test_exhaustion_counts_timeout(self, small_engine):
+        engine, settings = small_engine
+        held = [engine.connect(), engine.connect()]
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        stats = pool_stats(engine.pool, "test-pool", settings)
+        assert stats["saturation"] == 1.0
+        assert stats["timeouts"] == 1
+        assert stats["wait_ms"]["max"] >= 40
+        for conn in held:
+            conn.close()
+
+    def test_metrics_survive_dispose(self, small_engine):
+        engine, settings = small_engine
+        with engine.connect():
+            pass
+        engine.dispose()
+        with engine.connect():
+            pass
+        assert pool_stats(engine.pool, "test-pool", settings)["checkouts"] == 2
+
+
+class TestMetricsEndpoint:
+    """Tests for GET /metrics/db"""
+
+    def test_requires_authentication(self):
+        with TestClient(app) as client:
+            assert client.get("/metrics/db").status_code == 401
+
+    def test_reports_both_pools(self):
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(user_id=1, email="ops@example.com")
+        try:
+            with TestClient(app) as client:
+                body = client.get("/metrics/db").json()
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+        assert {"timestamp", "sync", "async"} <= set(body)
@@ -0,0 +1,77 @@
+"""
+Unit tests for Gmail partial-response field masks
+"""
+
+import asyncio
+from urllib.parse import parse_qs, urlparse
+from google.oauth2.credentials import Credentials
+from services.gmail_connector.async_fetch import AsyncGmailFetcher, GmailFetchError
+from services.gmail_connector.client_pool import gmail_client
+from services.gmail_connector.fields import FIELD_MASKS, GZIP_HEADERS, masked
+
+
+class TestMasked:
+    """Test adding masks to request parameters"""
+
+    def test_adds_fields(self):
+        assert masked("users.getProfile", userId="me") == {"userId": "me", "fields": "historyId"}
+
+    def test_empty_mask_adds_nothing(self):
+        assert masked("messages.batchModify", userId="me") == {"userId": "me"}
+
+    def test_masks_keep_what_scans_read(self):
+        assert "sizeEstimate" in FIELD_MASKS["messages.get"]
+        assert "labelIds" in FIELD_MASKS["messages.get"]
+        assert "nextPageToken" in FIELD_MASKS["messages.list"]
+
+    def test_gzip_needs_both_headers(self):
+        assert "gzip" in GZIP_HEADERS["Accept-Encoding"]
+        assert "(gzip)" in GZIP_HEADERS["User-Agent"]
+
+
+class TestClientRequests:
+    """Test that masks reach the googleapiclient request URL"""
+
+    def test_list_request_carries_fields(self):
+        service = gmail_client(Credentials(token="a"))
+        request = service.users().messages().list(**masked("messages.list", userId="me", q="newer_than:1d"))
+        assert parse_qs(urlparse(request.uri).query)["fields"] == [FIELD_MASKS["messages.list"]]
+
+    def test_get_request_carries_fields(self):
+        service = gmail_client(Credentials(token="a"))
+        request = service.users().messages().get(**masked("messages.get", userId="me", id="m1", format="metadata"))
+        assert parse_qs(urlparse(request.uri).query)["fields"] == [FIELD_MASKS["messages.get"]]
+
+
+class TestAsyncFetcherMasks:
+    """Test that the async fetcher masks every call"""
+
+    def _fetcher(self, response):
+        fetcher = AsyncGmailFetcher(credentials=None)
+        calls = []
+
+        async def fake_get(path, params, operation_name, cost, error_cls=GmailFetchError):
+            calls.append((path, dict(params)))
+            return response
+
+        fetcher._get_with_retry = fake_get
+        return fetcher, calls
+
+    def test_profile(self):
+        fetcher, calls = self._fetcher({"historyId": "7"})
+        assert asyncio.run(fetcher.get_history_id()) == "7"
+        assert calls[0][1]["fields"] == FIELD_MASKS["users.getProfile"]
+
+    def test_history(self):
+        fetcher, calls = self._fetcher({})
+        asyncio.run(fetcher.list_history("1"))
+        assert calls[0][1]["fields"] == FIELD_MASKS["history.list"]
+
+    def test_list(self):
+        fetcher, calls = self._fetcher({})
+
+        async def collect():
+            return [ids async for ids in fetcher.list_message_ids(10)]
+
+        asyncio.run(collect())
+        assert calls[0][1]["fields"] == FIELD_MASKS["messages.list"]
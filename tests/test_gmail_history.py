@@ -0,0 +1,99 @@
+"""
+Unit tests for history.list parsing used by incremental scans
+"""
+
+import asyncio
+import pytest
+from services.gmail_connector.async_fetch import AsyncGmailFetcher, GmailFetchError, HistoryExpiredError
+
+
+def _fetcher_with_pages(pages):
+    """AsyncGmailFetcher whose GETs return `pages` in order (or raise them)"""
+    fetcher = AsyncGmailFetcher(credentials=None)
+    calls = []
+
+    async def fake_get(path, params, operation_name, cost, error_cls=GmailFetchError):
+        calls.append(dict(params))
+        page = pages[len(calls) - 1]
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+    fetcher._get_with_retry = fake_get
+    return fetcher, calls
+
+
+def _msg(mid, labels=("INBOX",)):
+    return {"message": {"id": mid, "labelIds": list(labels)}}
+
+
+class TestListHistory:
+    """Test turning history records into added/removed message IDs"""
+
+    def test_added_messages_in_history_order(self):
+        fetcher, _ = _fetcher_with_pages([
+            {"history": [{"messagesAdded": [_msg("a")]}, {"messagesAdded": [_msg("b")]}], "historyId": "120"}
+        ])
+        added, removed, history_id = asyncio.run(fetcher.list_history("100"))
+        assert added == ["a", "b"]
+        assert removed == set()
+        assert history_id == "120"
+
+    def test_deleted_and_trashed_messages_are_removed(self):
+        fetcher, _ = _fetcher_with_pages([
+            {"history": [
+                {"messagesAdded": [_msg("a"), _msg("b"), _msg("spam", labels=["SPAM"])]},
+                {"messagesDeleted": [_msg("a")]},
+                {"labelsAdded": [{**_msg("b"), "labelIds": ["TRASH"]}]},
+                {"labelsAdded": [{**_msg("old"), "labelIds": ["TRASH"]}]},
+                {"labelsAdded": [{**_msg("starred"), "labelIds": ["STARRED"]}]},
+            ], "historyId": "130"}
+        ])
+        added, removed, _ = asyncio.run(fetcher.list_history("100"))
+        assert added == ["starred"]  # labels feed the classifier: re-classify
+        assert removed == {"a", "b", "old"}
+
+    def test_untrashed_and_refiled_messages_are_reclassified(self):
+        fetcher, _ = _fetcher_with_pages([
+            {"history": [
+                {"labelsAdded": [{**_msg("t", labels=["TRASH"]), "labelIds": ["TRASH"]}]},
+                {"labelsRemoved": [{**_msg("t", labels=["INBOX"]), "labelIds": ["TRASH"]}]},
+                {"labelsRemoved": [{**_msg("promo"), "labelIds": ["CATEGORY_PROMOTIONS"]}]},
+                {"labelsRemoved": [{**_msg("junk", labels=["SPAM"]), "labelIds": ["INBOX"]}]},
+            ], "historyId": "140"}
+        ])
+        added, removed, _ = asyncio.run(fetcher.list_history("100"))
+        assert added == ["t", "promo"]
+        assert removed == {"junk"}
+
+    def test_requests_label_changes(self):
+        fetcher, calls = _fetcher_with_pages([{}])
+        asyncio.run(fetcher.list_history("100"))
+        assert {"labelAdded", "labelRemoved"} <= set(calls[0]["historyTypes"])
+
+    def test_follows_page_tokens(self):
+        fetcher, calls = _fetcher_with_pages([
+            {"history": [{"messagesAdded": [_msg("a")]}], "nextPageToken": "p2", "historyId": "150"},
+            {"history": [{"messagesAdded": [_msg("b")]}], "historyId": "150"},
+        ])
+        added, _, history_id = asyncio.run(fetcher.list_history("100"))
+        assert added == ["a", "b"]
+        assert history_id == "150"
+        assert calls[1]["pageToken"] == "p2"
+        assert all(c["startHistoryId"] == "100" for c in calls)
+
+    def test_no_changes_keeps_history_id(self):
+        fetcher, _ = _fetcher_with_pages([{}])
+        added, removed, history_id = asyncio.run(fetcher.list_history("100"))
+        assert (added, removed, history_id) == ([], set(), "100")
+
+    def test_expired_history_raises(self):
+        fetcher, _ = _fetcher_with_pages([GmailFetchError("not found", status_code=404)])
+        with pytest.raises(HistoryExpiredError):
+            asyncio.run(fetcher.list_history("1"))
+
+    def test_other_errors_propagate(self):
+        fetcher, _ = _fetcher_with_pages([GmailFetchError("server error", status_code=500)])
+        with pytest.raises(GmailFetchError) as exc:
+            asyncio.run(fetcher.list_history("1"))
+        assert not isinstance(exc.value, HistoryExpiredError)
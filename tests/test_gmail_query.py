@@ -0,0 +1,111 @@
+"""
+Unit tests for Gmail search query building (scan filter pushdown)
+"""
+
+import asyncio
+import pytest
+from services.gmail_connector.async_fetch import AsyncGmailFetcher, GmailFetchError
+from services.gmail_connector.query import ScanFilters, build_query
+
+
+class TestBuildQuery:
+    """Test turning scan parameters into a messages.list `q`"""
+
+    def test_days_back_only(self):
+        assert build_query(30) == "newer_than:30d"
+
+    def test_no_window_no_filters_is_empty(self):
+        assert build_query() == ""
+        assert build_query(0, ScanFilters()) == ""
+
+    def test_single_category(self):
+        assert build_query(365, ScanFilters(categories=("Promotions",))) == "newer_than:365d category:promotions"
+
+    def test_several_categories_are_ored(self):
+        q = build_query(None, ScanFilters(categories=("promotions", "social")))
+        assert q == "{category:promotions category:social}"
+
+    def test_senders_are_ored(self):
+        q = build_query(None, ScanFilters(senders=("News@Shop.com", "@deals.com")))
+        assert q == "{from:news@shop.com from:deals.com}"
+
+    def test_sender_with_category(self):
+        q = build_query(30, ScanFilters(senders=("shop.com",), categories=("promotions",)))
+        assert q == "newer_than:30d from:shop.com category:promotions"
+
+    def test_all_filters(self):
+        filters = ScanFilters(
+            categories=("updates",), older_than_days=7, min_size_kb=500, exclude_labels=("Receipts", "Work/Travel Plans")
+        )
+        assert build_query(90, filters) == (
+            "newer_than:90d older_than:7d category:updates larger:512000 -label:receipts -label:work-travel-plans"
+        )
+
+
+class TestScanFilters:
+    """Test filter validation and construction"""
+
+    def test_unknown_category_rejected(self):
+        with pytest.raises(ValueError, match="Unknown Gmail categories"):
+            ScanFilters(categories=("newsletters",))
+
+    @pytest.mark.parametrize("field", ["older_than_days", "min_size_kb"])
+    def test_non_positive_numbers_rejected(self, field):
+        with pytest.raises(ValueError, match=field):
+            ScanFilters(**{field: 0})
+
+    @pytest.mark.parametrize("sender", ["", "shop", "a OR b", "a@b.com -label:x", "{a@b.com}", "(x.com)"])
+    def test_invalid_sender_rejected(self, sender):
+        with pytest.raises(ValueError, match="Invalid sender"):
+            ScanFilters(senders=(sender,))
+
+    def test_blank_label_rejected(self):
+        with pytest.raises(ValueError):
+            build_query(30, ScanFilters(exclude_labels=(" ",)))
+
+    @pytest.mark.parametrize("label", ['a "b"', '"q"', "{x}", "(x)", "label:x", "-x", "x -label:y", "a|b"])
+    def test_invalid_label_rejected(self, label):
+        with pytest.raises(ValueError, match="Invalid label"):
+            ScanFilters(exclude_labels=(label,))
+
+    def test_operator_in_label_stays_a_label(self):
+        assert build_query(None, ScanFilters(exclude_labels=("x OR y",))) == "-label:x-or-y"
+
+    def test_from_dict_ignores_unrelated_keys(self):
+        filters = ScanFilters.from_dict({"categories": ["social"], "min_size_kb": 100, "sort": "size"})
+        assert filters == ScanFilters(categories=("social",), min_size_kb=100)
+
+    def test_from_none(self):
+        assert ScanFilters.from_dict(None) == ScanFilters()
+
+    def test_targeted(self):
+        assert not ScanFilters().targeted
+        assert ScanFilters(exclude_labels=("work",)).targeted
+
+
+class TestListMessageIdsQuery:
+    """Test that the query reaches messages.list"""
+
+    def _fetcher(self):
+        fetcher = AsyncGmailFetcher(credentials=None)
+        calls = []
+
+        async def fake_get(path, params, operation_name, cost, error_cls=GmailFetchError):
+            calls.append(dict(params))
+            return {"messages": [{"id": "a"}]}
+
+        fetcher._get_with_retry = fake_get
+        return fetcher, calls
+
+    async def _collect(self, fetcher, query):
+        return [ids async for ids in fetcher.list_message_ids(10, query)]
+
+    def test_query_sent_as_q(self):
+        fetcher, calls = self._fetcher()
+        asyncio.run(self._collect(fetcher, "newer_than:30d category:promotions"))
+        assert calls[0]["q"] == "newer_than:30d category:promotions"
+
+    def test_empty_query_omits_q(self):
+        fetcher, calls = self._fetcher()
+        asyncio.run(self._collect(fetcher, ""))
+        assert "q" not in calls[0]
@@ -0,0 +1,110 @@
+"""
+Tests for merging incremental scan results with previously persisted decisions
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from db.bulk import insert_decision_logs
+from db.models import GmailSyncState, MailDecisionLog
+from db.session import Base, SessionLocal, engine
+from db.stats_rollup import delete_user_stats
+from services.gateway.deps import CurrentUser
+from services.gmail_connector import api
+from services.gmail_connector.sync import load_previous_decisions
+
+USER_ID = 4343
+TOKEN_ID = 4343
+
+
+def _row(mid, days_old=None, proposed="delete"):
+    return {
+        "user_id": USER_ID,
+        "message_id": mid,
+        "sender_hash": "s",
+        "size_bytes": 100,
+        "internal_date": datetime.utcnow() - timedelta(days=days_old) if days_old is not None else None,
+        "proposed": proposed,
+        "confidence": 90,
+    }
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.query(MailDecisionLog).filter(MailDecisionLog.user_id == USER_ID).delete()
+    session.query(GmailSyncState).filter(GmailSyncState.user_id == USER_ID).delete()
+    delete_user_stats(session, USER_ID)
+    session.commit()
+    session.close()
+
+
+def _scan(db, monkeypatch, added, removed=(), fetched=(), limit=100, days_back=30):
+    """Run _scan_incremental with history reporting `added`/`removed` and `fetched` re-classified"""
+    async def fake_fetch_changes(creds, user_id, start_history_id, limit):
+        meta = [{"id": mid, "from": "x@shop.com", "subject": "", "date": date, "labels": ["INBOX"], "size": 10}
+                for mid, date in fetched]
+        items = [{"id": mid, "sender_hash": "s", "size": 10, "decision": "keep", "confidence": 0.9}
+                 for mid, _ in fetched]
+        return list(added), set(removed), meta, items, "200"
+
+    monkeypatch.setattr(api, "_fetch_changes", fake_fetch_changes)
+    monkeypatch.setattr(api, "sync_refreshed_token", lambda user_id: None)
+    sync_state = SimpleNamespace(history_id="100", full_scan_at=None)
+    user = CurrentUser(user_id=USER_ID, email="u@example.com")
+    return api._scan_incremental(user, TOKEN_ID, None, sync_state, limit, db, days_back)
+
+
+class TestLoadPreviousDecisions:
+    """Test the persisted side of the merge"""
+
+    def test_window_skips_older_messages(self, db):
+        insert_decision_logs(db, [_row("new", 1), _row("old", 60), _row("undated")])
+        db.commit()
+
+        items = load_previous_decisions(db, USER_ID, None, newer_than=datetime.utcnow() - timedelta(days=30))
+        assert sorted(i["id"] for i in items) == ["new", "undated"]
+
+    def test_limit_keeps_the_newest(self, db):
+        insert_decision_logs(db, [_row(f"m{i}", 1) for i in range(5)])
+        db.commit()
+
+        items = load_previous_decisions(db, USER_ID, None, limit=2)
+        assert [i["id"] for i in items] == ["m4", "m3"]
+
+
+class TestScanIncremental:
+    """Test the merged result stays within the limit and the window"""
+
+    def test_merge_is_bounded_by_the_limit(self, db, monkeypatch):
+        insert_decision_logs(db, [_row(f"p{i}", 1) for i in range(10)])
+        db.commit()
+
+        result = _scan(db, monkeypatch, added=["n1"], fetched=[("n1", "")], limit=4)
+        assert result["scanned_count"] == 4
+        assert result["hit_limit"] is True
+        assert result["keep"] == ["n1"]
+
+    def test_relabelled_messages_replace_their_old_decision(self, db, monkeypatch):
+        insert_decision_logs(db, [_row("a", 1), _row("b", 1), _row("gone", 1)])
+        db.commit()
+
+        # "b" changed but was not re-fetched (over the limit): it must not keep its stale decision
+        result = _scan(db, monkeypatch, added=["b", "a"], removed=["gone"], fetched=[("a", "")])
+        assert result["keep"] == ["a"]
+        assert result["safe_to_delete"] == []
+        assert result["scanned_count"] == 1
+
+    def test_window_applies_to_both_sides(self, db, monkeypatch):
+        insert_decision_logs(db, [_row("recent", 1), _row("stale", 90)])
+        db.commit()
+
+        old_date = "Mon, 01 Jan 2024 10:00:00 +0000"
+        result = _scan(db, monkeypatch, added=["relabelled"], fetched=[("relabelled", old_date)], days_back=30)
+        assert result["safe_to_delete"] == ["recent"]
+        assert result["keep"] == []
+        assert result["scanned_count"] == 1
@@ -0,0 +1,121 @@
+"""
+Unit tests for the instant mailbox summary (label counters, no message fetches)
+"""
+
+from urllib.parse import parse_qs, urlparse
+import pytest
+from fastapi.testclient import TestClient
+from google.oauth2.credentials import Credentials
+from services.connectors.gmail import connector as gmail_connector
+from services.gateway.deps import CurrentUser, get_current_user
+from services.gateway.main import app
+from services.gmail_connector.client_pool import gmail_client
+from services.gmail_connector.summary import ESTIMATE_QUERIES, build_summary, mailbox_summary, _summary_requests
+
+
+RESPONSES = {
+    "profile": {"messagesTotal": 1000, "threadsTotal": 800},
+    "label:promotions": {"id": "CATEGORY_PROMOTIONS", "messagesTotal": 300, "messagesUnread": 250, "threadsTotal": 280},
+    "label:social": {"id": "CATEGORY_SOCIAL", "messagesTotal": 100, "messagesUnread": 10, "threadsTotal": 90},
+    "label:forums": {"id": "CATEGORY_FORUMS", "messagesTotal": 50, "messagesUnread": 0, "threadsTotal": 40},
+    "estimate:old_clutter": {"resultSizeEstimate": 201},
+    "estimate:large": {"resultSizeEstimate": 7},
+}
+
+
+class FakeBatch:
+    """Stands in for BatchHttpRequest: answers each added request from `responses`"""
+
+    def __init__(self, callback, responses):
+        self.callback = callback
+        self.responses = responses
+        self.request_ids = []
+
+    def add(self, request, request_id):
+        self.request_ids.append(request_id)
+
+    def execute(self):
+        for request_id in self.request_ids:
+            response = self.responses.get(request_id)
+            exception = None if response is not None else RuntimeError("404")
+            self.callback(request_id, response, exception)
+
+
+class TestBuildSummary:
+    """Test turning counter responses into the summary"""
+
+    def test_counts_and_share(self):
+        summary = build_summary(RESPONSES)
+        assert summary["total_messages"] == 1000
+        assert summary["categories"]["promotions"] == {"messages": 300, "unread": 250, "threads": 280}
+        assert summary["clutter_messages"] == 450
+        assert summary["clutter_percent"] == 45.0
+        assert summary["estimates"] == {"old_clutter": 201, "large": 7}
+        assert summary["estimated"] is True
+
+    def test_failed_requests_are_none(self):
+        responses = {k: v for k, v in RESPONSES.items() if k not in ("label:social", "estimate:large")}
+        summary = build_summary(responses)
+        assert summary["categories"]["social"] is None
+        assert summary["clutter_messages"] == 350
+        assert summary["estimates"]["large"] is None
+
+    def test_empty_mailbox(self):
+        summary = build_summary({"profile": {"messagesTotal": 0, "threadsTotal": 0}})
+        assert summary["clutter_percent"] is None
+
+
+class TestSummaryRequests:
+    """Test the requests sent in the batch"""
+
+    def test_requests_are_masked(self):
+        requests = _summary_requests(gmail_client(Credentials(token="a")))
+        assert set(requests) == set(RESPONSES)
+        for request in requests.values():
+            assert "fields" in parse_qs(urlparse(request.uri).query)
+
+    def test_estimates_list_a_single_message(self):
+        requests = _summary_requests(gmail_client(Credentials(token="a")))
+        params = parse_qs(urlparse(requests["estimate:large"].uri).query)
+        assert params["maxResults"] == ["1"]
+        assert params["q"] == [ESTIMATE_QUERIES["large"]]
+
+    def test_one_batch_request(self):
+        service = gmail_client(Credentials(token="a"))
+        batches = []
+
+        def new_batch(callback):
+            batches.append(FakeBatch(callback, RESPONSES))
+            return batches[-1]
+
+        service.new_batch_http_request = new_batch
+        summary = mailbox_summary(service)
+        assert len(batches) == 1
+        assert summary["clutter_messages"] == 450
+        assert summary["api_requests"] == 1
+
+
+class TestSummaryEndpoint:
+    """Test status codes of GET /v1/summary/{provider}"""
+
+    @pytest.fixture(autouse=True)
+    def as_user(self):
+        app.dependency_overrides[get_current_user] = lambda: CurrentUser(user_id=5151, email="summary@example.com")
+        yield
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def _get(self, provider):
+        with TestClient(app) as client:
+            return client.get(f"/v1/summary/{provider}")
+
+    @pytest.mark.parametrize("provider", ["nonexistent", "dropbox"])
+    def test_unknown_or_unsupported_provider_is_bad_request(self, provider):
+        assert self._get(provider).status_code == 400
+
+    def test_provider_without_summaries_is_bad_request(self, monkeypatch):
+        monkeypatch.setattr(gmail_connector.GmailConnector, "_get_supported_features", lambda self: ["scan"])
+        assert self._get("gmail").status_code == 400
+
+    def test_not_connected_is_forbidden(self, monkeypatch):
+        monkeypatch.setattr(gmail_connector, "get_user_credentials", lambda db, user_id: None)
+        assert self._get("gmail").status_code == 403
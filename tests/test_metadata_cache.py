@@ -0,0 +1,242 @@
+"""
+Unit tests for the Gmail message metadata cache
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from services.gmail_connector import metadata_cache
+from services.gmail_connector.metadata_cache import InMemoryMetadataCache, RedisMetadataCache, stale_message_ids
+from services.gmail_connector import api
+from services.gmail_connector.async_fetch import AsyncGmailFetcher, GmailFetchError
+from services.gateway.deps import CurrentUser
+
+
+def _item(mid, **extra):
+    return {"id": mid, "from": "a@b.com", "subject": "Hi", "date": "", "labels": ["INBOX"], "size": 10, **extra}
+
+
+@pytest.fixture(autouse=True)
+def app_secret(monkeypatch):
+    """Redis entries are encrypted with the APP_SECRET key"""
+    monkeypatch.setenv("APP_SECRET", "test-secret-test-secret-test-secret")
+
+
+class TestInMemoryMetadataCache:
+    """Test TTL, LRU eviction and per-user keys"""
+
+    def test_get_returns_only_cached_ids(self):
+        cache = InMemoryMetadataCache()
+        cache.set_many(1, [_item("m1")])
+        assert cache.get_many(1, ["m1", "m2"]) == {"m1": _item("m1")}
+
+    def test_keys_are_per_user(self):
+        cache = InMemoryMetadataCache()
+        cache.set_many(1, [_item("m1")])
+        assert cache.get_many(2, ["m1"]) == {}
+
+    def test_only_item_fields_are_kept(self):
+        cache = InMemoryMetadataCache()
+        cache.set_many(1, [_item("m1", headers={"x": "y"}, snippet="hello")])
+        assert cache.get_many(1, ["m1"])["m1"] == _item("m1", snippet="hello")
+
+    def test_invalidate_messages(self):
+        cache = InMemoryMetadataCache()
+        cache.set_many(1, [_item("m1"), _item("m2")])
+        cache.invalidate(1, ["m1", "unknown"])
+        assert set(cache.get_many(1, ["m1", "m2"])) == {"m2"}
+
+    def test_entries_expire(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(metadata_cache.time, "monotonic", lambda: clock[0])
+        cache = InMemoryMetadataCache(ttl=60)
+        cache.set_many(1, [_item("m1")])
+        clock[0] += 59
+        assert "m1" in cache.get_many(1, ["m1"])
+        clock[0] += 2
+        assert cache.get_many(1, ["m1"]) == {}
+        assert len(cache) == 0
+
+    def test_least_recently_used_is_evicted(self):
+        cache = InMemoryMetadataCache(max_entries=2)
+        cache.set_many(1, [_item("m1"), _item("m2")])
+        cache.get_many(1, ["m1"])  # m2 is now least recently used
+        cache.set_many(1, [_item("m3")])
+        assert set(cache.get_many(1, ["m1", "m2", "m3"])) == {"m1", "m3"}
+
+    def test_invalidate_user(self):
+        cache = InMemoryMetadataCache()
+        cache.set_many(1, [_item("m1")])
+        cache.set_many(2, [_item("m1")])
+        cache.set_history_id(1, "100")
+        cache.invalidate_user(1)
+        assert cache.get_many(1, ["m1"]) == {}
+        assert cache.get_history_id(1) is None
+        assert "m1" in cache.get_many(2, ["m1"])
+
+    def test_history_cursor_expires_with_entries(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(metadata_cache.time, "monotonic", lambda: clock[0])
+        cache = InMemoryMetadataCache(ttl=60)
+        cache.set_history_id(1, "100")
+        assert cache.get_history_id(1) == "100"
+        clock[0] += 61
+        assert cache.get_history_id(1) is None
+
+    def test_stale_message_ids(self):
+        history = [
+            {"messagesAdded": [{"message": {"id": "new"}}]},
+            {"labelsAdded": [{"message": {"id": "m1"}, "labelIds": ["STARRED"]}]},
+            {"labelsRemoved": [{"message": {"id": "m2"}, "labelIds": ["CATEGORY_PROMOTIONS"]}]},
+            {"messagesDeleted": [{"message": {"id": "m3"}}]},
+        ]
+        assert stale_message_ids(history) == {"m1", "m2", "m3"}
+
+
+class TestRedisMetadataCache:
+    """Test that Redis failures degrade to cache misses"""
+
+    def test_read_failure_is_a_miss(self):
+        class DownRedis:
+            def mget(self, keys):
+                raise ConnectionError("redis down")
+
+        assert RedisMetadataCache(DownRedis()).get_many(1, ["m1"]) == {}
+
+    def test_entries_are_encrypted(self):
+        class DictRedis(dict):
+            def pipeline(self, transaction=False):
+                return SimpleNamespace(setex=lambda key, ttl, value: self.__setitem__(key, value), execute=lambda: None)
+
+            def mget(self, keys):
+                return [self.get(k) for k in keys]
+
+        client = DictRedis()
+        cache = RedisMetadataCache(client)
+        cache.set_many(1, [_item("m1", subject="Your statement")])
+        assert b"statement" not in b"".join(client.values())
+        assert cache.get_many(1, ["m1"]) == {"m1": _item("m1", subject="Your statement")}
+
+
+class FakeMailbox:
+    """
+    A mailbox of {message_id: labels} with a Gmail-style history log. Serves
+    _post_batch and the history/profile GETs; records which IDs were fetched.
+    """
+
+    def __init__(self, labels):
+        self.labels = dict(labels)
+        self.history_id = 100
+        self.history = []   # (history_id, record)
+        self.fetched = []
+        self.history_calls = 0
+        self.history_expired = False
+
+    def relabel(self, mid, labels):
+        self.history_id += 1
+        self.history.append((self.history_id, {"labelsAdded": [{"message": {"id": mid}, "labelIds": labels}]}))
+        self.labels[mid] = labels
+
+    def delete(self, mid):
+        self.history_id += 1
+        self.history.append((self.history_id, {"messagesDeleted": [{"message": {"id": mid}}]}))
+        del self.labels[mid]
+
+    async def get(self, path, params, operation_name, cost, error_cls=GmailFetchError):
+        if path == "/profile":
+            return {"historyId": str(self.history_id)}
+        self.history_calls += 1
+        if self.history_expired:
+            raise error_cls("expired", status_code=404)
+        since = int(params["startHistoryId"])
+        return {"history": [r for h, r in self.history if h > since], "historyId": str(self.history_id)}
+
+    async def post_batch(self, ids, reauth=True):
+        self.fetched.append(list(ids))
+        return {
+            i: (200, json.dumps({
+                "id": mid, "labelIds": self.labels[mid], "sizeEstimate": 5,
+                "payload": {"headers": [{"name": "From", "value": "deals@shop.com"}]},
+            })) if mid in self.labels else (404, "{}")
+            for i, mid in enumerate(ids)
+        }
+
+
+def _scan(cache, mailbox, ids):
+    fetcher = AsyncGmailFetcher(credentials=None, user_id=7, cache=cache)
+    fetcher._get_with_retry = mailbox.get
+    fetcher._post_batch = mailbox.post_batch
+    return {r["id"]: r["labels"] for r in asyncio.run(fetcher._fetch_batch(1, ids))}
+
+
+class TestFetcherUsesCache:
+    """Test that cached messages skip messages.get until the history says they changed"""
+
+    def test_unchanged_rescan_fetches_nothing(self):
+        cache = InMemoryMetadataCache()
+        mailbox = FakeMailbox({"m1": ["INBOX"], "m2": ["CATEGORY_PROMOTIONS"]})
+        first = _scan(cache, mailbox, ["m1", "m2"])
+        assert cache.get_history_id(7) == "100"
+
+        second = _scan(cache, mailbox, ["m1", "m2"])
+        assert mailbox.fetched == [["m1", "m2"]]
+        assert mailbox.history_calls == 1
+        assert second == first
+
+    def test_relabelled_messages_are_refetched(self):
+        cache = InMemoryMetadataCache()
+        mailbox = FakeMailbox({"m1": ["INBOX"], "m2": ["CATEGORY_PROMOTIONS"], "m3": ["INBOX"]})
+        _scan(cache, mailbox, ["m1", "m2", "m3"])
+
+        mailbox.relabel("m2", ["CATEGORY_PROMOTIONS", "STARRED"])
+        mailbox.delete("m3")
+        second = _scan(cache, mailbox, ["m1", "m2", "m3"])
+
+        assert mailbox.fetched[-1] == ["m2", "m3"]
+        assert second == {"m1": ["INBOX"], "m2": ["CATEGORY_PROMOTIONS", "STARRED"]}
+        assert cache.get_history_id(7) == "102"
+
+    def test_expired_history_drops_the_cache(self):
+        cache = InMemoryMetadataCache()
+        mailbox = FakeMailbox({"m1": ["INBOX"]})
+        _scan(cache, mailbox, ["m1"])
+        mailbox.history_expired = True
+        _scan(cache, mailbox, ["m1"])
+        assert mailbox.fetched == [["m1"], ["m1"]]
+
+    def test_entries_without_cursor_are_not_served(self):
+        cache = InMemoryMetadataCache()
+        cache.set_many(7, [_item("m1", labels=["CATEGORY_PROMOTIONS"])])
+        mailbox = FakeMailbox({"m1": ["INBOX", "STARRED"]})
+        assert _scan(cache, mailbox, ["m1"]) == {"m1": ["INBOX", "STARRED"]}
+
+    def test_rescan_after_cleanup_sees_fresh_labels(self, monkeypatch):
+        """scan -> apply -> re-scan: the trashed message is reported with its new labels"""
+        cache = InMemoryMetadataCache()
+        mailbox = FakeMailbox({"m1": ["INBOX", "CATEGORY_PROMOTIONS"], "m2": ["INBOX"]})
+        assert _scan(cache, mailbox, ["m1", "m2"])["m1"] == ["INBOX", "CATEGORY_PROMOTIONS"]
+
+        # apply_cleanup trashes m1 (Gmail side) and evicts it (cache side)
+        monkeypatch.setattr(api, "get_user_credentials", lambda db, user_id: SimpleNamespace(credentials=None))
+        monkeypatch.setattr(api, "build_gmail_service", lambda creds: object())
+        monkeypatch.setattr(api, "sync_refreshed_token", lambda user_id: None)
+        monkeypatch.setattr(api, "mark_applied", lambda db, user_id, ids: len(ids))
+        monkeypatch.setattr(api, "get_metadata_cache", lambda: cache)
+
+        def trash(service, ids):
+            for mid in ids:
+                mailbox.relabel(mid, ["TRASH", "CATEGORY_PROMOTIONS"])
+            return {"processed": len(ids), "failed": 0, "succeeded_ids": list(ids), "chunks": []}
+
+        monkeypatch.setattr(api, "trash_messages", trash)
+        api.apply_cleanup(CurrentUser(user_id=7, email="cache@example.com"), ["m1"], "trash", db=SimpleNamespace(commit=lambda: None))
+        assert cache.get_many(7, ["m1"]) == {}
+
+        # The user stars m2 in Gmail - only the history knows
+        mailbox.relabel("m2", ["INBOX", "STARRED"])
+        assert _scan(cache, mailbox, ["m1", "m2"]) == {
+            "m1": ["TRASH", "CATEGORY_PROMOTIONS"],
+            "m2": ["INBOX", "STARRED"],
+        }
+        assert mailbox.fetched[-1] == ["m1", "m2"]
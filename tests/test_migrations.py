@@ -0,0 +1,62 @@
+"""
+Tests for the Alembic migrations in db/migrations
+"""
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+
+from db.models import Base, MailDecisionLog, OAuthToken
+
+
+def _config(url):
+    config = Config("alembic.ini")
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def _indexes(url, table="mail_decision_logs"):
+    engine = create_engine(url)
+    try:
+        return {i["name"] for i in inspect(engine).get_indexes(table)}
+    finally:
+        engine.dispose()
+
+
+class TestMigrations:
+    """Upgrade paths end at the schema the models declare"""
+
+    def test_fresh_database_matches_models(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'fresh.db'}"
+        command.upgrade(_config(url), "head")
+        assert _indexes(url) == {i.name for i in MailDecisionLog.__table__.indexes}
+
+    def test_upgrades_create_all_database_without_stamp(self, tmp_path):
+        """Databases the app created with create_all migrate without `alembic stamp`"""
+        url = f"sqlite:///{tmp_path / 'legacy.db'}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+
+        command.upgrade(_config(url), "head")
+        assert _indexes(url) == {i.name for i in MailDecisionLog.__table__.indexes}
+
+    def test_downgrade_restores_user_id_index(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'down.db'}"
+        command.upgrade(_config(url), "head")
+        command.downgrade(_config(url), "0001")
+        indexes = _indexes(url)
+        assert "ix_mail_decision_logs_user_id" in indexes
+        assert "ix_mail_decision_logs_user_created" not in indexes
+
+    def test_upgrade_adds_token_expiry_index(self, tmp_path):
+        """A create_all database from before the expiry index gets it on upgrade"""
+        url = f"sqlite:///{tmp_path / 'tokens.db'}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_oauth_tokens_expiry"))
+        engine.dispose()
+
+        command.upgrade(_config(url), "head")
+        assert _indexes(url, "oauth_tokens") == {i.name for i in OAuthToken.__table__.indexes}
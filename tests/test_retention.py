@@ -0,0 +1,171 @@
+"""
+Tests for mail_decision_logs retention and compaction (SQLite fallback paths)
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from db.bulk import insert_decision_logs
+from db.models import MailDecisionLog, UserDailyStats
+from db.retention import (
+    add_months,
+    compact_previews,
+    compaction_cutoff,
+    delete_expired_rows,
+    ensure_partitions,
+    partition_name,
+    run_retention,
+)
+from db.session import SessionLocal
+from db.stats_rollup import delete_user_stats, rebuild_stats
+
+USER_ID = 6161
+
+
+def _row(message_id, created_at, proposed="delete", applied=False):
+    return {
+        "user_id": USER_ID,
+        "message_id": message_id,
+        "sender_hash": "s",
+        "size_bytes": 1000,
+        "proposed": proposed,
+        "confidence": 90,
+        "applied": applied,
+        "created_at": created_at,
+    }
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.query(MailDecisionLog).filter(MailDecisionLog.user_id == USER_ID).delete()
+    delete_user_stats(session, USER_ID)
+    session.commit()
+    session.close()
+
+
+def _message_ids(db):
+    return sorted(
+        (m, str(c.date())) for m, c in
+        db.query(MailDecisionLog.message_id, MailDecisionLog.created_at).filter(MailDecisionLog.user_id == USER_ID)
+    )
+
+
+class TestMonths:
+    """Month arithmetic and partition naming"""
+
+    def test_add_months_wraps_years(self):
+        assert add_months(date(2026, 11, 15), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 31), -1) == date(2025, 12, 1)
+
+    def test_partition_name(self):
+        assert partition_name(date(2026, 3, 1)) == "mail_decision_logs_y2026m03"
+
+    def test_no_partitions_outside_postgres(self, db):
+        assert ensure_partitions(db) == []
+
+
+class TestCompaction:
+    """Superseded preview rows are removed, the latest decision stays"""
+
+    def test_keeps_latest_and_applied(self, db):
+        old = datetime.now() - timedelta(days=60)
+        insert_decision_logs(db, [
+            _row("a", old), _row("a", old + timedelta(days=1)),   # older preview superseded
+            _row("b", old, applied=True), _row("b", old + timedelta(days=1)),  # applied rows are kept
+            _row("c", old),                                       # only decision for c
+        ])
+        insert_decision_logs(db, [_row("a", datetime.now())])
+        db.commit()
+
+        assert compact_previews(db, datetime.now() - timedelta(days=30)) == 2
+        remaining = _message_ids(db)
+        assert [m for m, _ in remaining] == ["a", "b", "b", "c"]
+
+    def test_recent_rows_untouched(self, db):
+        now = datetime.now()
+        insert_decision_logs(db, [_row("a", now - timedelta(days=2)), _row("a", now - timedelta(days=1))])
+        db.commit()
+        assert compact_previews(db, now - timedelta(days=30)) == 0
+
+
+class TestCompactedStats:
+    """Compaction must not change the stats of the days it compacted"""
+
+    def _day(self, db, day):
+        return db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID, UserDailyStats.day == day).one()
+
+    def test_rebuild_keeps_compacted_days(self, db):
+        now = datetime.now()
+        old = now - timedelta(days=60)
+        insert_decision_logs(db, [_row("a", old), _row("b", old, proposed="keep"), _row("c", old)])
+        insert_decision_logs(db, [_row("a", now - timedelta(days=1)), _row("b", now - timedelta(days=1))])
+        db.commit()
+        counted = self._day(db, old.date())
+        assert (counted.scanned, counted.delete_count) == (3, 2)
+
+        assert compact_previews(db, compaction_cutoff(now)) == 2
+        rebuild_stats(db, USER_ID, now=now)
+
+        # Only "c" is left in the log for that day, the rollup still counts all three
+        compacted_day = self._day(db, old.date())
+        assert (compacted_day.scanned, compacted_day.delete_count, compacted_day.keep_count) == (3, 2, 1)
+        recent = self._day(db, (now - timedelta(days=1)).date())
+        assert recent.scanned == 2
+
+    def test_rebuild_fills_missing_compacted_days(self, db):
+        """Days from before the rollup existed are still added"""
+        now = datetime.now()
+        old = now - timedelta(days=60)
+        insert_decision_logs(db, [_row("a", old), _row("c", old)])
+        db.commit()
+        delete_user_stats(db, USER_ID)
+        db.commit()
+
+        rebuild_stats(db, USER_ID, now=now)
+        assert self._day(db, old.date()).scanned == 2
+
+    def test_recent_days_are_recomputed(self, db):
+        now = datetime.now()
+        recent = now - timedelta(days=2)
+        insert_decision_logs(db, [_row("a", recent)])
+        db.commit()
+        db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).update({UserDailyStats.scanned: 99})
+        db.commit()
+
+        rebuild_stats(db, USER_ID, now=now)
+        assert self._day(db, recent.date()).scanned == 1
+
+
+class TestRetention:
+    """Expired rows are summarized into the rollup before they go"""
+
+    def test_expired_rows_keep_their_stats(self, db):
+        old = datetime(2020, 5, 10, 12)
+        insert_decision_logs(db, [_row("a", old, applied=True), _row("b", old)])
+        insert_decision_logs(db, [_row("c", datetime.now())])
+        db.commit()
+        # Simulate history from before the rollup existed
+        db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID, UserDailyStats.day == old.date()).delete()
+        db.commit()
+
+        assert delete_expired_rows(db, date(2021, 1, 1)) == 2
+        assert [m for m, _ in _message_ids(db)] == ["c"]
+        summary = db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID, UserDailyStats.day == old.date()).one()
+        assert (summary.scanned, summary.deleted) == (2, 1)
+
+        # A rebuild only covers days that still have logs
+        rebuild_stats(db, USER_ID)
+        assert db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).count() == 2
+
+    def test_run_retention(self, db):
+        now = datetime(2026, 10, 17)
+        insert_decision_logs(db, [_row("a", datetime(2025, 9, 30)), _row("b", datetime(2025, 10, 1))])
+        db.commit()
+
+        summary = run_retention(db, now=now)
+        assert summary["rows_deleted"] == 1
+        assert summary["partitions_created"] == summary["partitions_dropped"] == []
+        assert [m for m, _ in _message_ids(db)] == ["b"]
@@ -0,0 +1,182 @@
+"""
+Unit tests for sampling scans (stratification, allocation, estimation)
+"""
+
+import asyncio
+import random
+from types import SimpleNamespace
+import pytest
+from services.gateway.deps import CurrentUser
+from services.gmail_connector import api
+from services.gmail_connector.query import ScanFilters
+from services.gmail_connector.sampling import (
+    DATE_BANDS, STRATA_CATEGORIES, Stratum, allocate, build_strata, estimate, sample_mailbox
+)
+
+
+def _items(decisions, size=1_000_000):
+    return [{"id": f"m{i}", "decision": d, "size": size} for i, d in enumerate(decisions)]
+
+
+class TestBuildStrata:
+    """Test splitting the mailbox into date band x category strata"""
+
+    def test_whole_mailbox(self):
+        strata = build_strata(0)
+        assert len(strata) == len(DATE_BANDS) * len(STRATA_CATEGORIES)
+        assert strata[0].query == "newer_than:7d category:primary"
+        assert strata[-1].query == "older_than:3650d category:forums"
+
+    def test_days_back_cuts_bands(self):
+        queries = [s.query for s in build_strata(60, ScanFilters(categories=("promotions",)))]
+        assert queries == [
+            "newer_than:7d category:promotions",
+            "newer_than:30d older_than:7d category:promotions",
+            "newer_than:60d older_than:30d category:promotions",
+        ]
+
+    def test_filters_apply_to_every_stratum(self):
+        strata = build_strata(365, ScanFilters(categories=("social",), older_than_days=100, min_size_kb=1))
+        assert [s.query for s in strata] == [
+            "newer_than:180d older_than:100d category:social larger:1024",
+            "newer_than:365d older_than:180d category:social larger:1024",
+        ]
+
+
+class TestAllocate:
+    """Test proportional allocation of the sample budget"""
+
+    def test_proportional(self):
+        assert allocate([8000, 2000], [500, 500], 100) == [80, 20]
+
+    def test_minimum_per_stratum_within_budget(self):
+        alloc = allocate([9990, 10, 0], [500, 10, 0], 100)
+        assert alloc[1] == 2 and alloc[2] == 0
+        assert sum(alloc) == 100
+
+    def test_capped_by_frame(self):
+        assert allocate([100_000, 100], [500, 100], 1000) == [500, 2]
+
+    def test_empty_mailbox(self):
+        assert allocate([0, 0], [0, 0], 100) == [0, 0]
+
+    def test_never_over_budget(self):
+        populations = [1000 * (i + 1) for i in range(45)]
+        for sample_size in (90, 100, 137, 500):
+            assert sum(allocate(populations, [500] * 45, sample_size)) <= sample_size
+
+    def test_budget_below_minimums_rejected(self):
+        with pytest.raises(ValueError, match="at least 90"):
+            allocate([1000] * 45, [500] * 45, 50)
+
+
+class TestEstimate:
+    """Test extrapolation and confidence intervals"""
+
+    def test_fully_sampled_stratum_is_exact(self):
+        stratum = Stratum("q", population=4, items=_items(["delete", "delete", "keep", "review"]))
+        result = estimate([stratum])
+        assert result["counts"]["delete"] == {"estimate": 2, "low": 2, "high": 2}
+        assert result["approx_size_mb"] == {"estimate": 4.0, "low": 4.0, "high": 4.0}
+
+    def test_extrapolates_with_interval(self):
+        stratum = Stratum("q", population=10_000, frame=["x"] * 500, items=_items(["delete"] * 30 + ["keep"] * 70))
+        result = estimate([stratum])
+        delete = result["counts"]["delete"]
+        assert delete["estimate"] == 3000
+        assert delete["low"] < 3000 < delete["high"]
+        # 1.96 * N * sqrt((1 - n/N) * s^2 / n), s^2 = p(1-p) * n/(n-1), n = 100, p = 0.3
+        assert delete["high"] - 3000 == pytest.approx(1.96 * 10_000 * (0.99 * 0.21 / 99) ** 0.5, abs=1)
+        assert result["delete_size_mb"]["estimate"] == 3000.0
+        assert result["frame_coverage"] == 0.05
+        assert result["biased"] is True
+
+    def test_strata_add_up(self):
+        strata = [
+            Stratum("a", population=100, items=_items(["delete"] * 10)),
+            Stratum("b", population=900, items=_items(["keep"] * 10)),
+        ]
+        result = estimate(strata)
+        assert result["total_items"] == 1000
+        assert result["counts"]["delete"]["estimate"] == 100
+        assert result["counts"]["keep"]["estimate"] == 900
+        assert result["sampled"] == 20
+
+    def test_low_never_negative(self):
+        stratum = Stratum("q", population=10_000, items=_items(["delete"] + ["keep"] * 9))
+        assert estimate([stratum])["counts"]["delete"]["low"] >= 0
+
+
+class FakeFetcher:
+    """list_frame/iter_ids over an in-memory mailbox of {category: [(id, age in days)]}"""
+
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+        self.fetched = []
+        self.listed = []
+
+    async def list_frame(self, query):
+        self.listed.append(query)
+        terms = dict(term.split(":") for term in query.split())
+        newer = int(terms["newer_than"].rstrip("d")) if "newer_than" in terms else None
+        older = int(terms.get("older_than", "0d").rstrip("d"))
+        ids = [mid for mid, age in self.mailbox.get(terms["category"], [])
+               if age >= older and (newer is None or age < newer)]
+        return ids[:500], len(ids), len(ids) <= 500
+
+    async def iter_ids(self, message_ids):
+        self.fetched.extend(message_ids)
+        yield [{"id": mid, "from": "deals@shop.com", "subject": "Sale", "labels": ["CATEGORY_PROMOTIONS"], "size": 2000}
+               for mid in message_ids]
+
+
+class TestSampleMailbox:
+    """Test drawing and classifying the sample"""
+
+    def test_fetches_only_the_sample(self):
+        strata = build_strata(7, ScanFilters(categories=("promotions", "social")))
+        fetcher = FakeFetcher({
+            "promotions": [(f"p{i}", i % 7) for i in range(2000)],
+            "social": [(f"s{i}", 0) for i in range(50)],
+        })
+        strata, msgs_meta = asyncio.run(sample_mailbox(fetcher, strata, 40, random.Random(1)))
+        assert len(fetcher.fetched) == len(msgs_meta) == 40
+        assert sum(len(s.items) for s in strata) == 40
+        assert all(set(s.sample) <= set(s.frame) for s in strata)
+        assert estimate(strata)["total_items"] == 2050
+
+    def test_incomplete_frames_are_split_until_complete(self):
+        strata = build_strata(7, ScanFilters(categories=("promotions",)))
+        fetcher = FakeFetcher({"promotions": [(f"p{i}", i % 7) for i in range(2000)]})
+
+        strata, _ = asyncio.run(sample_mailbox(fetcher, strata, 100, random.Random(1)))
+        assert all(len(s.frame) == s.population for s in strata)
+        assert sum(s.population for s in strata) == 2000
+        assert "newer_than:7d older_than:3d category:promotions" in fetcher.listed
+        result = estimate(strata)
+        assert result["frame_coverage"] == 1.0
+        assert result["biased"] is False
+
+    def test_a_dense_single_day_is_flagged_biased(self):
+        strata = build_strata(7, ScanFilters(categories=("promotions",)))
+        fetcher = FakeFetcher({"promotions": [(f"p{i}", 0) for i in range(800)]})
+
+        strata, _ = asyncio.run(sample_mailbox(fetcher, strata, 100, random.Random(1)))
+        assert [s.query for s in strata if s.population] == ["newer_than:1d category:promotions"]
+        result = estimate(strata)
+        assert result["frame_coverage"] < 1
+        assert result["biased"] is True
+
+    def test_splits_stop_when_the_sample_cannot_cover_more_strata(self):
+        strata = build_strata(7, ScanFilters(categories=("promotions",)))
+        fetcher = FakeFetcher({"promotions": [(f"p{i}", i % 7) for i in range(2000)]})
+
+        strata, _ = asyncio.run(sample_mailbox(fetcher, strata, 4, random.Random(1)))
+        assert len(strata) == 2
+        assert estimate(strata)["biased"] is True
+
+    def test_sample_too_small_rejected_before_listing(self, monkeypatch):
+        monkeypatch.setattr(api, "get_user_credentials", lambda db, user_id: SimpleNamespace(credentials=None))
+        monkeypatch.setattr(api, "_sample_and_classify", pytest.fail)
+        with pytest.raises(ValueError, match="at least 90"):
+            api.sample_scan(CurrentUser(user_id=1, email="s@example.com"), 0, 50, db=object())
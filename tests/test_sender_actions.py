@@ -0,0 +1,96 @@
+"""
+Tests for sender-scoped bulk actions (search -> batchModify, no metadata fetch)
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.gateway.deps import CurrentUser, get_current_user
+from services.gateway.main import app
+from services.gmail_connector import api
+from services.gmail_connector.query import ScanFilters
+
+USER = CurrentUser(user_id=4343, email="senders@example.com")
+
+
+@pytest.fixture
+def gmail(monkeypatch):
+    """Stub credentials and Gmail; records searches and cleanups"""
+    calls = SimpleNamespace(queries=[], applied=[])
+
+    def list_matching_ids(service, query, limit):
+        calls.queries.append((query, limit))
+        return [f"m{i}" for i in range(3)], False
+
+    def apply_cleanup(user, message_ids, mode, db=None):
+        calls.applied.append((message_ids, mode))
+        return {"deleted": len(message_ids), "labeled": 0, "failed": 0, "chunks": []}
+
+    monkeypatch.setattr(api, "get_user_credentials", lambda db, user_id: SimpleNamespace(credentials=None))
+    monkeypatch.setattr(api, "build_gmail_service", lambda creds: object())
+    monkeypatch.setattr(api, "sync_refreshed_token", lambda user_id: None)
+    monkeypatch.setattr(api, "list_matching_ids", list_matching_ids)
+    monkeypatch.setattr(api, "apply_cleanup", apply_cleanup)
+    return calls
+
+
+class TestApplySenderAction:
+
+    def test_search_goes_straight_to_cleanup(self, gmail):
+        filters = ScanFilters(senders=("news@shop.com",), categories=("promotions",))
+        result = api.apply_sender_action(USER, filters, "trash", days_back=90, dry_run=False, db=object())
+
+        assert gmail.queries == [("newer_than:90d from:news@shop.com category:promotions", api.MAX_SENDER_ACTION_MESSAGES)]
+        assert gmail.applied == [(["m0", "m1", "m2"], "trash")]
+        assert result["matched"] == 3 and result["deleted"] == 3
+        assert result["truncated"] is False
+
+    def test_dry_run_by_default(self, gmail):
+        result = api.apply_sender_action(USER, ScanFilters(senders=("shop.com",)), "trash", db=object())
+        assert gmail.applied == []
+        assert result == {"query": "from:shop.com", "matched": 3, "truncated": False, "dry_run": True}
+
+    def test_label_only_skips_labelled_messages(self, gmail):
+        api.apply_sender_action(USER, ScanFilters(senders=("shop.com",)), "label_only", dry_run=False, db=object())
+        assert gmail.queries[0][0] == "from:shop.com -label:deklutter_review"
+
+    def test_limit_is_capped(self, gmail):
+        api.apply_sender_action(USER, ScanFilters(senders=("shop.com",)), "trash", limit=10**9, db=object())
+        assert gmail.queries[0][1] == api.MAX_SENDER_ACTION_MESSAGES
+
+    def test_sender_required(self, gmail):
+        with pytest.raises(ValueError):
+            api.apply_sender_action(USER, ScanFilters(categories=("promotions",)), "trash", db=object())
+
+    @pytest.mark.parametrize("sender", ["paypal.com", "alerts@mybank.com", "irs.gov", "gmail.com", "@Outlook.com"])
+    def test_protected_and_free_mail_senders_rejected(self, gmail, sender):
+        with pytest.raises(ValueError, match="protected|free-mail"):
+            api.apply_sender_action(USER, ScanFilters(senders=(sender,)), "trash", dry_run=False, db=object())
+        assert gmail.queries == [] and gmail.applied == []
+
+    def test_address_at_free_mail_domain_allowed(self, gmail):
+        result = api.apply_sender_action(USER, ScanFilters(senders=("friend@gmail.com",)), "trash", db=object())
+        assert result["matched"] == 3
+
+
+class TestSenderActionEndpoint:
+
+    @pytest.fixture(autouse=True)
+    def as_user(self):
+        app.dependency_overrides[get_current_user] = lambda: USER
+        yield
+        app.dependency_overrides.pop(get_current_user, None)
+
+    @pytest.mark.parametrize("body", [
+        {"senders": []},
+        {"senders": ["a OR b"]},
+        {"senders": ["shop.com"], "categories": ["newsletters"]},
+        {"senders": ["gmail.com"]},
+        {"senders": ["statements@paypal.com"], "dry_run": False},
+    ])
+    def test_invalid_requests_rejected(self, body):
+        with TestClient(app) as client:
+            response = client.post("/gmail/apply/senders", json=body)
+        assert response.status_code == 400
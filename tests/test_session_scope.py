@@ -0,0 +1,89 @@
+"""
+Tests for session_scope, the session provider for code outside requests
+"""
+
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import text
+
+import db.session as session_module
+from db.session import session_scope, pool_status, threaded_session_scope
+
+
+class TestSessionScope:
+    """Tests for session_scope"""
+
+    def test_session_usable_and_closed(self):
+        """Session runs queries inside the block and is closed after it"""
+        with session_scope("test") as db:
+            assert db.execute(text("SELECT 1")).scalar() == 1
+            assert pool_status()["scoped_sessions"]["test"] == 1
+        assert "test" not in pool_status()["scoped_sessions"]
+        assert not db.in_transaction()
+
+    def test_rolls_back_and_reraises(self):
+        """Exceptions propagate after the session is rolled back and closed"""
+        with pytest.raises(RuntimeError):
+            with session_scope("failing") as db:
+                db.execute(text("SELECT 1"))
+                raise RuntimeError("boom")
+        assert "failing" not in pool_status()["scoped_sessions"]
+        assert not db.in_transaction()
+
+    def test_nested_scopes_counted(self):
+        """Concurrently open scopes are counted per name"""
+        with session_scope("nested"):
+            with session_scope("nested"):
+                assert pool_status()["scoped_sessions"]["nested"] == 2
+            assert pool_status()["scoped_sessions"]["nested"] == 1
+
+
+class TestPoolStatus:
+    """Tests for pool_status"""
+
+    def test_reports_pool_class(self):
+        status = pool_status()
+        assert status["pool_class"]
+        assert isinstance(status["scoped_sessions"], dict)
+
+
+class TestThreadedSessionScope:
+    """Tests for threaded_session_scope"""
+
+    def test_session_opened_and_closed_off_the_loop(self, monkeypatch):
+        """Neither opening nor closing the session runs on the event loop thread"""
+        threads = []
+
+        class RecordingSession:
+            def __init__(self):
+                threads.append(("open", threading.get_ident()))
+
+            def rollback(self):
+                pass
+
+            def close(self):
+                threads.append(("close", threading.get_ident()))
+
+        monkeypatch.setattr(session_module, "SessionLocal", RecordingSession)
+
+        async def use():
+            async with threaded_session_scope("threaded") as db:
+                assert pool_status()["scoped_sessions"]["threaded"] == 1
+                return threading.get_ident()
+
+        loop_thread = asyncio.run(use())
+        assert [event for event, _ in threads] == ["open", "close"]
+        assert all(thread != loop_thread for _, thread in threads)
+        assert "threaded" not in pool_status()["scoped_sessions"]
+
+    def test_rolls_back_and_reraises(self):
+        async def fail():
+            async with threaded_session_scope("threaded_failing") as db:
+                db.execute(text("SELECT 1"))
+                raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(fail())
+        assert "threaded_failing" not in pool_status()["scoped_sessions"]
@@ -5,8 +5,10 @@ Unit tests for statistics endpoints
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
-from db.session import SessionLocal
+from sqlalchemy import event
+from db.session import SessionLocal, get_async_engine
 from db.models import User, MailDecisionLog
+from services.gateway.deps import CurrentUser, get_current_user_async
 from services.gateway.main import app
 
 client = TestClient(app)
@@ -53,7 +55,6 @@ class TestStatsEndpoint:
                 user_id=self.test_user.id,
                 message_id=f"msg_{i}",
                 sender_hash=f"sender_{i % 3}",
-                subject=f"Test email {i}",
                 size_bytes=100000,  # 100KB each
                 proposed="delete",
                 confidence=85,
@@ -77,14 +78,65 @@ class TestStatsEndpoint:
 class TestTopSenders:
     """Test /api/stats/top-senders endpoint"""
     
+    USER_ID = 5151
+    
+    @pytest.fixture(autouse=True)
+    def decisions(self):
+        """Sender s0: 3 deletes, s1: 2 deletes, s2: 1 delete + keeps that don't count"""
+        db = SessionLocal()
+        rows = [("s0", "a.com", "delete")] * 3 + [("s1", "b.com", "delete")] * 2 + \
+               [("s2", None, "delete")] + [("s2", None, "keep")] * 4
+        db.add_all([
+            MailDecisionLog(
+                user_id=self.USER_ID,
+                message_id=f"msg_{i}",
+                sender_hash=sender,
+                sender_domain=domain,
+                size_bytes=1024 * 1024,
+                proposed=proposed,
+                confidence=90
+            )
+            for i, (sender, domain, proposed) in enumerate(rows)
+        ])
+        db.commit()
+        app.dependency_overrides[get_current_user_async] = lambda: CurrentUser(user_id=self.USER_ID, email="top@example.com")
+        yield
+        app.dependency_overrides.pop(get_current_user_async, None)
+        db.query(MailDecisionLog).filter(MailDecisionLog.user_id == self.USER_ID).delete()
+        db.commit()
+        db.close()
+    
     def test_top_senders_grouping(self):
         """Top senders should be grouped by sender_hash"""
-        # This would test the grouping logic
-        pass
+        data = client.get("/api/stats/top-senders").json()
+        senders = [(s["sender_hash"], s["email_count"], s["percentage"]) for s in data["top_spam_senders"]]
+        assert senders == [("s0", 3, 50.0), ("s1", 2, 33.3), ("s2", 1, 16.7)]
+        assert data["top_spam_senders"][0]["size_mb"] == 3.0
+        assert data["top_spam_senders"][0]["sender_domain"] == "a.com"
     
     def test_top_senders_limit(self):
-        """Top senders should respect limit parameter"""
-        pass
+        """Top senders should respect limit parameter, shares stay relative to all senders"""
+        data = client.get("/api/stats/top-senders", params={"limit": 1}).json()
+        assert data["total_senders"] == 1
+        assert data["top_spam_senders"][0]["percentage"] == 50.0
+    
+    def test_top_senders_single_query(self):
+        """Counts and shares come from one statement, not one count per sender"""
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        engine = get_async_engine().sync_engine
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            client.get("/api/stats/top-senders", params={"limit": 50})
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert len([s for s in statements if "mail_decision_logs" in s]) == 1
+    
+    def test_top_senders_by_domain(self):
+        """by=domain rolls senders up per domain"""
+        data = client.get("/api/stats/top-senders", params={"by": "domain"}).json()
+        domains = [(s["sender_domain"], s["email_count"]) for s in data["top_spam_senders"]]
+        assert domains == [("a.com", 3), ("b.com", 2), ("unknown", 1)]
 
 
 class TestTimeline:
@@ -0,0 +1,140 @@
+"""
+Tests for the per-day statistics rollup (user_daily_stats)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db.bulk import insert_decision_logs
+from db.models import MailDecisionLog, UserDailyStats
+from db.session import Base, SessionLocal, engine
+from db.stats_rollup import delete_user_stats, mark_applied, rebuild_stats
+from services.gateway.deps import CurrentUser, get_current_user_async
+from services.gateway.main import app
+
+USER_ID = 4242
+COUNTED = ("scanned", "scanned_bytes", "delete_count", "delete_bytes", "review_count",
+           "review_bytes", "keep_count", "keep_bytes", "applied", "deleted", "deleted_bytes")
+
+
+def _row(i, proposed, size=1000, created_at=None):
+    row = {
+        "user_id": USER_ID,
+        "message_id": f"m{i}",
+        "sender_hash": f"s{i % 2}",
+        "size_bytes": size,
+        "proposed": proposed,
+        "confidence": 90,
+    }
+    if created_at:
+        row["created_at"] = created_at
+    return row
+
+
+def _snapshot(db):
+    rows = db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).order_by(UserDailyStats.day).all()
+    return [(str(r.day), *(getattr(r, c) for c in COUNTED)) for r in rows]
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.query(MailDecisionLog).filter(MailDecisionLog.user_id == USER_ID).delete()
+    delete_user_stats(session, USER_ID)
+    session.commit()
+    session.close()
+
+
+class TestIncrementalRollup:
+    """Counters follow inserts and applies"""
+
+    def test_insert_counts_by_decision(self, db):
+        insert_decision_logs(db, [_row(0, "delete", 2000), _row(1, "delete"), _row(2, "keep"), _row(3, "review")])
+        db.commit()
+
+        stats = db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).one()
+        assert (stats.scanned, stats.scanned_bytes) == (4, 5000)
+        assert (stats.delete_count, stats.delete_bytes) == (2, 3000)
+        assert (stats.keep_count, stats.review_count) == (1, 1)
+        assert stats.applied == stats.deleted == 0
+        assert stats.last_scan_at is not None
+
+    def test_repeated_scans_accumulate(self, db):
+        insert_decision_logs(db, [_row(0, "keep")])
+        db.commit()
+        insert_decision_logs(db, [_row(1, "keep")])
+        db.commit()
+        assert db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).one().scanned == 2
+
+    def test_apply_counts_only_newly_applied(self, db):
+        insert_decision_logs(db, [_row(0, "delete", 2000), _row(1, "review"), _row(2, "delete")])
+        db.commit()
+
+        assert mark_applied(db, USER_ID, ["m0", "m1"]) == 2
+        assert mark_applied(db, USER_ID, ["m0", "m1"]) == 0  # already applied
+        db.commit()
+
+        stats = db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID).one()
+        assert (stats.applied, stats.deleted, stats.deleted_bytes) == (2, 1, 2000)
+
+    def test_apply_lands_on_the_day_decisions_were_logged(self, db):
+        earlier = datetime.now() - timedelta(days=3)
+        insert_decision_logs(db, [_row(0, "delete", created_at=earlier), _row(1, "delete")])
+        db.commit()
+        mark_applied(db, USER_ID, ["m0"])
+        db.commit()
+
+        by_day = {str(r.day): r for r in db.query(UserDailyStats).filter(UserDailyStats.user_id == USER_ID)}
+        assert by_day[str(earlier.date())].deleted == 1
+        assert len(by_day) == 2
+
+    def test_matches_full_rebuild(self, db):
+        earlier = datetime.now() - timedelta(days=10)
+        insert_decision_logs(db, [_row(i, ("delete", "review", "keep")[i % 3], 100 * i, earlier) for i in range(9)])
+        insert_decision_logs(db, [_row(i, "delete", 50) for i in range(9, 15)])
+        db.commit()
+        mark_applied(db, USER_ID, ["m0", "m3", "m4", "m10"])
+        db.commit()
+
+        incremental = _snapshot(db)
+        rebuild_stats(db, USER_ID)
+        assert _snapshot(db) == incremental
+
+
+class TestStatsEndpoints:
+    """Endpoints read the rollup"""
+
+    @pytest.fixture(autouse=True)
+    def as_user(self):
+        app.dependency_overrides[get_current_user_async] = lambda: CurrentUser(user_id=USER_ID, email="rollup@example.com")
+        yield
+        app.dependency_overrides.pop(get_current_user_async, None)
+
+    def test_stats_summary_and_timeline(self, db):
+        insert_decision_logs(db, [_row(0, "delete", 1024 * 1024), _row(1, "delete", 1024 * 1024), _row(2, "keep")])
+        db.commit()
+        mark_applied(db, USER_ID, ["m0", "m1"])
+        db.commit()
+
+        with TestClient(app) as client:
+            stats = client.get("/api/stats").json()
+            summary = client.get("/api/stats/summary").json()
+            timeline = client.get("/api/stats/timeline").json()
+
+        assert stats["all_time"]["total_scanned"] == 3
+        assert stats["all_time"]["total_deleted"] == 2
+        assert stats["all_time"]["space_saved_mb"] == 2.0
+        assert stats["all_time"]["breakdown"]["delete"]["count"] == 2
+        assert stats["last_7_days"] == {"scanned": 3, "deleted": 2}
+        assert summary["total_deleted"] == 2 and summary["has_data"]
+        assert timeline["timeline"][0]["scanned"] == 3
+        assert timeline["timeline"][0]["deleted"] == 2
+
+    def test_no_data(self, db):
+        with TestClient(app) as client:
+            assert client.get("/api/stats/summary").json()["has_data"] is False
+            assert client.get("/api/stats").json()["all_time"]["total_scanned"] == 0
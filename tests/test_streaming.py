@@ -0,0 +1,160 @@
+"""
+Tests for streaming scans: stream_scan events and the NDJSON scan routes
+"""
+
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.connectors.gmail import connector as gmail_connector
+from services.gateway import routes_gmail
+from services.gateway.deps import CurrentUser, get_current_user
+from services.gateway.main import app
+from services.gateway.streaming import NDJSON_MEDIA_TYPE
+from services.gmail_connector import api
+from services.gmail_connector.async_fetch import GmailListError
+
+USER = CurrentUser(user_id=6161, email="stream@example.com")
+
+
+def _message(mid, sender):
+    return {"id": mid, "from": sender, "subject": "Hi", "date": "", "labels": ["INBOX"], "size": 1000}
+
+
+class FakeFetcher:
+    """AsyncGmailFetcher stand-in yielding fixed batches, or raising `error` after them"""
+
+    batches = []
+    error = None
+
+    def __init__(self, *args, **kwargs):
+        self.listed_ids = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get_history_id(self):
+        return "500"
+
+    async def iter_scan(self, limit, query=""):
+        for batch in self.batches:
+            self.listed_ids.extend(m["id"] for m in batch)
+            yield batch
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def gmail(monkeypatch):
+    """stream_scan wired to FakeFetcher; records which threads touched the session"""
+    calls = {"persisted": [], "threads": set(), "saved": []}
+
+    def persist(db, user_id, items, msg_lookup):
+        calls["threads"].add(threading.get_ident())
+        calls["persisted"].extend(it["id"] for it in items)
+
+    monkeypatch.setattr(api, "AsyncGmailFetcher", FakeFetcher)
+    monkeypatch.setattr(api, "get_metadata_cache", lambda: None)
+    monkeypatch.setattr(api, "get_user_credentials", lambda db, user_id: SimpleNamespace(credentials=None, token_id=1))
+    monkeypatch.setattr(api, "_persist_decisions", persist)
+    monkeypatch.setattr(api, "save_sync_state", lambda db, *args: calls["saved"].append(args))
+    monkeypatch.setattr(api, "sync_refreshed_token", lambda user_id: None)
+    monkeypatch.setattr(FakeFetcher, "batches", [
+        [_message("a", "deals@shop.com"), _message("b", "friend@example.com")],
+        [_message("c", "news@shop.com")],
+    ])
+    monkeypatch.setattr(FakeFetcher, "error", None)
+    return calls
+
+
+def _events(gen):
+    async def collect():
+        return [event async for event in gen]
+    return asyncio.run(collect())
+
+
+class TestStreamScan:
+    """Test the events of api.stream_scan"""
+
+    def test_batches_then_summary(self, gmail):
+        events = _events(api.stream_scan(USER.user_id, 30, 100))
+
+        assert [e["type"] for e in events] == ["batch", "batch", "summary"]
+        assert [i["id"] for i in events[0]["items"]] == ["a", "b"]
+        assert sum(events[1]["counts"].values()) == 3
+        assert events[-1]["scanned_count"] == 3
+        assert events[-1]["summary"]["total_items"] == 3
+        assert gmail["persisted"] == ["a", "b", "c"]
+        assert gmail["saved"][0][2] == "500"  # becomes the incremental baseline
+        assert threading.get_ident() not in gmail["threads"]
+
+    def test_failure_arrives_as_error_event(self, gmail, monkeypatch):
+        monkeypatch.setattr(FakeFetcher, "error", GmailListError("list failed"))
+
+        events = _events(api.stream_scan(USER.user_id, 30, 100))
+        assert [e["type"] for e in events] == ["batch", "batch", "error"]
+        assert events[-1]["error"] == "scan_failed"
+        assert gmail["saved"] == []
+
+    def test_not_authorized(self, gmail, monkeypatch):
+        monkeypatch.setattr(api, "get_user_credentials", lambda db, user_id: None)
+        assert _events(api.stream_scan(USER.user_id, 30, 100)) == [{"type": "error", "error": "not_authorized"}]
+
+
+class TestStreamRoutes:
+    """Test the NDJSON routes end to end"""
+
+    @pytest.fixture(autouse=True)
+    def authenticated(self):
+        app.dependency_overrides[get_current_user] = lambda: USER
+        yield
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def _lines(self, response):
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE)
+        assert response.headers["x-accel-buffering"] == "no"
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+    def test_gmail_scan_stream(self, gmail, monkeypatch):
+        seen = []
+
+        def stream_scan(*args):
+            seen.append(args)
+            return api.stream_scan(*args)
+
+        monkeypatch.setattr(routes_gmail, "stream_scan", stream_scan)
+
+        with TestClient(app) as client:
+            with client.stream("POST", "/gmail/scan/stream", json={"days_back": 7, "limit": 50}) as response:
+                events = self._lines(response)
+
+        assert seen[0][:3] == (USER.user_id, 7, 50)
+        assert [e["type"] for e in events] == ["batch", "batch", "summary"]
+
+    def test_gmail_scan_stream_rejects_sampling(self):
+        with TestClient(app) as client:
+            response = client.post("/gmail/scan/stream", json={"mode": "sample"})
+        assert response.status_code == 400
+
+    def test_universal_scan_stream(self, gmail, monkeypatch):
+        monkeypatch.setattr(gmail_connector, "stream_scan", api.stream_scan)
+
+        with TestClient(app) as client:
+            with client.stream("POST", "/v1/scan/stream", json={"provider": "gmail"}) as response:
+                events = self._lines(response)
+
+        assert events[-1]["type"] == "summary"
+        assert events[-1]["scanned_count"] == 3
+
+    def test_universal_scan_stream_unsupported_provider(self):
+        with TestClient(app) as client:
+            response = client.post("/v1/scan/stream", json={"provider": "dropbox"})
+        assert response.status_code == 400
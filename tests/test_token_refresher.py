@@ -0,0 +1,193 @@
+"""
+Unit tests for proactive Gmail token refresh
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from db.session import SessionLocal, pool_status
+from db.models import OAuthToken
+from services.gmail_connector import token_refresher
+from services.gmail_connector.oauth import _fernet
+from services.gmail_connector.token_refresher import refresh_expiring_tokens
+
+USER_SOON = 990001
+USER_LATER = 990002
+USER_INACTIVE = 990003
+
+
+@pytest.fixture(autouse=True)
+def app_secret(monkeypatch):
+    """Fernet needs a secret of at least 16 characters"""
+    monkeypatch.setenv("APP_SECRET", "test-secret-test-secret-test-secret")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    """Failure backoff is per process: start every test without any"""
+    token_refresher._failures.clear()
+    yield
+    token_refresher._failures.clear()
+
+
+class TestRefreshExpiringTokens:
+    """Test which tokens get refreshed and how they are persisted"""
+
+    @pytest.fixture(autouse=True)
+    def tokens(self, app_secret):
+        self.db = SessionLocal()
+        self.now = datetime(2030, 1, 1, 12, 0, 0)
+        f = _fernet()
+
+        def token(user_id, expires_in):
+            return OAuthToken(
+                user_id=user_id,
+                provider="google",
+                access_token=f.encrypt(b"old-access"),
+                refresh_token=f.encrypt(b"refresh"),
+                expiry=self.now + expires_in
+            )
+        self.token = token
+
+        self.db.add_all([
+            token(USER_SOON, timedelta(minutes=2)),
+            token(USER_LATER, timedelta(minutes=50)),
+            token(USER_INACTIVE, timedelta(minutes=1)),
+        ])
+        self.db.commit()
+        yield
+        self.db.query(OAuthToken).filter(
+            OAuthToken.user_id.in_([USER_SOON, USER_LATER, USER_INACTIVE])
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        self.db.close()
+
+    def _access_token(self, user_id):
+        tok = self.db.query(OAuthToken).filter(OAuthToken.user_id == user_id).order_by(OAuthToken.id.desc()).first()
+        self.db.refresh(tok)
+        return _fernet().decrypt(tok.access_token).decode(), tok.expiry
+
+    def test_refreshes_only_expiring_tokens_of_given_users(self, monkeypatch):
+        new_expiry = self.now + timedelta(hours=1)
+        monkeypatch.setattr(token_refresher, "_refresh_one", lambda tok: ("new-access", new_expiry))
+
+        n = refresh_expiring_tokens([USER_SOON, USER_LATER], now=self.now)
+
+        assert n == 1
+        assert self._access_token(USER_SOON) == ("new-access", new_expiry)
+        assert self._access_token(USER_LATER)[0] == "old-access"
+        assert self._access_token(USER_INACTIVE)[0] == "old-access"
+
+    def test_failed_refresh_keeps_old_token(self, monkeypatch):
+        def fail(tok):
+            raise RuntimeError("invalid_grant")
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", fail)
+
+        assert refresh_expiring_tokens([USER_SOON], now=self.now) == 0
+        assert self._access_token(USER_SOON)[0] == "old-access"
+
+    def test_no_active_users_does_nothing(self):
+        assert refresh_expiring_tokens([], now=self.now) == 0
+
+    def test_only_the_newest_token_per_user(self, monkeypatch):
+        """Superseded tokens of a user are left alone (credentials use the newest)"""
+        self.db.add(self.token(USER_SOON, timedelta(minutes=3)))
+        self.db.commit()
+        refreshed = []
+
+        def refresh(tok):
+            refreshed.append(tok.id)
+            return "new-access", self.now + timedelta(hours=1)
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", refresh)
+
+        assert refresh_expiring_tokens([USER_SOON], now=self.now) == 1
+        newest = self.db.query(OAuthToken.id).filter(OAuthToken.user_id == USER_SOON).order_by(OAuthToken.id.desc()).first()
+        assert refreshed == [newest.id]
+
+    def test_failed_refresh_backs_off(self, monkeypatch):
+        """A dead refresh token is retried with growing delays, not every pass"""
+        calls = []
+
+        def fail(tok):
+            calls.append(tok.id)
+            raise RuntimeError("invalid_grant")
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", fail)
+        interval = timedelta(seconds=token_refresher.REFRESH_INTERVAL)
+
+        refresh_expiring_tokens([USER_SOON], now=self.now)
+        refresh_expiring_tokens([USER_SOON], now=self.now + interval / 2)
+        assert len(calls) == 1
+        refresh_expiring_tokens([USER_SOON], now=self.now + interval)
+        assert len(calls) == 2
+        refresh_expiring_tokens([USER_SOON], now=self.now + interval * 2)
+        assert len(calls) == 2  # second failure: twice the delay
+        refresh_expiring_tokens([USER_SOON], now=self.now + interval * 3)
+        assert len(calls) == 3
+
+    def test_success_clears_backoff(self, monkeypatch):
+        def fail(tok):
+            raise RuntimeError("temporarily_unavailable")
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", fail)
+        refresh_expiring_tokens([USER_SOON], now=self.now)
+        assert token_refresher._failures
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", lambda tok: ("new-access", self.now + timedelta(hours=1)))
+        later = self.now + timedelta(seconds=token_refresher.REFRESH_INTERVAL)
+        assert refresh_expiring_tokens([USER_SOON], now=later) == 1
+        assert not token_refresher._failures
+
+    def test_no_session_open_during_refresh(self, monkeypatch):
+        open_sessions = []
+
+        def refresh(tok):
+            open_sessions.append(pool_status()["scoped_sessions"].get("token_refresher", 0))
+            return "new-access", self.now + timedelta(hours=1)
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", refresh)
+
+        assert refresh_expiring_tokens([USER_SOON], now=self.now) == 1
+        assert open_sessions == [0]
+
+    def test_newer_token_written_meanwhile_is_kept(self, monkeypatch):
+        """A refresh racing a request-path write-back does not overwrite it"""
+        request_expiry = self.now + timedelta(hours=2)
+
+        def refresh(tok):
+            with SessionLocal() as other:
+                other.query(OAuthToken).filter(OAuthToken.id == tok.id).update(
+                    {"access_token": _fernet().encrypt(b"request-access"), "expiry": request_expiry}
+                )
+                other.commit()
+            return "new-access", self.now + timedelta(hours=1)
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", refresh)
+
+        assert refresh_expiring_tokens([USER_SOON], now=self.now) == 0
+        assert self._access_token(USER_SOON) == ("request-access", request_expiry)
+
+    @pytest.mark.parametrize("outcome", ["fails", "still_expiring"])
+    def test_run_once_tries_each_token_once(self, monkeypatch, outcome):
+        """Tokens that stay inside the refresh window do not make the pass spin"""
+        expired = datetime.utcnow() - timedelta(minutes=1)
+        self.db.query(OAuthToken).filter(
+            OAuthToken.user_id.in_([USER_SOON, USER_INACTIVE])
+        ).update({OAuthToken.expiry: expired}, synchronize_session=False)
+        self.db.commit()
+
+        calls = []
+
+        def refresh(tok):
+            calls.append(tok.user_id)
+            if outcome == "fails":
+                raise RuntimeError("invalid_grant")
+            return "new-access", expired
+
+        monkeypatch.setattr(token_refresher, "_refresh_one", refresh)
+        monkeypatch.setattr(token_refresher, "REFRESH_BATCH_SIZE", 1)
+        monkeypatch.setattr(token_refresher, "recently_active_users", lambda window: [USER_SOON, USER_INACTIVE])
+
+        token_refresher.TokenRefreshScheduler().run_once()
+        assert sorted(calls) == [USER_SOON, USER_INACTIVE]